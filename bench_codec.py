@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.audio.codec import load_features, reconstruction_error, save_features
+
+
+def synthetic_mel(n_mels: int, frames: int) -> np.ndarray:
+  # Smooth dB-like values in [-80, 0], standing in for a real 1 ms hop spectrogram.
+  rng = np.random.default_rng(0)
+  data = np.cumsum(rng.normal(size=(n_mels, frames)).astype(np.float32), axis=1)
+  data -= data.mean(axis=1, keepdims=True)
+  # Higher bands sit lower and move less, as in real music.
+  level = np.linspace(-20.0, -60.0, n_mels, dtype=np.float32)[:, None]
+  spread = np.linspace(0.6, 0.15, n_mels, dtype=np.float32)[:, None]
+  return np.clip(data * spread + level, -80.0, 0.0).astype(np.float32)
+
+
+def read_windows(read, frames: int, window: int, count: int) -> float:
+  # Random (bands, window) slices; returns decoded MB/s.
+  rng = np.random.default_rng(1)
+  starts = rng.integers(0, frames - window, size=count)
+  start_time = time.perf_counter()
+  nbytes = 0
+  for start in starts:
+    nbytes += read(int(start)).nbytes
+  return nbytes / (time.perf_counter() - start_time) / 1e6
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Quantised feature storage: size, reconstruction error and read throughput vs float32.")
+  parser.add_argument("audio", nargs="?", help="audio file for a real mel spectrogram (default: synthetic data)")
+  parser.add_argument("--frames", type=int, default=180_000, help="synthetic frames (1 ms hop: 3 minutes)")
+  parser.add_argument("--n-mels", type=int, default=128)
+  parser.add_argument("--window", type=int, default=4096, help="frames per random read")
+  parser.add_argument("--reads", type=int, default=500)
+  args = parser.parse_args()
+
+  if args.audio:
+    from src.audio import audio_to_mel_spectrogram
+
+    data = audio_to_mel_spectrogram(args.audio, hop_ms=1, n_mels=args.n_mels).S_db.astype(np.float32)
+  else:
+    data = synthetic_mel(args.n_mels, args.frames)
+  frames = data.shape[1]
+  window = min(args.window, frames - 1)
+
+  with tempfile.TemporaryDirectory() as tmp:
+    reference = os.path.join(tmp, "float32.npy")
+    np.save(reference, data)
+    raw = np.load(reference, mmap_mode="r")
+    throughput = read_windows(lambda s: np.array(raw[:, s:s + window]), frames, window, args.reads)
+    print(f"{'float32':<16}{os.path.getsize(reference) / 1e6:>9.1f} MB{'':>30}{throughput:>10.0f} MB/s")
+
+    for dtype in ("uint8", "float16"):
+      for per in ("map", "band"):
+        path = os.path.join(tmp, f"{dtype}.{per}.npy")
+        save_features(path, data, dtype=dtype, per=per)
+        features = load_features(path)
+        error = reconstruction_error(data, features)
+        throughput = read_windows(lambda s: features.frames(s, s + window), frames, window, args.reads)
+        print(f"{dtype + '/' + per:<16}{os.path.getsize(path) / 1e6:>9.1f} MB"
+              f"   max {error['max_abs']:7.4f} dB  rmse {error['rmse']:7.4f} dB{throughput:>10.0f} MB/s")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
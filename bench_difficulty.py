@@ -0,0 +1,87 @@
+import argparse
+import glob
+import itertools
+import sys
+import time
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+from src.osu.difficulty.backend import numba_available
+
+MOD_COMBOS = [[], ["DoubleTime"], ["HardRock"]]
+
+
+def timed(beatmap, mods, backend: str, approximate: bool, repeat: int, attribute: str = "star_rating"):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    stars = getattr(calculate_difficulty(beatmap, mods, backend=backend, approximate=approximate), attribute)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best, stars
+
+
+def bench_flashlight(maps, backends, repeat: int) -> int:
+  # Flashlight adds one skill pass with a bounded lookback; this shows what it costs on top of NoMod.
+  for backend in backends:
+    calculate_difficulty(maps[0], ["Flashlight"], backend=backend)
+    nomod_s = flashlight_s = 0.0
+    values = []
+    for beatmap in maps:
+      seconds, _ = timed(beatmap, [], backend, False, repeat)
+      nomod_s += seconds
+      seconds, value = timed(beatmap, ["Flashlight"], backend, False, repeat, "flashlight_difficulty")
+      flashlight_s += seconds
+      values.append(value)
+
+    print(f"{backend}: {len(maps)} maps")
+    print(f"    NoMod {nomod_s * 1000:8.1f} ms   Flashlight {flashlight_s * 1000:8.1f} ms   overhead {flashlight_s / nomod_s - 1:+.1%}")
+    print(f"    flashlight difficulty: min {min(values):.3f}  max {max(values):.3f}")
+  return 0
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Exact vs approximate difficulty: speed and error on the dataset.")
+  parser.add_argument("paths", nargs="*", default=sorted(glob.glob("dataset/**/*.osu", recursive=True)))
+  parser.add_argument("--repeat", type=int, default=3)
+  parser.add_argument("--flashlight", action="store_true", help="instead compare NoMod against Flashlight runtime")
+  args = parser.parse_args()
+
+  maps = [Beatmap(file_path=path) for path in args.paths]
+  for beatmap in maps:
+    beatmap.hit_objects
+
+  backends = ["python"] + (["numba"] if numba_available() else [])
+  if args.flashlight:
+    return bench_flashlight(maps, backends, args.repeat)
+  for backend in backends:
+    # Warm up (numba compiles on first use).
+    calculate_difficulty(maps[0], backend=backend, approximate=True)
+    calculate_difficulty(maps[0], backend=backend)
+
+    # Exact and approximate alternate per calculation (best of --repeat each) so that
+    # machine noise hits both sides alike.
+    exact_s = approx_s = 0.0
+    exact, approx = [], []
+    for beatmap in maps:
+      for mods in MOD_COMBOS:
+        seconds, stars = timed(beatmap, mods, backend, False, args.repeat)
+        exact_s += seconds
+        exact.append(stars)
+        seconds, stars = timed(beatmap, mods, backend, True, args.repeat)
+        approx_s += seconds
+        approx.append(stars)
+    errors = [a - e for e, a in zip(exact, approx)]
+    relative = [abs(err) / e for err, e in zip(errors, exact) if e > 0]
+    pairs = list(itertools.combinations(range(len(exact)), 2))
+    discordant = sum(1 for i, j in pairs if (exact[i] - exact[j]) * (approx[i] - approx[j]) < 0)
+
+    print(f"{backend}: {len(exact)} calculations over {len(maps)} maps")
+    print(f"    exact {exact_s * 1000:8.1f} ms   approximate {approx_s * 1000:8.1f} ms   speedup {exact_s / approx_s:.2f}x")
+    print(f"    star error: min {min(errors):+.4f}  max {max(errors):+.4f}  max relative {max(relative):.2%}")
+    print(f"    ranking: {discordant} of {len(pairs)} pairs swapped")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
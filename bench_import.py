@@ -0,0 +1,62 @@
+# Import-time regression benchmark: python bench_import.py [--budget-ms N]
+import argparse
+import os
+import subprocess
+import sys
+
+# module imported -> modules that must NOT be pulled in by it
+CHECKS = {
+  "src.osu": ["src.osu.difficulty", "librosa", "numba", "scipy", "numpy"],
+  "src.audio": ["librosa", "numba", "scipy", "numpy"],
+  "src.audio.Parser": ["librosa", "numba", "scipy"],
+}
+
+
+def import_times(module: str) -> dict:
+  result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+    cwd=os.path.dirname(os.path.abspath(__file__)),
+    capture_output=True, text=True, check=True,
+  )
+  times = {}
+  for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "[us]" in line:
+      continue
+    _, cumulative_us, name = line[len("import time:"):].split("|")
+    name = name.strip()
+    if name == "site":
+      # Everything before this line is interpreter startup, not our import.
+      times.clear()
+      continue
+    times[name] = int(cumulative_us)
+  return times
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--budget-ms", type=float, default=100.0)
+  parser.add_argument("--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  failed = False
+  for module, forbidden in CHECKS.items():
+    runs = [import_times(module) for _ in range(args.repeat)]
+    best_ms = min(run.get(module, 0) for run in runs) / 1000.0
+    loaded = [name for name in forbidden if name in runs[0]]
+    slowest = sorted(runs[0].items(), key=lambda kv: kv[1], reverse=True)[:5]
+
+    print(f"{module}: best of {args.repeat} = {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, us in slowest:
+      print(f"    {us / 1000.0:8.1f} ms  {name}")
+    if loaded:
+      print(f"    FAIL: eagerly imports {', '.join(loaded)}")
+      failed = True
+    if best_ms > args.budget_ms:
+      print("    FAIL: over budget")
+      failed = True
+
+  return 1 if failed else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,108 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from src.audio import FeatureBank
+from src.audio.timing import infer_timing_from_bundle
+from src.osu import Beatmap
+from src.osu.snapping import RedLines
+
+SR = 22050
+
+
+def percussion(red_lines: RedLines, object_times: np.ndarray, end_ms: float, seed: int) -> np.ndarray:
+  # Stand-in audio for a map: a kick on every beat of its red lines (accented on the bar), a
+  # softer hit on half beats and a noise burst on every hit object, over noise and a tone.
+  rng = np.random.default_rng(seed)
+  y = 0.02 * rng.normal(size=int(SR * end_ms / 1000)).astype(np.float32)
+  y += 0.05 * np.sin(2 * np.pi * 220.0 * np.arange(len(y)) / SR).astype(np.float32)
+  hits = [(t, 0.4) for t in object_times]
+  for i, (start, beat_length) in enumerate(zip(red_lines.time, red_lines.beat_length)):
+    stop = red_lines.time[i + 1] if i + 1 < len(red_lines) else end_ms
+    ticks = np.arange(start, stop, beat_length / 2)
+    hits += [(t, 1.0 if k % 8 == 0 else 0.8 if k % 2 == 0 else 0.3) for k, t in enumerate(ticks)]
+  burst = 2000
+  shape = np.exp(-np.arange(burst) / 300)
+  for t, amp in hits:
+    j = int(t * SR / 1000)
+    if 0 <= j < len(y):
+      n = min(burst, len(y) - j)
+      y[j:j + n] += (amp * shape[:n] * rng.normal(size=n)).astype(np.float32)
+  return y
+
+
+def phase_error(time: float, reference: float, beat_length: float) -> float:
+  return (time - reference + beat_length / 2) % beat_length - beat_length / 2
+
+
+def real_audio(paths, bank: FeatureBank) -> None:
+  # Sets that ship their audio: inferred timing of the real song against the first map's red lines.
+  seen = set()
+  for path in paths:
+    beatmap = Beatmap(file_path=path)
+    audio_path = os.path.join(os.path.dirname(path), beatmap.general.audio_filename.strip())
+    if audio_path in seen or not os.path.isfile(audio_path):
+      continue
+    seen.add(audio_path)
+    red_lines = RedLines.from_beatmap(beatmap)
+    bundle = bank.from_file(audio_path)
+    start = time.perf_counter()
+    inferred = infer_timing_from_bundle(bundle)
+    elapsed = time.perf_counter() - start
+    beat_length = red_lines.beat_length[0]
+    guess = inferred[0]
+    octave = 2.0 ** np.round(np.log2(guess.beat_length / beat_length))
+    print(f"{60000 / beat_length:8.2f} {guess.get_bpm():8.2f}{' (x%g)' % (1 / octave) if octave != 1 else '':<6}"
+          f"{phase_error(guess.time, red_lines.time[0], min(beat_length, guess.beat_length)):+7.1f} ms {len(red_lines):3d}/{len(inferred):<3d} red lines "
+          f"{elapsed:6.2f}s for {bundle.frame_count * bundle.frame_duration_ms / 1000:5.0f}s  {audio_path[-60:]}")
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Timing inference against the dataset maps' own red lines, on audio synthesised from each map.")
+  parser.add_argument("paths", nargs="*", default=sorted(glob.glob("dataset/**/*.osu", recursive=True)))
+  parser.add_argument("--hop-ms", type=float, default=10.0)
+  args = parser.parse_args()
+
+  bank = FeatureBank(hop_ms=args.hop_ms, mel_bands=(40,))
+  seen = set()
+  rows = []
+  for seed, path in enumerate(args.paths):
+    beatmap = Beatmap(file_path=path)
+    red_lines = RedLines.from_beatmap(beatmap)
+    times = np.asarray(beatmap.hit_object_columns().time, dtype=np.float64)
+    key = (tuple(red_lines.time), tuple(red_lines.beat_length))
+    if not len(times) or key in seen:
+      continue
+    seen.add(key)
+    end_ms = float(times.max()) + 2000.0
+    y = percussion(red_lines, times, end_ms, seed)
+
+    start = time.perf_counter()
+    inferred = infer_timing_from_bundle(bank.compute(y, SR))
+    elapsed = time.perf_counter() - start
+
+    # Main red line (longest active) against the inferred one active at the same time.
+    durations = np.diff(np.append(np.maximum(red_lines.time, 0.0), end_ms))
+    main = int(durations.argmax())
+    at = red_lines.time[main] + durations[main] / 2
+    guess = [tp for tp in inferred if tp.time <= at] or inferred[:1]
+    guess = guess[-1]
+    bpm, guess_bpm = 60000.0 / red_lines.beat_length[main], guess.get_bpm()
+    offset_error = phase_error(guess.time, red_lines.time[main], red_lines.beat_length[main])
+    rows.append((bpm, guess_bpm, offset_error, len(red_lines), len(inferred), elapsed, end_ms / 1000))
+    print(f"{bpm:8.2f} {guess_bpm:8.2f} {offset_error:+7.1f} ms {len(red_lines):3d}/{len(inferred):<3d} red lines {elapsed:6.2f}s for {end_ms / 1000:5.0f}s  {path[-60:]}")
+
+  rows = np.asarray(rows)
+  bpm_ok = np.abs(rows[:, 1] / rows[:, 0] - 1) < 0.001
+  print(f"{len(rows)} timings: BPM within 0.1% for {bpm_ok.sum()}, median |offset error| {np.median(np.abs(rows[bpm_ok, 2])):.1f} ms, "
+        f"{rows[:, 5].sum() / rows[:, 6].sum() * 100:.2f}% of playback time")
+  print("real audio (offset error includes the decoder's delay, see python -m src.audio.offset):")
+  real_audio(args.paths, bank)
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
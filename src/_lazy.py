@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import importlib
+import sys
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+def attach(
+  package: str,
+  submodules: Iterable[str] = (),
+  attributes: Dict[str, str] | None = None,
+) -> Tuple[Callable[[str], object], Callable[[], List[str]]]:
+  submodules = set(submodules)
+  attributes = dict(attributes or {})
+
+  def __getattr__(name: str) -> object:
+    if name in submodules:
+      return importlib.import_module(f"{package}.{name}")
+    if name in attributes:
+      module = importlib.import_module(attributes[name], package)
+      return getattr(module, name)
+    raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+  def __dir__() -> List[str]:
+    return sorted({*vars(sys.modules[package]), *submodules, *attributes})
+
+  return __getattr__, __dir__
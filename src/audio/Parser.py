@@ -3,7 +3,6 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional, Tuple
 import numpy as np
-import librosa
 
 
 @dataclass
@@ -98,6 +97,16 @@ class MelSpec:
     data = np.clip(data, 0.0, 1.0)
     return (data * (np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1.0)).astype(dtype)
 
+  def save_features(self, path: str, *, dtype: str = "uint8", per: str = "band"):
+    from .codec import save_features
+
+    meta = {
+      "sr": self.sr, "hop_length": self.hop_length, "n_fft": self.n_fft, "n_mels": self.n_mels,
+      "fmin": self.fmin, "fmax": self.fmax, "power": self.power, "ref": self.ref, "top_db": self.top_db,
+      "frame_duration_ms": self.frame_duration_ms, "window": self.window, "center": self.center,
+    }
+    return save_features(path, self.S_db, dtype=dtype, per=per, meta=meta)
+
 def audio_to_mel_spectrogram(
   audio_path: str,
   *,
@@ -121,8 +130,15 @@ def audio_to_mel_spectrogram(
   mono: bool = True,
   offset: float = 0.0,
   duration: Optional[float] = None,
+  pcm_store=None,
 ) -> MelSpec:
-  y, sr_eff = librosa.load(audio_path, sr=sr, mono=mono, offset=offset, duration=duration)
+  import librosa
+
+  if pcm_store is not None:
+    # Decoded once per audio file and sr, then read from a memory map.
+    y, sr_eff = pcm_store.load(audio_path, sr=sr, mono=mono, offset=offset, duration=duration)
+  else:
+    y, sr_eff = librosa.load(audio_path, sr=sr, mono=mono, offset=offset, duration=duration)
   if hop_length is None:
     if hop_ms is None:
       hop_length = 512
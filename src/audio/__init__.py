@@ -1,3 +1,29 @@
-from .Parser import audio_to_mel_spectrogram
+from typing import TYPE_CHECKING
 
-__all__ = ["audio_to_mel_spectrogram"]
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__ = attach(__name__, attributes={
+  "audio_to_mel_spectrogram": ".Parser",
+  "MelSpec": ".Parser",
+  "FeatureCodec": ".codec",
+  "QuantizedFeatures": ".codec",
+  "save_features": ".codec",
+  "load_features": ".codec",
+  "RateFeatures": ".rate",
+  "PCMStore": ".pcm",
+  "FeatureBank": ".features",
+  "FeatureBundle": ".features",
+  "OffsetChecker": ".offset",
+  "infer_timing": ".timing",
+})
+
+if TYPE_CHECKING:
+  from .Parser import MelSpec, audio_to_mel_spectrogram
+  from .codec import FeatureCodec, QuantizedFeatures, load_features, save_features
+  from .features import FeatureBank, FeatureBundle
+  from .offset import OffsetChecker
+  from .timing import infer_timing
+  from .pcm import PCMStore
+  from .rate import RateFeatures
+
+__all__ = ["audio_to_mel_spectrogram", "MelSpec", "FeatureCodec", "QuantizedFeatures", "save_features", "load_features", "RateFeatures", "PCMStore", "FeatureBank", "FeatureBundle", "OffsetChecker", "infer_timing"]
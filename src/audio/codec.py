@@ -0,0 +1,165 @@
+from __future__ import annotations
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+import numpy as np
+
+# Compact storage for feature matrices such as MelSpec.S_db (bands x frames). Values are
+# mapped linearly onto uint8 (256 levels) or float16 with a scale/offset either for the
+# whole matrix ("map") or per row ("band"). Codes live in a .npy file that is opened as a
+# memory map, and the scale/offset sit next to it in a JSON sidecar, so slices are only
+# dequantised when read.
+
+DTYPES = ("uint8", "float16")
+GRANULARITIES = ("map", "band")
+# Frames encoded per step when writing, to bound the float32 scratch memory.
+CHUNK_FRAMES = 1 << 16
+
+
+def sidecar_path(path: str) -> str:
+  return os.path.splitext(path)[0] + ".json"
+
+
+@dataclass
+class FeatureCodec:
+  dtype: str
+  per: str
+  # Shaped (bands, 1) for "band" and (1, 1) for "map" so that they broadcast against the data.
+  scale: np.ndarray
+  offset: np.ndarray
+
+  @classmethod
+  def fit(cls, data: np.ndarray, *, dtype: str = "uint8", per: str = "band") -> "FeatureCodec":
+    if dtype not in DTYPES:
+      raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+    if per not in GRANULARITIES:
+      raise ValueError(f"per must be one of {GRANULARITIES}, got {per!r}")
+    data = np.asarray(data)
+    if data.ndim != 2:
+      raise ValueError(f"expected a 2-D (bands, frames) array, got shape {data.shape}")
+
+    keepdims = dict(axis=1, keepdims=True) if per == "band" else dict(axis=None, keepdims=True)
+    low = np.nanmin(data, **keepdims).astype(np.float64)
+    high = np.nanmax(data, **keepdims).astype(np.float64)
+    span = high - low
+    # uint8 codes cover [0, 255]; float16 codes cover [0, 1], where it is most precise.
+    levels = 255.0 if dtype == "uint8" else 1.0
+    scale = np.where(span > 0, span / levels, 1.0)
+    return cls(dtype, per, scale.reshape(-1, 1), low.reshape(-1, 1))
+
+  @property
+  def max_error(self) -> np.ndarray:
+    # Worst-case absolute reconstruction error per band (or for the map).
+    if self.dtype == "uint8":
+      return self.scale.ravel() / 2.0
+    # float16 keeps 11 significant bits; codes lie in [0, 1].
+    return self.scale.ravel() * 2.0 ** -12
+
+  def encode(self, data: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    codes = (np.asarray(data, dtype=np.float32) - self.offset.astype(np.float32)) / self.scale.astype(np.float32)
+    if self.dtype == "uint8":
+      np.rint(codes, out=codes)
+      np.clip(codes, 0, 255, out=codes)
+    if out is None:
+      return codes.astype(self.dtype)
+    out[...] = codes
+    return out
+
+  def decode(self, codes: np.ndarray, key=Ellipsis, shape: Optional[Tuple[int, ...]] = None) -> np.ndarray:
+    # `codes` is the already-indexed selection codes_full[key] of an array with `shape`.
+    # The parameters are broadcast to that shape (a view, no copy) and indexed the same way.
+    shape = shape or codes.shape
+    scale = np.broadcast_to(self.scale.astype(np.float32), shape)[key]
+    offset = np.broadcast_to(self.offset.astype(np.float32), shape)[key]
+    result = np.asarray(codes, dtype=np.float32) * scale
+    result += offset
+    return result
+
+  def to_dict(self) -> dict:
+    return {
+      "dtype": self.dtype,
+      "per": self.per,
+      "scale": self.scale.ravel().tolist(),
+      "offset": self.offset.ravel().tolist(),
+    }
+
+  @classmethod
+  def from_dict(cls, meta: dict) -> "FeatureCodec":
+    return cls(
+      meta["dtype"],
+      meta["per"],
+      np.asarray(meta["scale"], dtype=np.float64).reshape(-1, 1),
+      np.asarray(meta["offset"], dtype=np.float64).reshape(-1, 1),
+    )
+
+
+class QuantizedFeatures:
+  # Indexing works like on the stored array but returns dequantised float32.
+  def __init__(self, codes: np.ndarray, codec: FeatureCodec, meta: Optional[dict] = None) -> None:
+    self.codes = codes
+    self.codec = codec
+    self.meta = meta or {}
+
+  @property
+  def shape(self) -> Tuple[int, ...]:
+    return self.codes.shape
+
+  @property
+  def nbytes(self) -> int:
+    return self.codes.nbytes
+
+  def __len__(self) -> int:
+    return len(self.codes)
+
+  def __getitem__(self, key) -> np.ndarray:
+    return self.codec.decode(self.codes[key], key, self.codes.shape)
+
+  def frames(self, start: int, stop: int) -> np.ndarray:
+    return self[:, start:stop]
+
+  def to_array(self) -> np.ndarray:
+    return self[...]
+
+
+def save_features(
+  path: str,
+  data: np.ndarray,
+  *,
+  dtype: str = "uint8",
+  per: str = "band",
+  meta: Optional[dict] = None,
+  codec: Optional[FeatureCodec] = None,
+) -> FeatureCodec:
+  data = np.asarray(data)
+  codec = codec or FeatureCodec.fit(data, dtype=dtype, per=per)
+  codes = np.lib.format.open_memmap(path, mode="w+", dtype=codec.dtype, shape=np.shape(data))
+  for start in range(0, codes.shape[1], CHUNK_FRAMES):
+    codec.encode(data[:, start:start + CHUNK_FRAMES], out=codes[:, start:start + CHUNK_FRAMES])
+  codes.flush()
+  del codes
+
+  sidecar = {**codec.to_dict(), "shape": list(np.shape(data)), "meta": meta or {}}
+  tmp_path = sidecar_path(path) + ".tmp"
+  with open(tmp_path, "w", encoding="utf-8") as f:
+    json.dump(sidecar, f)
+  os.replace(tmp_path, sidecar_path(path))
+  return codec
+
+
+def load_features(path: str, *, mmap: bool = True) -> QuantizedFeatures:
+  with open(sidecar_path(path), "r", encoding="utf-8") as f:
+    sidecar = json.load(f)
+  codes = np.load(path, mmap_mode="r" if mmap else None)
+  if list(codes.shape) != sidecar["shape"] or str(codes.dtype) != sidecar["dtype"]:
+    raise ValueError(f"{path} does not match its sidecar ({codes.dtype} {codes.shape} vs {sidecar['dtype']} {sidecar['shape']})")
+  return QuantizedFeatures(codes, FeatureCodec.from_dict(sidecar), sidecar.get("meta", {}))
+
+
+def reconstruction_error(original: np.ndarray, decoded: Union[np.ndarray, QuantizedFeatures]) -> dict:
+  decoded = decoded.to_array() if isinstance(decoded, QuantizedFeatures) else decoded
+  diff = np.asarray(decoded, dtype=np.float64) - np.asarray(original, dtype=np.float64)
+  return {
+    "max_abs": float(np.max(np.abs(diff))) if diff.size else 0.0,
+    "rmse": float(np.sqrt(np.mean(diff * diff))) if diff.size else 0.0,
+  }
@@ -0,0 +1,191 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+import numpy as np
+
+from .Parser import MelSpec
+
+# Several audio views from one STFT. The magnitude matrix is computed once per
+# (n_fft, hop_length) and every feature below is derived from it, so all of them share one
+# time grid (`times`, frame centres in seconds):
+#   mels[n]         n-band mel spectrogram in dB, one entry per requested resolution
+#   onset_strength  librosa's onset envelope over the finest mel spectrogram
+#   spectral_flux   summed positive change of the linear magnitude between frames
+#   rms             per-frame RMS from the magnitude spectrum
+#   chroma          12 x frames chroma (optional)
+
+
+@dataclass
+class FeatureBundle:
+  sr: int
+  n_fft: int
+  hop_length: int
+  fmin: float
+  fmax: Optional[float]
+  top_db: float
+  times: np.ndarray
+  mels: Dict[int, np.ndarray]
+  onset_strength: np.ndarray
+  spectral_flux: np.ndarray
+  rms: np.ndarray
+  chroma: Optional[np.ndarray] = None
+  meta: Dict[str, object] = field(default_factory=dict)
+
+  @property
+  def frame_count(self) -> int:
+    return len(self.times)
+
+  @property
+  def frame_duration_ms(self) -> float:
+    return self.hop_length / self.sr * 1000.0
+
+  def mel_spec(self, n_mels: Optional[int] = None) -> MelSpec:
+    import librosa
+
+    n_mels = n_mels or max(self.mels)
+    return MelSpec(
+      S_db=self.mels[n_mels], times=self.times,
+      freqs=librosa.mel_frequencies(n_mels=n_mels, fmin=self.fmin, fmax=(self.fmax or self.sr / 2)),
+      sr=self.sr, hop_length=self.hop_length, n_fft=self.n_fft, n_mels=n_mels,
+      fmin=self.fmin, fmax=self.fmax, power=2.0, ref=1.0, top_db=self.top_db,
+      frame_duration_ms=self.frame_duration_ms, window="hann", center=True,
+    )
+
+  def save(self, path: str) -> None:
+    # One .npz per bundle; scalars go into a JSON header entry.
+    header = {
+      "sr": self.sr, "n_fft": self.n_fft, "hop_length": self.hop_length, "fmin": self.fmin,
+      "fmax": self.fmax, "top_db": self.top_db, "mel_bands": sorted(self.mels), "meta": self.meta,
+    }
+    arrays = {
+      "times": self.times,
+      "onset_strength": self.onset_strength,
+      "spectral_flux": self.spectral_flux,
+      "rms": self.rms,
+      **{f"mel_{n}": S for n, S in self.mels.items()},
+    }
+    if self.chroma is not None:
+      arrays["chroma"] = self.chroma
+    with open(path, "wb") as f:
+      np.savez(f, header=np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8), **arrays)
+
+  @classmethod
+  def load(cls, path: str, *, mel_bands: Optional[Sequence[int]] = None) -> "FeatureBundle":
+    # mel_bands limits which mel spectrograms are read (() for none); the rest stay on disk.
+    with np.load(path) as data:
+      header = json.loads(data["header"].tobytes().decode("utf-8"))
+      bands = header["mel_bands"] if mel_bands is None else [n for n in header["mel_bands"] if n in mel_bands]
+      return cls(
+        sr=header["sr"], n_fft=header["n_fft"], hop_length=header["hop_length"], fmin=header["fmin"],
+        fmax=header["fmax"], top_db=header["top_db"], times=data["times"],
+        mels={n: data[f"mel_{n}"] for n in bands},
+        onset_strength=data["onset_strength"], spectral_flux=data["spectral_flux"], rms=data["rms"],
+        chroma=data["chroma"] if "chroma" in data.files else None, meta=header["meta"],
+      )
+
+
+class FeatureBank:
+  def __init__(
+    self,
+    *,
+    n_fft: int = 2048,
+    hop_length: Optional[int] = None,
+    hop_ms: Optional[float] = 10.0,
+    mel_bands: Sequence[int] = (128,),
+    fmin: float = 30.0,
+    fmax: Optional[float] = None,
+    top_db: float = 80.0,
+    chroma: bool = False,
+  ):
+    if not mel_bands:
+      raise ValueError("FeatureBank needs at least one mel resolution")
+    self.n_fft = n_fft
+    self.hop_length = hop_length
+    self.hop_ms = hop_ms
+    self.mel_bands = tuple(sorted(set(int(n) for n in mel_bands)))
+    self.fmin = fmin
+    self.fmax = fmax
+    self.top_db = top_db
+    self.chroma = chroma
+
+  def _hop_length(self, sr: int) -> int:
+    if self.hop_length is not None:
+      return self.hop_length
+    return 512 if self.hop_ms is None else max(1, int(round(sr * (self.hop_ms / 1000.0))))
+
+  def compute(self, y: np.ndarray, sr: int, *, meta: Optional[Dict[str, object]] = None) -> FeatureBundle:
+    import librosa
+
+    hop_length = self._hop_length(sr)
+    S = np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=hop_length))
+    power = S ** 2
+
+    mels = {}
+    for n_mels in self.mel_bands:
+      basis = librosa.filters.mel(sr=sr, n_fft=self.n_fft, n_mels=n_mels, fmin=self.fmin, fmax=self.fmax or sr / 2)
+      mels[n_mels] = librosa.power_to_db(basis @ power, ref=1.0, top_db=self.top_db)
+
+    onset_strength = librosa.onset.onset_strength(S=mels[self.mel_bands[-1]], sr=sr, n_fft=self.n_fft, hop_length=hop_length)
+    spectral_flux = np.zeros(S.shape[1], dtype=S.dtype)
+    if S.shape[1] > 1:
+      spectral_flux[1:] = np.maximum(np.diff(S, axis=1), 0.0).sum(axis=0)
+    rms = librosa.feature.rms(S=S, frame_length=self.n_fft)[0]
+    chroma = librosa.feature.chroma_stft(S=power, sr=sr, n_fft=self.n_fft, hop_length=hop_length) if self.chroma else None
+
+    return FeatureBundle(
+      sr=sr, n_fft=self.n_fft, hop_length=hop_length, fmin=self.fmin, fmax=self.fmax, top_db=self.top_db,
+      times=librosa.frames_to_time(np.arange(S.shape[1]), sr=sr, hop_length=hop_length, n_fft=self.n_fft),
+      mels=mels, onset_strength=onset_strength, spectral_flux=spectral_flux, rms=rms, chroma=chroma,
+      meta=dict(meta or {}),
+    )
+
+  def from_file(
+    self,
+    audio_path: str,
+    *,
+    sr: int = 22050,
+    offset: float = 0.0,
+    duration: Optional[float] = None,
+    pcm_store=None,
+  ) -> FeatureBundle:
+    if pcm_store is not None:
+      y, sr_eff = pcm_store.load(audio_path, sr=sr, offset=offset, duration=duration)
+    else:
+      import librosa
+
+      y, sr_eff = librosa.load(audio_path, sr=sr, offset=offset, duration=duration)
+    return self.compute(y, sr_eff, meta={"audio_path": audio_path, "offset": offset, "duration": duration})
+
+  def cache_key(self, sr: int) -> str:
+    settings = [sr, self.n_fft, self._hop_length(sr), list(self.mel_bands), self.fmin, self.fmax, self.top_db, self.chroma]
+    return hashlib.sha1(json.dumps(settings).encode("utf-8")).hexdigest()[:12]
+
+  def cached_path(self, directory: str, audio_path: str, *, sr: int = 22050) -> str:
+    from .pcm import file_hash
+
+    digest = file_hash(audio_path)
+    return os.path.join(directory, digest[:2], f"{digest}-{self.cache_key(sr)}.npz")
+
+  def cached(
+    self,
+    audio_path: str,
+    directory: str,
+    *,
+    sr: int = 22050,
+    pcm_store=None,
+    mel_bands: Optional[Sequence[int]] = None,
+  ) -> FeatureBundle:
+    # Whole-file bundle from `directory`, computed and saved on the first request. Entries are
+    # keyed by the audio bytes and the bank settings, like PCMStore entries.
+    path = self.cached_path(directory, audio_path, sr=sr)
+    if not os.path.exists(path):
+      bundle = self.from_file(audio_path, sr=sr, pcm_store=pcm_store)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+      bundle.save(tmp_path)
+      os.replace(tmp_path, path)
+    return FeatureBundle.load(path, mel_bands=mel_bands)
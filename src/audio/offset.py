@@ -0,0 +1,210 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Audio/beatmap offset check. The onset envelope of the audio is cross-correlated (via FFT)
+# with an impulse train of the map's hit object times on the same frame grid. The lag of the
+# correlation peak is the offset: a positive offset means the audio onsets come that many ms
+# after the objects, so the map's timing should move later by that amount. Maps sharing an
+# audio file are correlated against one envelope in a single batched FFT.
+
+DEFAULT_MAX_OFFSET_MS = 250.0
+DEFAULT_TOLERANCE_MS = 15.0
+DEFAULT_MIN_CONFIDENCE = 0.1
+
+
+@dataclass
+class OffsetResult:
+  path: str
+  audio_path: str
+  offset_ms: float
+  confidence: float   # normalised correlation at the peak
+  object_count: int
+  flags: List[str] = field(default_factory=list)
+
+  @property
+  def flagged(self) -> bool:
+    return bool(self.flags)
+
+
+def impulse_train(times_ms: Sequence[float], frame_count: int, frame_ms: float) -> np.ndarray:
+  frames = np.rint(np.asarray(times_ms, dtype=np.float64) / frame_ms).astype(np.int64)
+  frames = frames[(frames >= 0) & (frames < frame_count)]
+  return np.bincount(frames, minlength=frame_count).astype(np.float64)
+
+
+def correlate(envelope: np.ndarray, trains: np.ndarray, max_lag: int) -> np.ndarray:
+  # corr[j, max_lag + k] = sum_i envelope[i + k] * trains[j, i] for k in [-max_lag, max_lag].
+  n = len(envelope) + trains.shape[-1]
+  n = 1 << int(np.ceil(np.log2(max(n, 2))))
+  spectrum = np.fft.rfft(envelope, n) * np.conj(np.fft.rfft(trains, n, axis=-1))
+  full = np.fft.irfft(spectrum, n, axis=-1)
+  lags = np.arange(-max_lag, max_lag + 1) % n
+  return full[..., lags]
+
+
+def _peaks(corr: np.ndarray, max_lag: int) -> Tuple[np.ndarray, np.ndarray]:
+  # Sub-frame lag and height of each row's maximum; the lag is refined with a parabola
+  # through the peak and its neighbours.
+  rows = np.arange(len(corr))
+  best = corr.argmax(axis=1)
+  left = corr[rows, np.maximum(best - 1, 0)]
+  right = corr[rows, np.minimum(best + 1, corr.shape[1] - 1)]
+  peak = corr[rows, best]
+  curvature = left - 2 * peak + right
+  shift = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, 1.0), 0.0)
+  return best - max_lag + shift, peak
+
+
+def estimate_offsets(
+  envelope: np.ndarray,
+  frame_ms: float,
+  times: Sequence[Sequence[float]],
+  *,
+  max_offset_ms: float = DEFAULT_MAX_OFFSET_MS,
+) -> Tuple[np.ndarray, np.ndarray]:
+  # (offset_ms, confidence) for each list of object times against one onset envelope. The
+  # confidence is the normalised correlation (cosine similarity) at the peak: about 0 for
+  # unrelated times, larger the more of the envelope's onsets the objects line up with.
+  envelope = np.asarray(envelope, dtype=np.float64)
+  envelope = envelope - envelope.mean()
+  trains = np.vstack([impulse_train(t, len(envelope), frame_ms) for t in times])
+  max_lag = max(1, int(np.ceil(max_offset_ms / frame_ms)))
+  lags, peak = _peaks(correlate(envelope, trains, max_lag), max_lag)
+  norm = np.linalg.norm(envelope) * np.linalg.norm(trains, axis=1)
+  confidence = np.where(norm > 0, peak / np.where(norm > 0, norm, 1.0), 0.0)
+  return lags * frame_ms, confidence
+
+
+def estimate_offset(envelope: np.ndarray, frame_ms: float, times_ms: Sequence[float], **kwargs) -> Tuple[float, float]:
+  offsets, confidence = estimate_offsets(envelope, frame_ms, [times_ms], **kwargs)
+  return float(offsets[0]), float(confidence[0])
+
+
+def bundle_envelope(bundle) -> Tuple[np.ndarray, float]:
+  # Onset envelope of a FeatureBundle and its frame length in ms. Frame k of the (centred)
+  # STFT is centred on k * hop; bundle.times carries an extra n_fft / 2, so it is not used here.
+  return bundle.onset_strength, bundle.frame_duration_ms
+
+
+def flag_outliers(
+  results: List[OffsetResult],
+  *,
+  tolerance_ms: float = DEFAULT_TOLERANCE_MS,
+  min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+) -> List[OffsetResult]:
+  # Offsets are compared with the corpus median rather than 0, which absorbs any constant
+  # decoder delay; a map is flagged when it is further than tolerance_ms from it.
+  confident = [r.offset_ms for r in results if r.confidence >= min_confidence]
+  median = float(np.median(confident)) if confident else 0.0
+  for result in results:
+    result.flags = []
+    if result.object_count == 0:
+      result.flags.append("no_objects")
+    elif result.confidence < min_confidence:
+      result.flags.append("low_confidence")
+    elif abs(result.offset_ms - median) > tolerance_ms:
+      result.flags.append("offset")
+  return results
+
+
+def _map_times(path: str) -> Tuple[str, np.ndarray]:
+  from ..osu.beatmap import Beatmap
+
+  beatmap = Beatmap(file_path=path)
+  audio_path = os.path.join(os.path.dirname(path), beatmap.general.audio_filename.strip())
+  return audio_path, np.asarray(beatmap.hit_object_columns().time, dtype=np.float64)
+
+
+class OffsetChecker:
+  def __init__(
+    self,
+    feature_dir: str,
+    *,
+    bank=None,
+    sr: int = 22050,
+    pcm_store=None,
+    max_offset_ms: float = DEFAULT_MAX_OFFSET_MS,
+  ) -> None:
+    from .features import FeatureBank
+
+    self.feature_dir = feature_dir
+    self.bank = bank or FeatureBank(mel_bands=(64,))
+    self.sr = sr
+    self.pcm_store = pcm_store
+    self.max_offset_ms = max_offset_ms
+
+  def envelope(self, audio_path: str) -> Tuple[np.ndarray, float]:
+    # From the feature cache; audio is only decoded for files that have no entry yet.
+    bundle = self.bank.cached(audio_path, self.feature_dir, sr=self.sr, pcm_store=self.pcm_store, mel_bands=())
+    return bundle_envelope(bundle)
+
+  def check_audio(self, audio_path: str, maps: Sequence[Tuple[str, np.ndarray]]) -> List[OffsetResult]:
+    envelope, frame_ms = self.envelope(audio_path)
+    offsets, confidence = estimate_offsets(envelope, frame_ms, [times for _, times in maps], max_offset_ms=self.max_offset_ms)
+    return [
+      OffsetResult(path=path, audio_path=audio_path, offset_ms=float(offset), confidence=float(conf), object_count=len(times))
+      for (path, times), offset, conf in zip(maps, offsets, confidence)
+    ]
+
+  def check(self, paths: Iterable[str]) -> Iterator[OffsetResult]:
+    # Groups the maps by audio file so each envelope is loaded once. Maps whose audio is missing
+    # are reported with a "missing_audio" flag, maps that cannot be parsed with "parse_error".
+    groups: Dict[str, List[Tuple[str, np.ndarray]]] = OrderedDict()
+    for path in paths:
+      try:
+        audio_path, times = _map_times(path)
+      except (ValueError, IndexError):
+        yield OffsetResult(path, "", float("nan"), 0.0, 0, flags=["parse_error"])
+        continue
+      groups.setdefault(audio_path, []).append((path, times))
+    for audio_path, maps in groups.items():
+      if not os.path.exists(audio_path):
+        for path, times in maps:
+          yield OffsetResult(path, audio_path, float("nan"), 0.0, len(times), flags=["missing_audio"])
+        continue
+      yield from self.check_audio(audio_path, maps)
+
+  def check_corpus(self, paths: Iterable[str], **flag_kwargs) -> List[OffsetResult]:
+    results = list(self.check(paths))
+    found = [r for r in results if not r.flags]
+    flag_outliers(found, **flag_kwargs)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  from ..osu.index import iter_beatmap_files
+
+  parser = argparse.ArgumentParser(prog="python -m src.audio.offset", description="Check audio offsets of .osu files against their audio.")
+  parser.add_argument("paths", nargs="+", help=".osu files or directories (searched recursively)")
+  parser.add_argument("--feature-dir", required=True, help="feature cache (filled on first use)")
+  parser.add_argument("--pcm-dir", help="decoded audio cache used when features are missing")
+  parser.add_argument("--max-offset", type=float, default=DEFAULT_MAX_OFFSET_MS, help="search window in ms")
+  parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE_MS, help="allowed distance from the corpus median in ms")
+  parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE)
+  parser.add_argument("--flagged-only", action="store_true")
+  args = parser.parse_args(argv)
+
+  from .pcm import PCMStore
+
+  checker = OffsetChecker(
+    args.feature_dir,
+    pcm_store=PCMStore(args.pcm_dir) if args.pcm_dir else None,
+    max_offset_ms=args.max_offset,
+  )
+  paths = (path for root in args.paths for path in iter_beatmap_files(root))
+  results = checker.check_corpus(paths, tolerance_ms=args.tolerance, min_confidence=args.min_confidence)
+  for result in results:
+    if result.flagged or not args.flagged_only:
+      sys.stdout.write(json.dumps(asdict(result)) + "\n")
+  return 1 if any(result.flagged for result in results) else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# Decoded audio cached on disk as .npy files and read back as memory maps. Each audio file is
+# decoded (and resampled) once per (sr, mono, dtype); the entry is keyed by a hash of the
+# file's bytes, so every difficulty of a set shares the decode of its audio.mp3. sr=None (the
+# native rate, as in librosa.load) is resolved from the file's header first and keyed on that
+# rate, so it shares the entry of an explicit request for the same rate. Layout:
+#   directory/ab/abcdef...-22050-mono-float32.npy
+
+DTYPES = ("float32", "int16")
+_INT16_SCALE = 32767.0
+_HASH_CHUNK = 1 << 20
+
+
+def file_hash(path: str) -> str:
+  digest = hashlib.sha1()
+  with open(path, "rb") as f:
+    for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+class PCMStore:
+  def __init__(self, directory: str, *, dtype: str = "float32") -> None:
+    if dtype not in DTYPES:
+      raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+    self.directory = directory
+    self.dtype = dtype
+    self._lock = threading.Lock()
+    # (real path, size, mtime) -> content hash, so unchanged files are hashed once per process.
+    self._hashes: Dict[Tuple[str, int, int], str] = {}
+    # content hash -> native sample rate
+    self._native_rates: Dict[str, int] = {}
+    self._decodes = 0
+    self._hits = 0
+
+  def _hash(self, audio_path: str) -> str:
+    real_path = os.path.realpath(audio_path)
+    stat = os.stat(real_path)
+    key = (real_path, stat.st_size, stat.st_mtime_ns)
+    digest = self._hashes.get(key)
+    if digest is None:
+      digest = file_hash(real_path)
+      with self._lock:
+        self._hashes[key] = digest
+    return digest
+
+  def _native_rate(self, audio_path: str, digest: str) -> int:
+    rate = self._native_rates.get(digest)
+    if rate is None:
+      import librosa
+
+      rate = int(librosa.get_samplerate(audio_path))
+      with self._lock:
+        self._native_rates[digest] = rate
+    return rate
+
+  def path_for(self, digest: str, sr: int, mono: bool) -> str:
+    if sr is None:
+      raise ValueError("path_for needs a concrete sample rate; resolve sr=None with pcm() or load()")
+    name = f"{digest}-{int(sr)}-{'mono' if mono else 'multi'}-{self.dtype}.npy"
+    return os.path.join(self.directory, digest[:2], name)
+
+  def pcm(self, audio_path: str, *, sr: Optional[int] = 22050, mono: bool = True) -> np.ndarray:
+    # The whole decoded signal as a read-only memmap: (samples,) if mono, else (channels, samples).
+    return self._pcm(audio_path, sr, mono)[0]
+
+  def _pcm(self, audio_path: str, sr: Optional[int], mono: bool) -> Tuple[np.ndarray, int]:
+    digest = self._hash(audio_path)
+    if sr is None:
+      sr = self._native_rate(audio_path, digest)
+    path = self.path_for(digest, sr, mono)
+    if os.path.exists(path):
+      with self._lock:
+        self._hits += 1
+    else:
+      self._decode(audio_path, path, sr, mono)
+    return np.load(path, mmap_mode="r"), sr
+
+  def _decode(self, audio_path: str, path: str, sr: int, mono: bool) -> None:
+    import librosa
+
+    y, _ = librosa.load(audio_path, sr=sr, mono=mono)
+    if self.dtype == "int16":
+      y = np.round(np.clip(y, -1.0, 1.0) * _INT16_SCALE).astype(np.int16)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a unique name and renamed, so readers never see a partial file.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+      np.save(f, np.ascontiguousarray(y, dtype=self.dtype))
+    os.replace(tmp_path, path)
+    with self._lock:
+      self._decodes += 1
+
+  def load(
+    self,
+    audio_path: str,
+    *,
+    sr: Optional[int] = 22050,
+    mono: bool = True,
+    offset: float = 0.0,
+    duration: Optional[float] = None,
+  ) -> Tuple[np.ndarray, int]:
+    # Same contract as librosa.load(audio_path, sr=sr, mono=mono, offset=..., duration=...).
+    # float32 stores return a view into the memmap; int16 stores convert only the slice.
+    data, sr = self._pcm(audio_path, sr, mono)
+    start = max(0, int(round(offset * sr)))
+    stop = None if duration is None else start + int(round(duration * sr))
+    y = data[..., start:stop]
+    if self.dtype == "int16":
+      y = y.astype(np.float32) / _INT16_SCALE
+    return y, sr
+
+  def stats(self) -> Dict[str, int]:
+    with self._lock:
+      return {"decodes": self._decodes, "hits": self._hits}
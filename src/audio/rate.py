@@ -0,0 +1,151 @@
+from __future__ import annotations
+import math
+import warnings
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import numpy as np
+
+from .Parser import MelSpec
+
+# Rate-modded mel features from one decode and one STFT.
+#
+# DoubleTime/HalfTime keep the pitch, so their spectrogram is the original one read at
+# `rate` times the speed: frame j of the modded audio sits at original frame j * rate.
+# NightCore also shifts every frequency by `rate`, which is the same as reading the original
+# STFT bins as if the audio had been sampled at sr * rate; the mel filterbank is built for that
+# rate and the frames are then resampled like DT. Both steps are linear in the power
+# spectrogram, so they are applied to the (small) mel power rather than to the STFT, and the
+# STFT only has to be projected once per distinct pitch factor.
+
+PITCH_MODS = ("NightCore",)
+
+
+def rate_for_mods(mods: Optional[Sequence[str]]) -> Tuple[float, bool]:
+  # (clock rate, whether the pitch follows it), matching the difficulty calculator's rates.
+  from ..osu.difficulty.mods import clock_rate_for_mods, normalise_mods
+
+  mods = normalise_mods(mods)
+  return clock_rate_for_mods(mods), any(mod in PITCH_MODS for mod in mods)
+
+
+def resample_frames(S: np.ndarray, rate: float) -> np.ndarray:
+  # Linear interpolation along the frame axis: output frame j is input frame j * rate.
+  if rate == 1.0:
+    return S
+  frames = S.shape[1]
+  out_frames = max(1, int(math.ceil(frames / rate)))
+  positions = np.minimum(np.arange(out_frames) * rate, frames - 1)
+  left = np.floor(positions).astype(np.intp)
+  right = np.minimum(left + 1, frames - 1)
+  weight = (positions - left).astype(S.dtype)
+  return S[:, left] * (1 - weight) + S[:, right] * weight
+
+
+class RateFeatures:
+  def __init__(
+    self,
+    y: np.ndarray,
+    sr: int,
+    *,
+    n_fft: int = 2048,
+    hop_length: Optional[int] = None,
+    hop_ms: Optional[float] = 10.0,
+    win_length: Optional[int] = None,
+    window: str = "hann",
+    center: bool = True,
+    pad_mode: str = "constant",
+    n_mels: int = 128,
+    fmin: float = 30.0,
+    fmax: Optional[float] = None,
+    power: float = 2.0,
+    ref: float = 1.0,
+    top_db: float = 80.0,
+  ):
+    if hop_length is None:
+      hop_length = 512 if hop_ms is None else max(1, int(round(sr * (hop_ms / 1000.0))))
+    self.y = y
+    self.sr = sr
+    self.n_fft = n_fft
+    self.hop_length = hop_length
+    self.win_length = win_length
+    self.window = window
+    self.center = center
+    self.pad_mode = pad_mode
+    self.n_mels = n_mels
+    self.fmin = fmin
+    self.fmax = fmax
+    self.power = power
+    self.ref = ref
+    self.top_db = top_db
+    self._stft: Optional[np.ndarray] = None
+    # Mel power per pitch factor (1.0 unless NightCore), and finished spectrograms per (rate, pitch).
+    self._mel_power: Dict[float, np.ndarray] = {}
+    self._specs: Dict[Tuple[float, bool], MelSpec] = {}
+
+  @classmethod
+  def from_file(cls, audio_path: str, *, sr: int = 22050, mono: bool = True, offset: float = 0.0, duration: Optional[float] = None, pcm_store=None, **kwargs) -> "RateFeatures":
+    if pcm_store is not None:
+      y, sr_eff = pcm_store.load(audio_path, sr=sr, mono=mono, offset=offset, duration=duration)
+    else:
+      import librosa
+
+      y, sr_eff = librosa.load(audio_path, sr=sr, mono=mono, offset=offset, duration=duration)
+    return cls(y, sr_eff, **kwargs)
+
+  def _power_spectrum(self) -> np.ndarray:
+    if self._stft is None:
+      import librosa
+
+      S = librosa.stft(
+        self.y, n_fft=self.n_fft, hop_length=self.hop_length, win_length=self.win_length,
+        window=self.window, center=self.center, pad_mode=self.pad_mode,
+      )
+      self._stft = np.abs(S) ** self.power
+    return self._stft
+
+  def _mel(self, pitch: float) -> np.ndarray:
+    if pitch not in self._mel_power:
+      import librosa
+
+      with warnings.catch_warnings():
+        # Slowed-down pitch (rate < 1) leaves the top mel bands without any STFT bins.
+        warnings.filterwarnings("ignore", message="Empty filters detected")
+        basis = librosa.filters.mel(
+          sr=self.sr * pitch, n_fft=self.n_fft, n_mels=self.n_mels, fmin=self.fmin, fmax=self.fmax or self.sr / 2,
+        )
+      self._mel_power[pitch] = basis @ self._power_spectrum()
+    return self._mel_power[pitch]
+
+  def precompute(self, mod_combos: Iterable[Optional[Sequence[str]]]) -> None:
+    # Builds every requested variant, then frees the STFT (the mel power stays cached).
+    for mods in mod_combos:
+      self.spectrogram(mods)
+    self.release_stft()
+
+  def release_stft(self) -> None:
+    self._stft = None
+
+  def spectrogram(self, mods: Optional[Sequence[str]] = None, *, rate: Optional[float] = None, pitch: Optional[bool] = None) -> MelSpec:
+    # Mel spectrogram of the audio as played with `mods` (or an explicit rate/pitch). Times are
+    # in the modded timeline, matching Beatmap.with_clock_rate(rate).
+    import librosa
+
+    mod_rate, mod_pitch = rate_for_mods(mods)
+    rate = mod_rate if rate is None else rate
+    pitch = mod_pitch if pitch is None else pitch
+    if rate <= 0:
+      raise ValueError(f"rate must be positive, got {rate}")
+
+    key = (rate, pitch)
+    if key not in self._specs:
+      mel_power = resample_frames(self._mel(rate if pitch else 1.0), rate)
+      S_db = librosa.power_to_db(mel_power, ref=self.ref, top_db=self.top_db)
+      times = librosa.frames_to_time(np.arange(S_db.shape[1]), sr=self.sr, hop_length=self.hop_length, n_fft=self.n_fft)
+      freqs = librosa.mel_frequencies(n_mels=self.n_mels, fmin=self.fmin, fmax=(self.fmax or self.sr / 2))
+      self._specs[key] = MelSpec(
+        S_db=S_db, times=times, freqs=freqs, sr=self.sr,
+        hop_length=self.hop_length, n_fft=self.n_fft, n_mels=self.n_mels,
+        fmin=self.fmin, fmax=self.fmax, power=self.power, ref=self.ref, top_db=self.top_db,
+        frame_duration_ms=self.hop_length / self.sr * 1000.0,
+        window=self.window, center=self.center,
+      )
+    return self._specs[key]
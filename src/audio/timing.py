@@ -0,0 +1,238 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .offset import bundle_envelope
+
+# Red lines (BPM and offset) from an onset envelope.
+#
+#  1. tempogram   autocorrelation of overlapping envelope windows, one batched FFT; the whole
+#                 envelope's autocorrelation gives the dominant beat period. A log-normal prior
+#                 around DEFAULT_PRIOR_BPM decides between tempo octaves.
+#  2. segments    windows whose local period leaves the current segment's period by more than
+#                 `tolerance` for `min_windows` windows in a row start a new segment (a BPM change).
+#                 Windows with little periodicity (intros, breaks) and windows locked to a simple
+#                 metrical relative of the current period (2/3, 3/4, ...: triplet feels, half-time)
+#                 do not count, since the current grid still fits them.
+#  3. refinement  per segment, the envelope is folded onto candidate periods around the coarse
+#                 one (phase histograms for all of them at once). The sharpest fold gives the
+#                 period and the beat phase; the search zooms in over a few passes.
+
+DEFAULT_MIN_BPM = 60.0
+DEFAULT_MAX_BPM = 300.0
+DEFAULT_PRIOR_BPM = 170.0
+DEFAULT_PRIOR_OCTAVES = 0.9
+DEFAULT_WINDOW_MS = 8000.0
+DEFAULT_HOP_MS = 2000.0
+DEFAULT_TOLERANCE = 0.02
+DEFAULT_MIN_WINDOWS = 4
+DEFAULT_MIN_STRENGTH = 0.25
+RELATED_RATIOS = (1.0, 0.5, 2.0, 2.0 / 3.0, 1.5, 0.75, 4.0 / 3.0)
+# The onset envelope peaks about a sixth of the STFT window after the onset (measured with
+# bench_timing.py); used as the default latency for FeatureBundle envelopes.
+ONSET_LATENCY_WINDOWS = 1.0 / 6.0
+_REFINE_PASSES = 3
+_REFINE_STEPS = 101
+_FOLD_CHUNK = 32
+
+
+@dataclass
+class TimingSegment:
+  start_ms: float
+  end_ms: float
+  beat_length: float
+  offset: float      # time of the first beat at or after start_ms
+  strength: float    # fold peak over fold mean; 1.0 means no beat structure at all
+
+  @property
+  def bpm(self) -> float:
+    return 60000.0 / self.beat_length
+
+
+def _acf(frames: np.ndarray) -> np.ndarray:
+  # Autocorrelation of each row (rows are mean-removed), normalised by lag 0.
+  frames = frames - frames.mean(axis=-1, keepdims=True)
+  n = 1 << int(np.ceil(np.log2(2 * frames.shape[-1])))
+  spectrum = np.fft.rfft(frames, n, axis=-1)
+  acf = np.fft.irfft(spectrum * np.conj(spectrum), n, axis=-1)[..., :frames.shape[-1]]
+  zero = acf[..., :1]
+  return np.where(zero > 0, acf / np.where(zero > 0, zero, 1.0), 0.0)
+
+
+def tempogram(
+  envelope: np.ndarray,
+  frame_ms: float,
+  *,
+  window_ms: float = DEFAULT_WINDOW_MS,
+  hop_ms: float = DEFAULT_HOP_MS,
+) -> Tuple[np.ndarray, np.ndarray]:
+  # (window start times in ms, autocorrelation per window (windows x lags)); lag i is i * frame_ms.
+  envelope = np.asarray(envelope, dtype=np.float64)
+  width = min(len(envelope), max(2, int(round(window_ms / frame_ms))))
+  step = max(1, int(round(hop_ms / frame_ms)))
+  windows = np.lib.stride_tricks.sliding_window_view(envelope, width)[::step]
+  starts = np.arange(len(windows)) * step * frame_ms
+  return starts, _acf(windows)
+
+
+def _prior(lags_ms: np.ndarray, prior_bpm: float, prior_octaves: float) -> np.ndarray:
+  return np.exp(-0.5 * (np.log2(lags_ms / (60000.0 / prior_bpm)) / prior_octaves) ** 2)
+
+
+def _best_lags(acf: np.ndarray, frame_ms: float, min_bpm: float, max_bpm: float, prior_bpm: float, prior_octaves: float) -> Tuple[np.ndarray, np.ndarray]:
+  # Beat period (ms, parabola-refined) of each autocorrelation row within the BPM range, and
+  # the autocorrelation there.
+  lo = max(1, int(np.floor(60000.0 / max_bpm / frame_ms)))
+  hi = min(acf.shape[-1] - 2, int(np.ceil(60000.0 / min_bpm / frame_ms)))
+  if hi <= lo:
+    raise ValueError("envelope too short for the requested BPM range")
+  lags = np.arange(lo, hi + 1)
+  weighted = acf[:, lo:hi + 1] * _prior(lags * frame_ms, prior_bpm, prior_octaves)
+  best = weighted.argmax(axis=1) + lo
+  rows = np.arange(len(acf))
+  left, peak, right = acf[rows, best - 1], acf[rows, best], acf[rows, best + 1]
+  curvature = left - 2 * peak + right
+  shift = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, 1.0), 0.0)
+  return (best + np.clip(shift, -0.5, 0.5)) * frame_ms, peak
+
+
+def _fold(envelope: np.ndarray, times: np.ndarray, periods: np.ndarray, bins: int) -> np.ndarray:
+  # Phase histograms (periods x bins) of the envelope folded onto each period, circularly smoothed.
+  out = np.empty((len(periods), bins))
+  for start in range(0, len(periods), _FOLD_CHUNK):
+    chunk = periods[start:start + _FOLD_CHUNK]
+    idx = (np.mod(times[None, :], chunk[:, None]) / chunk[:, None] * bins).astype(np.int64) % bins
+    idx += np.arange(len(chunk))[:, None] * bins
+    hist = np.bincount(idx.ravel(), weights=np.broadcast_to(envelope, idx.shape).ravel(), minlength=len(chunk) * bins)
+    out[start:start + len(chunk)] = hist.reshape(len(chunk), bins)
+  return 0.25 * np.roll(out, 1, axis=1) + 0.5 * out + 0.25 * np.roll(out, -1, axis=1)
+
+
+def refine(
+  envelope: np.ndarray,
+  frame_ms: float,
+  period_ms: float,
+  *,
+  start_frame: int = 0,
+  stop_frame: Optional[int] = None,
+  search: float = 0.02,
+) -> Tuple[float, float, float]:
+  # (period, phase, strength) of the sharpest fold within period_ms * (1 +- search). The phase
+  # is a time in [0, period) on the envelope's timeline.
+  envelope = np.asarray(envelope, dtype=np.float64)[start_frame:stop_frame]
+  times = (np.arange(len(envelope)) + start_frame) * frame_ms
+  envelope = envelope - np.median(envelope)
+  bins = max(16, int(round(period_ms / (frame_ms / 2))))
+  period, span = period_ms, period_ms * search
+  for _ in range(_REFINE_PASSES):
+    periods = period + np.linspace(-span, span, _REFINE_STEPS)
+    hist = _fold(envelope, times, periods, bins)
+    best = int(hist.max(axis=1).argmax())
+    period = periods[best]
+    span = 2 * span / (_REFINE_STEPS - 1)
+  hist = hist[best]
+  top = int(hist.argmax())
+  left, peak, right = hist[top - 1], hist[top], hist[(top + 1) % bins]
+  curvature = left - 2 * peak + right
+  shift = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+  phase = ((top + 0.5 + shift) / bins * period) % period
+  spread = hist - hist.min()
+  strength = float(spread.max() / spread.mean()) if spread.mean() > 0 else 1.0
+  return float(period), float(phase), strength
+
+
+def _agrees(period: float, reference: float, tolerance: float) -> bool:
+  return any(abs(period * ratio / reference - 1.0) <= tolerance for ratio in RELATED_RATIOS)
+
+
+def _segment_period(periods: np.ndarray, whole: float, tolerance: float) -> float:
+  # A segment's own tempo: the song's dominant period if the segment has it, otherwise its most
+  # common period; metrical relatives in between do not pull it away.
+  near_whole = np.abs(periods / whole - 1.0) <= tolerance
+  if near_whole.any():
+    return float(np.median(periods[near_whole]))
+  agreement = (np.abs(periods[:, None] / periods[None, :] - 1.0) <= tolerance).sum(axis=0)
+  mode = periods[int(np.argmax(agreement))]
+  return float(np.median(periods[np.abs(periods / mode - 1.0) <= tolerance]))
+
+
+def _segments(local: np.ndarray, strength: np.ndarray, whole: float, tolerance: float, min_windows: int, min_strength: float) -> List[Tuple[int, int]]:
+  # Runs of windows with a stable period: [first, last + 1) window indices.
+  clear = strength >= min_strength
+  bounds = [0]
+  for i in range(1, len(local)):
+    current = local[bounds[-1]:i][clear[bounds[-1]:i]]
+    if not len(current):
+      continue
+    reference = _segment_period(current, whole, tolerance)
+    window = slice(i, i + min_windows)
+    if len(local[window]) == min_windows and clear[window].all() and not any(_agrees(p, reference, tolerance) for p in local[window]):
+      bounds.append(i)
+  bounds.append(len(local))
+  return list(zip(bounds[:-1], bounds[1:]))
+
+
+def infer_segments(
+  envelope: np.ndarray,
+  frame_ms: float,
+  *,
+  min_bpm: float = DEFAULT_MIN_BPM,
+  max_bpm: float = DEFAULT_MAX_BPM,
+  prior_bpm: float = DEFAULT_PRIOR_BPM,
+  prior_octaves: float = DEFAULT_PRIOR_OCTAVES,
+  window_ms: float = DEFAULT_WINDOW_MS,
+  hop_ms: float = DEFAULT_HOP_MS,
+  tolerance: float = DEFAULT_TOLERANCE,
+  min_windows: int = DEFAULT_MIN_WINDOWS,
+  min_strength: float = DEFAULT_MIN_STRENGTH,
+  latency_ms: float = 0.0,
+) -> List[TimingSegment]:
+  # latency_ms is subtracted from every beat time, for envelopes that peak after the onsets.
+  envelope = np.asarray(envelope, dtype=np.float64)
+  total_ms = len(envelope) * frame_ms
+  whole = _best_lags(_acf(envelope[None, :]), frame_ms, min_bpm, max_bpm, prior_bpm, prior_octaves)[0][0]
+
+  starts, acf = tempogram(envelope, frame_ms, window_ms=window_ms, hop_ms=hop_ms)
+  local, local_strength = _best_lags(acf, frame_ms, min_bpm, max_bpm, prior_bpm, prior_octaves)
+  # Local tempo-octave flips are not tempo changes.
+  local = local * 2.0 ** np.round(np.log2(whole / local))
+  width_ms = min(window_ms, total_ms)
+
+  segments: List[TimingSegment] = []
+  for first, last in _segments(local, local_strength, whole, tolerance, min_windows, min_strength):
+    start_ms = 0.0 if first == 0 else starts[first] + width_ms / 2 - hop_ms / 2
+    end_ms = total_ms if last == len(local) else starts[last] + width_ms / 2 - hop_ms / 2
+    periods = local[first:last][local_strength[first:last] >= min_strength]
+    coarse = _segment_period(periods if len(periods) else local[first:last], whole, tolerance)
+    period, phase, strength = refine(
+      envelope, frame_ms, coarse,
+      start_frame=int(start_ms / frame_ms), stop_frame=int(np.ceil(end_ms / frame_ms)),
+      search=max(2 * tolerance, 0.01),
+    )
+    phase -= latency_ms
+    offset = phase + np.ceil((start_ms - phase) / period) * period
+    if segments and abs(period / segments[-1].beat_length - 1.0) <= tolerance / 4:
+      # Same tempo on both sides of a spurious split: extend the previous segment.
+      segments[-1].end_ms = end_ms
+      continue
+    segments.append(TimingSegment(start_ms, end_ms, period, float(offset), strength))
+  return segments
+
+
+def infer_timing(envelope: np.ndarray, frame_ms: float, *, meter: int = 4, **kwargs) -> List["TimingPoint"]:
+  # One uninherited TimingPoint per tempo segment, at the segment's first beat (whole ms, as
+  # the editor writes them).
+  from ..osu.timing_point import TimingPoint
+
+  return [
+    TimingPoint(time=int(round(segment.offset)), beat_length=segment.beat_length, meter=meter, uninherited=1)
+    for segment in infer_segments(envelope, frame_ms, **kwargs)
+  ]
+
+
+def infer_timing_from_bundle(bundle, *, latency_ms: Optional[float] = None, **kwargs) -> List["TimingPoint"]:
+  envelope, frame_ms = bundle_envelope(bundle)
+  if latency_ms is None:
+    latency_ms = bundle.n_fft / bundle.sr * 1000.0 * ONSET_LATENCY_WINDOWS
+  return infer_timing(envelope, frame_ms, latency_ms=latency_ms, **kwargs)
@@ -1,7 +1,11 @@
-from . import sections, difficulty, hit_object
+from typing import TYPE_CHECKING
+
+from .._lazy import attach
+from . import sections, hit_object
 from .sections import (
   General,
   Difficulty,
+  Metadata,
 )
 from .timing_point import TimingPoint
 from .hit_sample import HitSample
@@ -15,18 +19,41 @@ from .hit_object import (
   SpinnerObjectParams
 )
 from .beatmap import Beatmap
+from .stream import BeatmapStream
+from .columns import HitObjectColumns
+from .writer import write_beatmap
 from .mods import Mods
-from .difficulty import (
-  DifficultyAttributes,
-  PerformanceAttributes,
-  calculate_difficulty,
-  calculate_performance,
-)
+
+# The difficulty subsystem (and the numpy-based snapping, dedup, patterns, descriptors and
+# tokenizer) is only imported on first use so that parsing-only callers (CLI tools, worker
+# processes) start fast.
+__getattr__, __dir__ = attach(__name__, submodules=["difficulty", "snapping", "dedup", "patterns", "descriptors", "tokenizer"], attributes={
+  "DifficultyAttributes": ".difficulty",
+  "PerformanceAttributes": ".difficulty",
+  "calculate_difficulty": ".difficulty",
+  "calculate_performance": ".difficulty",
+  "calculate_difficulty_batch": ".difficulty",
+  "calculate_difficulty_streaming": ".difficulty",
+  "DifficultyProfiler": ".difficulty",
+})
+
+if TYPE_CHECKING:
+  from . import difficulty
+  from .difficulty import (
+    DifficultyAttributes,
+    PerformanceAttributes,
+    calculate_difficulty,
+    calculate_performance,
+    calculate_difficulty_batch,
+    calculate_difficulty_streaming,
+    DifficultyProfiler,
+  )
 
 __all__ = [
   "sections",
   "General",
   "Difficulty",
+  "Metadata",
   "TimingPoint",
   "HitSample",
   "hit_object",
@@ -38,10 +65,16 @@ __all__ = [
   "Spinner", 
   "SpinnerObjectParams",
   "Beatmap", 
+  "BeatmapStream",
+  "HitObjectColumns",
+  "write_beatmap",
   "Mods",
   "difficulty",
   "DifficultyAttributes",
   "PerformanceAttributes",
   "calculate_difficulty",
   "calculate_performance",
+  "calculate_difficulty_batch",
+  "calculate_difficulty_streaming",
+  "DifficultyProfiler",
 ]
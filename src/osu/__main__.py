@@ -0,0 +1,215 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, fields
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .index import iter_beatmap_files
+from .mods import Mods
+
+_CACHES: Dict[Optional[str], object] = {}
+
+
+def _cache_for(cache_dir: Optional[str]):
+  # One cache per worker process (or per run with threads); entries on disk are shared.
+  from .difficulty.cache import AttributeCache
+
+  if cache_dir not in _CACHES:
+    _CACHES[cache_dir] = AttributeCache(directory=cache_dir)
+  return _CACHES[cache_dir]
+
+
+def process_file(path: str, mod_combos: List[List[str]], cache_dir: Optional[str] = None, profile: bool = False, backend: Optional[str] = None, stream: bool = False) -> Tuple[str, List[dict], list]:
+  from .beatmap import Beatmap
+  from .difficulty.cache import content_hash, file_hash
+  from .difficulty.calculator import calculate_difficulty
+  from .difficulty.profiling import DifficultyProfiler
+
+  raw = None
+  if stream:
+    digest = file_hash(path)
+  else:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+      raw = f.read()
+    digest = content_hash(raw)
+  cache = _cache_for(cache_dir) if cache_dir is not None else None
+  profiler = DifficultyProfiler() if profile else None
+
+  beatmap = None
+  results = []
+  for mods in mod_combos:
+    attributes = cache.get(digest, mods) if cache is not None else None
+    if attributes is None and stream:
+      from .difficulty.streaming import calculate_difficulty_streaming
+
+      # Streamed attributes have no strains, so they are not cached for full runs to reuse.
+      results.append(asdict(calculate_difficulty_streaming(path, mods)))
+      continue
+    if attributes is None:
+      # Parsed at most once, and only if something is missing from the cache.
+      beatmap = beatmap or Beatmap(raw=raw)
+      attributes = calculate_difficulty(beatmap, mods, profiler=profiler, backend=backend)
+      if cache is not None:
+        cache.put(digest, mods, attributes)
+    results.append(asdict(attributes))
+  return digest, results, profiler.records if profiler else []
+
+
+def parse_mods(value: str) -> List[str]:
+  mods = [mod.strip() for mod in value.replace("+", ",").split(",") if mod.strip()]
+  for mod in mods:
+    if mod not in Mods.__members__:
+      raise argparse.ArgumentTypeError(f"unknown mod {mod!r} (expected one of {', '.join(Mods.__members__)})")
+  return [mod for mod in mods if mod != "NoMod"]
+
+
+def _expand(path: str) -> Iterator[str]:
+  # Missing files are passed through so they are reported like any other failure.
+  if os.path.isdir(path):
+    yield from iter_beatmap_files(path)
+  else:
+    yield path
+
+
+def iter_inputs(paths: Sequence[str], file_list: Optional[str]) -> Iterator[str]:
+  for path in paths:
+    yield from _expand(path)
+  if file_list:
+    with (sys.stdin if file_list == "-" else open(file_list, "r", encoding="utf-8")) as f:
+      for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+          yield from _expand(line)
+
+
+def iter_results(inputs: Iterator[str], mod_combos: List[List[str]], *, workers: int, threads: bool, ordered: bool, cache_dir: Optional[str], profile: bool, backend: Optional[str] = None, stream: bool = False):
+  # Yields (path, digest, [attribute dicts], records, error) while keeping at most a few
+  # tasks per worker queued, so huge file lists are not read into memory up front.
+  executor = (ThreadPoolExecutor if threads else ProcessPoolExecutor)(max_workers=workers)
+  pending = {}
+  ready: Dict[int, tuple] = {}
+  next_index = 0
+
+  def finished(done):
+    for future in done:
+      idx, path = pending.pop(future)
+      try:
+        digest, results, records = future.result()
+        yield idx, (path, digest, results, records, None)
+      except Exception as e:
+        yield idx, (path, None, [], [], f"{type(e).__name__}: {e}")
+
+  try:
+    inputs = enumerate(inputs)
+    exhausted = False
+    while not exhausted or pending:
+      while not exhausted and len(pending) < workers * 4:
+        item = next(inputs, None)
+        if item is None:
+          exhausted = True
+          break
+        idx, path = item
+        pending[executor.submit(process_file, path, mod_combos, cache_dir, profile, backend, stream)] = (idx, path)
+      if not pending:
+        break
+
+      done, _ = wait(pending, return_when=FIRST_COMPLETED)
+      for idx, result in finished(done):
+        if not ordered:
+          yield result
+          continue
+        ready[idx] = result
+        while next_index in ready:
+          yield ready.pop(next_index)
+          next_index += 1
+  finally:
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(prog="python -m src.osu", description="Batch difficulty/performance calculation for .osu files.")
+  parser.add_argument("paths", nargs="*", help=".osu files or directories (searched recursively)")
+  parser.add_argument("--file-list", help="file with one .osu path or directory per line ('-' for stdin)")
+  parser.add_argument("--mods", action="append", type=parse_mods, help="mod combo such as DoubleTime,HardRock; repeat for several combos (default: NoMod)")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+  parser.add_argument("--threads", action="store_true", help="use threads instead of worker processes")
+  parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+  parser.add_argument("--order", choices=("completion", "input"), default="completion")
+  parser.add_argument("--strains", action="store_true", help="include per-object strains (jsonl only)")
+  parser.add_argument("--pp", action="store_true", help="also compute performance attributes")
+  parser.add_argument("--accuracy", type=float, default=1.0)
+  parser.add_argument("--misses", type=int, default=0)
+  parser.add_argument("--combo", type=int, default=None)
+  parser.add_argument("--backend", choices=("python", "numba", "auto"), default=None, help="evaluator backend (default: $OSU_DIFFICULTY_BACKEND or python)")
+  parser.add_argument("--cache-dir", help="reuse difficulty attributes across runs")
+  parser.add_argument("--profile", action="store_true", help="print per-stage timings to stderr")
+  parser.add_argument("--stream", action="store_true", help="bounded-memory calculation for marathon maps (Python evaluators, no strains)")
+  args = parser.parse_args(argv)
+
+  if not args.paths and not args.file_list:
+    parser.error("no input: pass .osu paths, directories or --file-list")
+  if args.stream and args.strains:
+    parser.error("--strains is not available with --stream")
+
+  from .difficulty import DifficultyAttributes, DifficultyProfiler, PerformanceAttributes, calculate_performance
+
+  mod_combos = args.mods or [[]]
+  profiler = DifficultyProfiler() if args.profile else None
+  columns = ["path", "content_hash", "mods"]
+  columns += [f.name for f in fields(DifficultyAttributes) if f.name not in ("mods", "strains", "strain_timeline")]
+  if args.pp:
+    columns += [f.name for f in fields(PerformanceAttributes) if f.name not in columns]
+  columns.append("error")
+
+  writer = None
+  if args.format == "csv":
+    writer = csv.DictWriter(sys.stdout, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+
+  errors = 0
+  results = iter_results(
+    iter_inputs(args.paths, args.file_list), mod_combos,
+    workers=max(1, args.workers), threads=args.threads, ordered=args.order == "input",
+    cache_dir=args.cache_dir, profile=args.profile, backend=args.backend, stream=args.stream,
+  )
+  for path, digest, attributes_list, records, error in results:
+    if profiler is not None:
+      profiler.merge(records)
+    if error is not None:
+      errors += 1
+      print(f"{path}: {error}", file=sys.stderr)
+      rows = [{"path": path, "mods": mods, "error": error} for mods in mod_combos]
+    else:
+      rows = []
+      for mods, values in zip(mod_combos, attributes_list):
+        row = {"path": path, "content_hash": digest, **values, "mods": mods}
+        del row["strain_timeline"]
+        if not args.strains or writer is not None:
+          del row["strains"]
+        if args.pp:
+          performance = calculate_performance(DifficultyAttributes(**values), accuracy=args.accuracy, combo=args.combo, misses=args.misses)
+          row.update(asdict(performance))
+        rows.append(row)
+
+    for row in rows:
+      if writer is not None:
+        writer.writerow({**row, "mods": "+".join(row["mods"]) or "NoMod"})
+      else:
+        sys.stdout.write(json.dumps(row) + "\n")
+    sys.stdout.flush()
+
+  if profiler is not None:
+    print(profiler.format_summary(), file=sys.stderr)
+  return 1 if errors else 0
+
+
+if __name__ == "__main__":
+  try:
+    sys.exit(main())
+  except BrokenPipeError:
+    # Output piped into head & co.; stop quietly.
+    sys.stderr.close()
+    sys.exit(1)
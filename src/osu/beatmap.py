@@ -1,22 +1,132 @@
 from .sections.general import General
 from .sections.difficulty import Difficulty
+from .sections.metadata import Metadata
 from .timing_point import TimingPoint
 from .hit_object import Circle, Slider, Spinner, HitObject
-from typing import Optional, Union, List
+from .columns import HitObjectColumns, format_slider_params, SLIDER, SPINNER
+from .formatting import format_number
+from .writer import DEFAULT_CHUNK_SIZE, iter_chunks, iter_hit_object_lines, iter_timing_point_lines
+from typing import Callable, Dict, Iterator, Optional, Sequence, Union, List, Tuple
+import copy
+import re
+import threading
+
+SECTION_ORDER = ["General", "Editor", "Metadata", "Difficulty", "Events", "TimingPoints", "Colours", "HitObjects"]
+DEFAULT_FORMAT_LINE = "osu file format v14"
+
+_SECTION_HEADER = re.compile(r"^[ \t]*\[([^\]\r\n]+)\][ \t]*\r?$", re.MULTILINE)
+
+
+class _LazySection:
+  # Parses a section from its raw text the first time it is accessed. Until then
+  # the section is written back verbatim by Beatmap.__str__.
+  def __init__(self, section: str, parse: Callable[["Beatmap", str], object]):
+    self.section = section
+    self.parse = parse
+
+  def __set_name__(self, owner, name: str):
+    self.attribute = name
+
+  def __get__(self, beatmap: "Beatmap", owner=None):
+    if beatmap is None:
+      return self
+    parsed = beatmap._parsed
+    if self.section in parsed:
+      return parsed[self.section]
+    # Several threads may share one beatmap; only one of them parses a section. The lock is
+    # reentrant because parsing hit objects reads timing points and difficulty.
+    with beatmap._lock:
+      if self.section in parsed:
+        return parsed[self.section]
+      if self.section in beatmap._deferred:
+        value = beatmap._deferred[self.section]()
+      elif self.section in beatmap._section_spans:
+        value = self.parse(beatmap, beatmap.raw_section(self.section))
+      else:
+        raise AttributeError(f"'Beatmap' object has no attribute '{self.attribute}'")
+      parsed[self.section] = value
+      beatmap._deferred.pop(self.section, None)
+      return value
+
+  def __set__(self, beatmap: "Beatmap", value):
+    beatmap._parsed[self.section] = value
+    beatmap._deferred.pop(self.section, None)
+    beatmap._add_section_name(self.section)
+
+  def __delete__(self, beatmap: "Beatmap"):
+    beatmap._parsed.pop(self.section, None)
+    beatmap._deferred.pop(self.section, None)
+    beatmap._section_spans.pop(self.section, None)
+    if self.section in beatmap._section_names:
+      beatmap._section_names.remove(self.section)
+
+
+def _section_lines(content: str) -> List[str]:
+  return [line for line in (row.strip() for row in content.splitlines()) if line and not line.startswith("//")]
+
+
+def _scale_event(line: str, rate: float) -> str:
+  # Breaks ("2,start,end") and the video offset ("1,offset,...") follow the clock rate;
+  # backgrounds, comments and storyboard lines are kept as they are.
+  segments = line.split(",")
+  kind = segments[0].strip()
+  if kind in ("2", "Break") and len(segments) >= 3:
+    segments[1] = format_number(float(segments[1]) / rate)
+    segments[2] = format_number(float(segments[2]) / rate)
+  elif kind in ("1", "Video") and len(segments) >= 2:
+    segments[1] = format_number(float(segments[1]) / rate)
+  return ",".join(segments)
+
+
+def _parse_timing_points(beatmap: "Beatmap", content: str) -> List[TimingPoint]:
+  return [TimingPoint(raw=line) for line in _section_lines(content)]
+
+
+def _parse_hit_objects(beatmap: "Beatmap", content: str) -> List[Union[Circle, Slider, Spinner]]:
+  hit_objects: List[Union[Circle, Slider, Spinner]] = []
+  for line in _section_lines(content):
+    hit_object_class = beatmap.hit_object_type(line, 0)
+    hit_objects.append(hit_object_class(raw=line))
+  beatmap._recalculate_slider_durations(hit_objects)
+  return hit_objects
+
 
 class Beatmap():
+  general = _LazySection("General", lambda beatmap, content: General(raw=content))
+  metadata = _LazySection("Metadata", lambda beatmap, content: Metadata(raw=content))
+  difficulty = _LazySection("Difficulty", lambda beatmap, content: Difficulty(raw=content))
+  timing_points = _LazySection("TimingPoints", _parse_timing_points)
+  hit_objects = _LazySection("HitObjects", _parse_hit_objects)
+
   def __init__(
-    self, *, 
-    raw: str = "", 
+    self, *,
+    raw: str = "",
     file_path: str = "",
     general: General = None,
     timing_points: List[TimingPoint] = None,
     hit_objects: List[Union[Circle, Slider, Spinner]] = None
   ):
+    self.file_path = file_path
+    self._raw = ""
+    self._preamble = ""
+    self._newline = "\n"
+    self._section_spans: Dict[str, Tuple[int, int, int]] = {}
+    self._section_names: List[str] = []
+    self._parsed: Dict[str, object] = {}
+    # Sections backed by something other than raw text (e.g. columnar hit objects),
+    # materialised on first access.
+    self._deferred: Dict[str, Callable[[], object]] = {}
+    self._columns: Optional[HitObjectColumns] = None
+    self._lock = threading.RLock()
+
     if file_path:
-      with open(file_path, "r", encoding="utf-8") as f:
+      # newline="" keeps the original line endings so untouched sections round-trip byte for byte.
+      with open(file_path, "r", encoding="utf-8", newline="") as f:
         raw = f.read()
 
+    if raw:
+      self._load_raw(raw)
+
     if general:
       self.general = general
     if timing_points:
@@ -24,25 +134,130 @@ class Beatmap():
     if hit_objects:
       self.hit_objects = hit_objects
 
-    if raw:
-      for section, content in self.split_sections(raw).items():
-        if section == "General":
-          self.general = General(raw=content)
-        if section == "Difficulty":
-          self.difficulty = Difficulty(raw=content)
-        elif section == "TimingPoints":
-          self.timing_points = [TimingPoint(raw=line) for line in content.splitlines()]
-        elif section == "HitObjects":
-          self.hit_objects: List[Union[Circle, Slider, Spinner]] = []
-          for line in content.splitlines():
-            hit_object_class = self.hit_object_type(line, 0)
-            self.hit_objects.append(hit_object_class(raw=line))
-
-      self._recalculate_slider_durations()
-
   def _load_raw(self, raw: str):
-    self.sections = self.split_sections(raw)
-    pass
+    self._raw = raw
+    headers = list(_SECTION_HEADER.finditer(raw))
+    self._preamble = raw[:headers[0].start()] if headers else raw
+    self._newline = "\r\n" if "\r\n" in raw[:4096] else "\n"
+
+    for idx, match in enumerate(headers):
+      end = headers[idx + 1].start() if idx + 1 < len(headers) else len(raw)
+      name = match.group(1).strip()
+      # (start of "[Name]", start of the body, end of the section including trailing blank lines)
+      self._section_spans[name] = (match.start(), match.end(), end)
+      if name not in self._section_names:
+        self._section_names.append(name)
+
+  @classmethod
+  def from_arrays(
+    cls, *,
+    times: Sequence[float],
+    x: Sequence[float],
+    y: Sequence[float],
+    types: Sequence[int],
+    hit_sounds: Optional[Sequence[int]] = None,
+    curve_types: Optional[Sequence[str]] = None,
+    curve_points: Optional[Sequence[Sequence[Sequence[float]]]] = None,
+    slides: Optional[Sequence[int]] = None,
+    lengths: Optional[Sequence[float]] = None,
+    end_times: Optional[Sequence[float]] = None,
+    hit_samples: Optional[Sequence[str]] = None,
+    timing_points: Optional[List[TimingPoint]] = None,
+    general: Optional[General] = None,
+    metadata: Optional[Metadata] = None,
+    difficulty: Optional[Difficulty] = None
+  ) -> "Beatmap":
+    # Builds a beatmap from columnar model output. Hit objects stay columnar until
+    # `hit_objects` is accessed, so generating and writing never creates per-object instances.
+    type_list = [int(t) for t in (types.tolist() if hasattr(types, "tolist") else types)]
+    params = [""] * len(type_list)
+    slider_indices = [i for i, t in enumerate(type_list) if t & SLIDER]
+    spinner_indices = [i for i, t in enumerate(type_list) if t & SPINNER]
+
+    if slider_indices:
+      if curve_points is None or lengths is None:
+        raise ValueError("Beatmap.from_arrays: sliders need curve_points and lengths")
+      for i in slider_indices:
+        params[i] = format_slider_params(
+          curve_types[i] if curve_types is not None else "B",
+          curve_points[i],
+          slides[i] if slides is not None else 1,
+          lengths[i],
+        )
+    if spinner_indices:
+      if end_times is None:
+        raise ValueError("Beatmap.from_arrays: spinners need end_times")
+      for i in spinner_indices:
+        params[i] = format_number(end_times[i])
+
+    beatmap = cls()
+    beatmap._set_columns(HitObjectColumns(
+      x=x, y=y, time=times, type=type_list, hit_sound=hit_sounds, params=params, hit_sample=hit_samples
+    ))
+    beatmap.general = general or General()
+    if metadata is not None:
+      beatmap.metadata = metadata
+    beatmap.difficulty = difficulty or Difficulty()
+    beatmap.timing_points = timing_points or []
+    return beatmap
+
+  def _set_columns(self, columns: HitObjectColumns):
+    self._parsed.pop("HitObjects", None)
+    self._columns = columns
+    # A bound method rather than a closure so that pending beatmaps stay picklable.
+    self._deferred["HitObjects"] = self._materialise_columns
+    self._add_section_name("HitObjects")
+
+  def _materialise_columns(self) -> List[Union[Circle, Slider, Spinner]]:
+    hit_objects = self._columns.to_hit_objects()
+    self._recalculate_slider_durations(hit_objects)
+    self._columns = None
+    return hit_objects
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    del state["_lock"]
+    return state
+
+  def __setstate__(self, state: dict):
+    self.__dict__.update(state)
+    self._lock = threading.RLock()
+
+  def hit_object_columns(self) -> HitObjectColumns:
+    # Columnar hit objects without building Circle/Slider/Spinner instances when possible.
+    if self._columns is not None:
+      return self._columns
+    if "HitObjects" in self._parsed:
+      return HitObjectColumns.from_hit_objects(self._parsed["HitObjects"])
+    if "HitObjects" in self._section_spans:
+      return HitObjectColumns.from_raw(self.raw_section("HitObjects"))
+    return HitObjectColumns(x=[], y=[], time=[], type=[])
+
+  @property
+  def sections(self) -> List[str]:
+    return list(self._section_names)
+
+  def raw_section(self, name: str) -> str:
+    _, body_start, end = self._section_spans[name]
+    return self._raw[body_start:end]
+
+  def is_parsed(self, name: str) -> bool:
+    return name in self._parsed
+
+  def reset_section(self, name: str):
+    # Drop the parsed objects so the original text is written back again.
+    if name in self._section_spans:
+      self._parsed.pop(name, None)
+
+  def _add_section_name(self, name: str):
+    if name in self._section_names:
+      return
+    rank = SECTION_ORDER.index(name) if name in SECTION_ORDER else len(SECTION_ORDER)
+    for idx, existing in enumerate(self._section_names):
+      if existing in SECTION_ORDER and SECTION_ORDER.index(existing) > rank:
+        self._section_names.insert(idx, name)
+        return
+    self._section_names.append(name)
 
   def split_sections(self, raw: str) -> dict[str, str]:
     sections = {}
@@ -81,15 +296,15 @@ class Beatmap():
     if tp:
       return tp.get_bpm()
     return 0.0
-  
+
   def get_slider_velocity_multiplier_at(self, time: int) -> float:
     tp = self.get_previous_timing_point(time, filter=lambda t: t.uninherited == 0)
     if tp:
       return tp.get_slider_velocity_multiplier()
     return 1.0
-  
-  def _recalculate_slider_durations(self):
-    for ho in self.hit_objects:
+
+  def _recalculate_slider_durations(self, hit_objects: Optional[List[Union[Circle, Slider, Spinner]]] = None):
+    for ho in (self.hit_objects if hit_objects is None else hit_objects):
       if isinstance(ho, Slider):
         sv_multiplier = self.get_slider_velocity_multiplier_at(ho.time)
         inherited_tp = self.get_previous_timing_point(ho.time, filter=lambda t: t.uninherited == 1)
@@ -110,7 +325,67 @@ class Beatmap():
       return Spinner
     else:
       raise ValueError(f"Unknown hit object type id: {type_id}")
-    
+
+  def with_clock_rate(self, rate: float) -> "Beatmap":
+    # The map as heard at `rate` (1.5 for DoubleTime/NightCore, 0.75 for HalfTime), baked in:
+    # times and beat lengths are divided by the rate, and AR/OD become the rate-adjusted values
+    # the difficulty calculator uses, so with_clock_rate(1.5) rates like the map with DoubleTime.
+    # Times are not rounded, to stay exact against the calculator.
+    from .difficulty.calculator import calculate_rate_adjusted_approach_rate, calculate_rate_adjusted_overall_difficulty
+
+    if rate <= 0:
+      raise ValueError(f"clock rate must be positive, got {rate}")
+
+    columns = self.hit_object_columns()
+    params = list(columns.params)
+    for i, type_id in enumerate(columns.type):
+      if type_id & SPINNER and params[i]:
+        params[i] = format_number(float(params[i]) / rate)
+    scaled_columns = HitObjectColumns(
+      x=columns.x, y=columns.y, time=[t / rate for t in columns.time], type=columns.type,
+      hit_sound=columns.hit_sound, params=params, hit_sample=columns.hit_sample,
+    )
+
+    timing_points = [
+      TimingPoint(
+        time=tp.time / rate,
+        # Inherited points hold a slider velocity percentage, which does not change.
+        beat_length=tp.beat_length / rate if tp.uninherited else tp.beat_length,
+        meter=tp.meter, sample_set=tp.sample_set, sample_index=tp.sample_index,
+        volume=tp.volume, uninherited=tp.uninherited, effects=tp.effects,
+      )
+      for tp in self.timing_points
+    ]
+
+    difficulty = copy.copy(self.difficulty)
+    difficulty.approach_rate = calculate_rate_adjusted_approach_rate(float(difficulty.approach_rate), rate)
+    difficulty.overall_difficulty = calculate_rate_adjusted_overall_difficulty(float(difficulty.overall_difficulty), rate)
+
+    general = copy.copy(self.general)
+    if general.preview_time > 0:
+      general.preview_time = general.preview_time / rate
+    general.audio_lead_in = general.audio_lead_in / rate
+
+    with self._lock:
+      clone = copy.copy(self)
+      clone._section_spans = dict(self._section_spans)
+      clone._section_names = list(self._section_names)
+      clone._parsed = dict(self._parsed)
+      clone._deferred = {}
+      clone._columns = None
+    clone.general = general
+    clone.difficulty = difficulty
+    clone.timing_points = timing_points
+    if "Events" in clone._section_spans or "Events" in clone._parsed:
+      clone._parsed["Events"] = [_scale_event(line, rate) for line in clone._text_lines("Events")]
+    clone._set_columns(scaled_columns)
+    return clone
+
+  def _text_lines(self, name: str) -> List[str]:
+    if name in self._parsed:
+      return list(self._iter_section_lines(name))
+    return self.raw_section(name).strip("\r\n").splitlines()
+
   def get_difficulty(self):
     from .difficulty import calculate_difficulty
     return calculate_difficulty(self)
@@ -119,18 +394,36 @@ class Beatmap():
     from .difficulty import calculate_performance
     return calculate_performance(self.get_difficulty())
 
+  def _iter_section_lines(self, name: str) -> Iterator[str]:
+    if name == "HitObjects" and self._columns is not None and name not in self._parsed:
+      return iter_hit_object_lines(self._columns)
+    value = self._parsed[name]
+    if name == "HitObjects":
+      return iter_hit_object_lines(value)
+    if name == "TimingPoints":
+      return iter_timing_point_lines(value)
+    if isinstance(value, list):
+      return map(str, value)
+    return iter(str(value).rstrip("\n").split("\n"))
+
+  def iter_text(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    # Yields the file in chunks: untouched sections verbatim, parsed ones re-serialised
+    # `chunk_size` lines at a time so large maps never build one giant string.
+    newline = self._newline
+    yield self._preamble or f"{DEFAULT_FORMAT_LINE}{newline}{newline}"
+    for idx, name in enumerate(self._section_names):
+      if name in self._parsed or name in self._deferred:
+        yield f"[{name}]{newline}"
+        yield from iter_chunks(self._iter_section_lines(name), newline, chunk_size)
+        if idx + 1 < len(self._section_names):
+          yield newline
+      else:
+        start, _, end = self._section_spans[name]
+        yield self._raw[start:end]
+
   def __str__(self) -> str:
-    result = ["osu file format v14\n"]
-    if hasattr(self, "general"):
-      result.append(f"[General]\n{str(self.general)}")
-    if hasattr(self, "timing_points"):
-      result.append("[TimingPoints]")
-      for tp in self.timing_points:
-        result.append(str(tp))
-      result.append("")
-    if hasattr(self, "hit_objects"):
-      result.append("[HitObjects]")
-      for ho in self.hit_objects:
-        result.append(str(ho))
-      result.append("")
-    return "\n".join(result)
\ No newline at end of file
+    return "".join(self.iter_text())
+
+  def save(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    with open(file_path, "w", encoding="utf-8", newline="") as f:
+      f.writelines(self.iter_text(chunk_size=chunk_size))
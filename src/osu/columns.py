@@ -0,0 +1,171 @@
+from __future__ import annotations
+from typing import List, Optional, Sequence, Union
+from .hit_object import Circle, Slider, Spinner, SliderObjectParams, SpinnerObjectParams
+from .hit_sample import HitSample
+from .formatting import format_number
+
+DEFAULT_HIT_SAMPLE = "0:0:0:0:"
+
+CIRCLE = 1
+SLIDER = 2
+NEW_COMBO = 4
+SPINNER = 8
+
+
+def _to_list(values) -> list:
+  # numpy arrays convert to Python scalars in one call, which is much faster than iterating.
+  return values.tolist() if hasattr(values, "tolist") else list(values)
+
+
+def _format_column(values: list) -> List[str]:
+  if all(type(v) is int for v in values):
+    return list(map(str, values))
+  return list(map(format_number, values))
+
+
+class HitObjectColumns:
+  # Struct-of-arrays view of [HitObjects]. `params` holds the raw object parameters
+  # (slider curve/slides/length/edges or spinner end time), "" for circles; an empty
+  # `hit_sample` means the optional field is omitted.
+  __slots__ = ("x", "y", "time", "type", "hit_sound", "params", "hit_sample")
+
+  def __init__(
+    self, *,
+    x: Sequence[float],
+    y: Sequence[float],
+    time: Sequence[float],
+    type: Sequence[int],
+    hit_sound: Optional[Sequence[int]] = None,
+    params: Optional[Sequence[str]] = None,
+    hit_sample: Optional[Sequence[str]] = None
+  ):
+    self.x = _to_list(x)
+    self.y = _to_list(y)
+    self.time = _to_list(time)
+    self.type = [int(t) for t in _to_list(type)]
+    count = len(self.time)
+    if not (len(self.x) == len(self.y) == len(self.type) == count):
+      raise ValueError("HitObjectColumns: x, y, time and type must have the same length")
+    self.hit_sound = _to_list(hit_sound) if hit_sound is not None else [0] * count
+    self.params = _to_list(params) if params is not None else [""] * count
+    self.hit_sample = _to_list(hit_sample) if hit_sample is not None else [DEFAULT_HIT_SAMPLE] * count
+
+  def __len__(self) -> int:
+    return len(self.time)
+
+  @classmethod
+  def from_raw(cls, content: str) -> "HitObjectColumns":
+    x, y, time, types, hit_sound, params, hit_sample = [], [], [], [], [], [], []
+    for line in content.splitlines():
+      line = line.strip()
+      if not line or line.startswith("//"):
+        continue
+      segments = line.split(",", 5)
+      type_id = int(segments[3])
+      rest = segments[5] if len(segments) > 5 else ""
+      if type_id & CIRCLE:
+        param, sample = "", rest
+      else:
+        # The hit sample is the last segment when it contains ":" (it is optional).
+        head, sep, tail = rest.rpartition(",")
+        if ":" in tail and not (type_id & SLIDER and "|" in tail):
+          param, sample = head, tail
+        else:
+          param, sample = rest, ""
+      x.append(float(segments[0]))
+      y.append(float(segments[1]))
+      time.append(float(segments[2]))
+      types.append(type_id)
+      hit_sound.append(int(segments[4]))
+      params.append(param)
+      hit_sample.append(sample)
+    return cls(x=x, y=y, time=time, type=types, hit_sound=hit_sound, params=params, hit_sample=hit_sample)
+
+  @classmethod
+  def from_hit_objects(cls, hit_objects: Sequence[Union[Circle, Slider, Spinner]]) -> "HitObjectColumns":
+    return cls(
+      x=[ho.x for ho in hit_objects],
+      y=[ho.y for ho in hit_objects],
+      time=[ho.time for ho in hit_objects],
+      type=[ho.type for ho in hit_objects],
+      hit_sound=[ho.hit_sound for ho in hit_objects],
+      params=[format_object_params(ho) for ho in hit_objects],
+      hit_sample=[str(ho.hit_sample) for ho in hit_objects],
+    )
+
+  def to_hit_objects(self) -> List[Union[Circle, Slider, Spinner]]:
+    hit_objects: List[Union[Circle, Slider, Spinner]] = []
+    for x, y, time, type_id, hit_sound, param, sample in zip(
+      self.x, self.y, self.time, self.type, self.hit_sound, self.params, self.hit_sample
+    ):
+      hit_sample = HitSample(raw=sample)
+      if type_id & CIRCLE:
+        hit_objects.append(Circle(x=x, y=y, time=time, type=type_id, hit_sound=hit_sound, hit_sample=hit_sample))
+      elif type_id & SLIDER:
+        hit_objects.append(Slider(
+          x=x, y=y, time=time, type=type_id, hit_sound=hit_sound,
+          object_params=SliderObjectParams(raw=param), hit_sample=hit_sample
+        ))
+      elif type_id & SPINNER:
+        hit_objects.append(Spinner(
+          x=x, y=y, time=time, type=type_id, hit_sound=hit_sound,
+          object_params=SpinnerObjectParams(raw=param), hit_sample=hit_sample
+        ))
+      else:
+        raise ValueError(f"Unknown hit object type id: {type_id}")
+    return hit_objects
+
+  def iter_lines(self, start: int = 0, stop: Optional[int] = None):
+    stop = len(self) if stop is None else stop
+    rows = zip(
+      _format_column(self.x[start:stop]),
+      _format_column(self.y[start:stop]),
+      _format_column(self.time[start:stop]),
+      self.type[start:stop],
+      self.hit_sound[start:stop],
+      self.params[start:stop],
+      self.hit_sample[start:stop],
+    )
+    for x, y, time, type_id, hit_sound, param, sample in rows:
+      if param and sample:
+        yield f"{x},{y},{time},{type_id},{hit_sound},{param},{sample}"
+      elif sample:
+        yield f"{x},{y},{time},{type_id},{hit_sound},{sample}"
+      elif param:
+        yield f"{x},{y},{time},{type_id},{hit_sound},{param}"
+      else:
+        yield f"{x},{y},{time},{type_id},{hit_sound}"
+
+
+def format_slider_params(
+  curve_type: str,
+  curve_points: Sequence[Sequence[float]],
+  slides: int,
+  length: float,
+  edge_sounds: str = "",
+  edge_sets: str = ""
+) -> str:
+  fmt = format_number
+  points = "|".join(f"{fmt(px)}:{fmt(py)}" for px, py in curve_points)
+  # Edge sounds/sets are written even when default because the hit sample that follows
+  # them is positional.
+  edges = int(slides) + 1
+  edge_sounds = edge_sounds or "|".join(["0"] * edges)
+  edge_sets = edge_sets or "|".join(["0:0"] * edges)
+  return f"{curve_type}|{points},{int(slides)},{fmt(length)},{edge_sounds},{edge_sets}"
+
+
+def format_object_params(hit_object: Union[Circle, Slider, Spinner]) -> str:
+  params = hit_object.object_params
+  if isinstance(hit_object, Slider):
+    fmt = format_number
+    curves = "|".join(
+      curve.curve_type + "".join(f"|{fmt(px)}:{fmt(py)}" for px, py in curve.curve_points)
+      for curve in params.curves
+    )
+    edge_sounds = "|".join(map(str, params.edge_sounds))
+    edge_sets = "|".join(f"{s1}:{s2}" for s1, s2 in params.edge_sets)
+    return f"{curves},{params.slides},{fmt(params.length)},{edge_sounds},{edge_sets}"
+  if isinstance(hit_object, Spinner):
+    return format_number(params.end_time)
+  return ""
@@ -0,0 +1,326 @@
+from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+from .columns import CIRCLE, SLIDER, SPINNER, HitObjectColumns
+from .index import iter_beatmap_files, split_header
+from .sections.general import General
+
+# Corpus deduplication.
+#
+# Exact duplicates share a hash of the normalised .osu text (no [Editor] section, comments,
+# blank lines, IDs or format header; unified line endings and whitespace) or of the audio bytes.
+# Near-duplicates (light edits, GDs copied from each other) are found with MinHash over hit
+# object n-grams: each object becomes a token of its quantised time delta, position delta and
+# kind, so the shingles do not depend on the map's offset or absolute placement. LSH buckets
+# over bands of the signature only compare maps that share a bucket, which keeps the search
+# roughly linear in the corpus size. Clusters are unions of all these links; splits are assigned
+# per cluster, so no cluster straddles train and validation.
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 32
+DEFAULT_NGRAM = 3
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_TIME_QUANTUM_MS = 10.0
+DEFAULT_POSITION_QUANTUM = 32.0
+MAX_BUCKET = 64
+_IGNORED_SECTIONS = ("Editor",)
+_IGNORED_KEYS = ("BeatmapID", "BeatmapSetID")
+_PRIME = np.uint64((1 << 32) - 5)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def normalised_hash(raw: str) -> str:
+  lines = []
+  section = None
+  for line in raw.lstrip("\ufeff").splitlines():
+    line = line.strip()
+    if not line or line.startswith("//") or line.startswith("osu file format"):
+      continue
+    if line.startswith("[") and line.endswith("]"):
+      section = line[1:-1].strip()
+    if section in _IGNORED_SECTIONS:
+      continue
+    key, sep, value = line.partition(":")
+    if sep and section != "HitObjects":
+      if key.strip() in _IGNORED_KEYS:
+        continue
+      line = f"{key.strip()}:{value.strip()}"
+    lines.append(line)
+  return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+  # splitmix64 finaliser; uint64 arithmetic wraps.
+  values = values ^ (values >> np.uint64(30))
+  values = values * np.uint64(0xBF58476D1CE4E5B9)
+  values = values ^ (values >> np.uint64(27))
+  values = values * np.uint64(0x94D049BB133111EB)
+  return values ^ (values >> np.uint64(31))
+
+
+def shingles(
+  columns: HitObjectColumns,
+  *,
+  ngram: int = DEFAULT_NGRAM,
+  time_quantum_ms: float = DEFAULT_TIME_QUANTUM_MS,
+  position_quantum: float = DEFAULT_POSITION_QUANTUM,
+) -> np.ndarray:
+  # Unique 32-bit shingle hashes of the map's object n-grams.
+  if len(columns) < 2:
+    return np.zeros(0, dtype=np.uint64)
+  time = np.asarray(columns.time, dtype=np.float64)
+  x = np.asarray(columns.x, dtype=np.float64)
+  y = np.asarray(columns.y, dtype=np.float64)
+  kind = np.asarray(columns.type, dtype=np.int64) & (CIRCLE | SLIDER | SPINNER)
+  dt = np.minimum(np.rint(np.diff(time) / time_quantum_ms), 1 << 16).astype(np.int64)
+  dx = np.rint(np.diff(x) / position_quantum).astype(np.int64)
+  dy = np.rint(np.diff(y) / position_quantum).astype(np.int64)
+  tokens = (((dt << 12) + ((dx & 0x3F) << 6) + (dy & 0x3F)) << 4) + kind[1:]
+  tokens = _mix(tokens.astype(np.uint64))
+  n = min(ngram, len(tokens))
+  windows = np.lib.stride_tricks.sliding_window_view(tokens, n)
+  # Position-dependent mixing so an n-gram hash depends on token order.
+  weights = _mix(np.arange(1, n + 1, dtype=np.uint64))
+  hashed = _mix((windows * weights).sum(axis=1, dtype=np.uint64))
+  return np.unique(hashed & _MASK32)
+
+
+class MinHasher:
+  def __init__(self, num_perm: int = DEFAULT_NUM_PERM, *, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    # h_i(x) = (a_i * x + b_i) mod p with x, a, b < 2**32 stays within uint64.
+    self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+    self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+    self.num_perm = num_perm
+
+  def signature(self, shingle_hashes: np.ndarray) -> np.ndarray:
+    if not len(shingle_hashes):
+      return np.full(self.num_perm, int(_PRIME), dtype=np.uint32)
+    values = (self.a[:, None] * shingle_hashes[None, :] + self.b[:, None]) % _PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+  # Estimated Jaccard similarity of two signatures.
+  return float(np.mean(a == b))
+
+
+@dataclass
+class Fingerprint:
+  path: str
+  content_hash: str
+  normalised_hash: str
+  audio_hash: Optional[str]
+  shingle_count: int
+  signature: np.ndarray = field(repr=False)
+
+
+def fingerprint(path: str, hasher: MinHasher, *, audio: bool = True, **shingle_kwargs) -> Fingerprint:
+  with open(path, "rb") as f:
+    data = f.read()
+  raw = data.decode("utf-8-sig", errors="replace")
+  sections, hit_objects_raw = split_header(raw)
+  audio_hash = None
+  if audio:
+    from ..audio.pcm import file_hash
+
+    audio_path = os.path.join(os.path.dirname(path), General(raw=sections.get("General", "")).audio_filename.strip())
+    audio_hash = file_hash(audio_path) if os.path.isfile(audio_path) else None
+  hashes = shingles(HitObjectColumns.from_raw(hit_objects_raw), **shingle_kwargs)
+  return Fingerprint(
+    path=path,
+    content_hash=hashlib.sha1(data).hexdigest(),
+    normalised_hash=normalised_hash(raw),
+    audio_hash=audio_hash,
+    shingle_count=len(hashes),
+    signature=hasher.signature(hashes),
+  )
+
+
+class LSHIndex:
+  def __init__(self, num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS):
+    if num_perm % bands:
+      raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+    self.bands = bands
+    self.rows = num_perm // bands
+    self.buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+
+  def add(self, key: int, signature: np.ndarray) -> None:
+    for band, rows in enumerate(signature.reshape(self.bands, self.rows)):
+      self.buckets[band][rows.tobytes()].append(key)
+
+  def candidate_pairs(self, max_bucket: int = MAX_BUCKET) -> Set[Tuple[int, int]]:
+    # All pairs within small buckets; a large bucket (a very common pattern) only pairs each
+    # member with the bucket's first member, so it costs linear rather than quadratic time.
+    pairs: Set[Tuple[int, int]] = set()
+    for buckets in self.buckets:
+      for members in buckets.values():
+        if len(members) < 2:
+          continue
+        if len(members) <= max_bucket:
+          pairs.update((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+        else:
+          pairs.update((members[0], b) for b in members[1:])
+    return pairs
+
+
+class _UnionFind:
+  def __init__(self, size: int):
+    self.parent = list(range(size))
+
+  def find(self, item: int) -> int:
+    while self.parent[item] != item:
+      self.parent[item] = self.parent[self.parent[item]]
+      item = self.parent[item]
+    return item
+
+  def union(self, a: int, b: int) -> None:
+    a, b = self.find(a), self.find(b)
+    if a != b:
+      self.parent[max(a, b)] = min(a, b)
+
+
+@dataclass
+class Cluster:
+  id: str
+  paths: List[str]
+  reasons: List[str]  # which links joined it: "content", "audio", "near"
+
+
+def find_clusters(
+  fingerprints: Sequence[Fingerprint],
+  *,
+  bands: int = DEFAULT_BANDS,
+  threshold: float = DEFAULT_THRESHOLD,
+  group_audio: bool = True,
+) -> List[Cluster]:
+  # Every map ends up in exactly one cluster (singletons included), ordered by first path.
+  union = _UnionFind(len(fingerprints))
+  reasons: Dict[int, Set[str]] = defaultdict(set)
+
+  def link(a: int, b: int, reason: str) -> None:
+    reasons[a].add(reason)
+    reasons[b].add(reason)
+    union.union(a, b)
+
+  for attribute, reason, enabled in (("normalised_hash", "content", True), ("audio_hash", "audio", group_audio)):
+    if not enabled:
+      continue
+    first: Dict[str, int] = {}
+    for i, fp in enumerate(fingerprints):
+      value = getattr(fp, attribute)
+      if value is None:
+        continue
+      if value in first:
+        link(first[value], i, reason)
+      else:
+        first[value] = i
+
+  if fingerprints:
+    lsh = LSHIndex(len(fingerprints[0].signature), bands)
+    for i, fp in enumerate(fingerprints):
+      if fp.shingle_count:
+        lsh.add(i, fp.signature)
+    for a, b in lsh.candidate_pairs():
+      if union.find(a) != union.find(b) and similarity(fingerprints[a].signature, fingerprints[b].signature) >= threshold:
+        link(a, b, "near")
+
+  members: Dict[int, List[int]] = defaultdict(list)
+  for i in range(len(fingerprints)):
+    members[union.find(i)].append(i)
+  clusters = []
+  for indices in members.values():
+    indices.sort(key=lambda i: fingerprints[i].path)
+    # Named after its smallest normalised hash, so the id survives corpus growth and renames.
+    cluster_id = min(fingerprints[i].normalised_hash for i in indices)[:16]
+    cluster_reasons = sorted(set().union(*(reasons[i] for i in indices)))
+    clusters.append(Cluster(cluster_id, [fingerprints[i].path for i in indices], cluster_reasons))
+  clusters.sort(key=lambda c: c.paths[0])
+  return clusters
+
+
+def assign_splits(clusters: Iterable[Cluster], fractions: Dict[str, float], *, seed: str = "") -> Dict[str, str]:
+  # path -> split. A cluster's split depends only on its id, so it is stable across runs and
+  # corpus growth; every member of a cluster gets the same split.
+  names = list(fractions)
+  bounds = np.cumsum([fractions[name] for name in names], dtype=np.float64)
+  bounds /= bounds[-1]
+  splits = {}
+  for cluster in clusters:
+    digest = hashlib.sha1(f"{seed}:{cluster.id}".encode("utf-8")).digest()
+    position = int.from_bytes(digest[:8], "big") / 2.0 ** 64
+    name = names[min(int(np.searchsorted(bounds, position, side="right")), len(names) - 1)]
+    for path in cluster.paths:
+      splits[path] = name
+  return splits
+
+
+def parse_fractions(value: str) -> Dict[str, float]:
+  # "train=0.9,val=0.1"
+  fractions = {}
+  for part in value.split(","):
+    name, _, fraction = part.partition("=")
+    fractions[name.strip()] = float(fraction)
+  return fractions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(prog="python -m src.osu.dedup", description="Find duplicate and near-duplicate beatmaps and assign leak-free splits.")
+  parser.add_argument("paths", nargs="+", help=".osu files or directories (searched recursively)")
+  parser.add_argument("--report", help="write the cluster report (JSON) here instead of stdout")
+  parser.add_argument("--splits", help="write path,split,cluster rows (CSV) here")
+  parser.add_argument("--fractions", type=parse_fractions, default={"train": 0.9, "val": 0.1}, help="e.g. train=0.8,val=0.1,test=0.1")
+  parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="estimated Jaccard similarity for near-duplicates")
+  parser.add_argument("--no-audio", action="store_true", help="do not hash audio or group maps that share it")
+  args = parser.parse_args(argv)
+
+  hasher = MinHasher()
+  fingerprints: List[Fingerprint] = []
+  failed: List[str] = []
+  for root in args.paths:
+    for path in iter_beatmap_files(root):
+      try:
+        fingerprints.append(fingerprint(path, hasher, audio=not args.no_audio))
+      except (ValueError, IndexError) as e:
+        # Unparsable maps are reported and left out of the clusters and splits.
+        print(f"{path}: {e}", file=sys.stderr)
+        failed.append(path)
+  clusters = find_clusters(fingerprints, threshold=args.threshold, group_audio=not args.no_audio)
+  splits = assign_splits(clusters, args.fractions)
+
+  groups = [c for c in clusters if len(c.paths) > 1]
+  report = {
+    "maps": len(fingerprints),
+    "clusters": len(clusters),
+    "duplicate_clusters": len(groups),
+    "exact_duplicates": len(fingerprints) - len({fp.normalised_hash for fp in fingerprints}),
+    "groups": [{"id": c.id, "reasons": c.reasons, "paths": c.paths} for c in groups],
+    "failed": failed,
+  }
+  text = json.dumps(report, indent=2) + "\n"
+  if args.report:
+    with open(args.report, "w", encoding="utf-8") as f:
+      f.write(text)
+  else:
+    sys.stdout.write(text)
+  if args.splits:
+    cluster_of = {path: c.id for c in clusters for path in c.paths}
+    with open(args.splits, "w", encoding="utf-8", newline="") as f:
+      writer = csv.writer(f)
+      writer.writerow(["path", "split", "cluster"])
+      for path in sorted(splits):
+        writer.writerow([path, splits[path], cluster_of[path]])
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
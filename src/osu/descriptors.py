@@ -0,0 +1,456 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .index import iter_beatmap_files
+from .patterns import SNAPS, _NONE_SNAP, tokenize
+from .snapping import RedLines
+
+# Fixed-length map descriptors and a nearest-neighbour index over them.
+#
+# A descriptor is one float32 vector per map (layout in FEATURES):
+#   spacing   histogram of lazy jump distances (normalised radius units) from the difficulty preprocessing
+#   angle     histogram of the angles between movements
+#   rhythm    histogram of beat snaps between consecutive objects (the pattern index's SNAPS)
+#   attrs     DifficultyAttributes fields; count attributes are divided by the object count
+#   strains   percentiles of the aim and speed object strains
+# Histograms are fractions, so maps of different lengths are comparable. Descriptors are kept in
+# a sqlite store that is updated incrementally like BeatmapIndex, so a corpus is described once.
+#
+# NeighbourIndex standardises every feature over the corpus and searches by Euclidean distance:
+# exactly (chunked matrix products) for small corpora, or through an inverted file of k-means
+# lists for large ones, where only the `probes` nearest lists are scanned.
+
+SPACING_EDGES = (25.0, 50.0, 75.0, 100.0, 150.0, 200.0, 300.0, 400.0)
+ANGLE_BINS = 6
+ATTRIBUTE_FIELDS = (
+  "star_rating", "aim_difficulty", "speed_difficulty", "slider_factor",
+  "approach_rate", "overall_difficulty", "drain_rate", "circle_size",
+)
+COUNT_FIELDS = ("speed_note_count", "aim_difficult_strain_count", "speed_difficult_strain_count", "aim_difficult_slider_count")
+STRAIN_PERCENTILES = (50, 75, 90, 95, 99)
+
+FEATURES: Tuple[str, ...] = (
+  *(f"spacing_{int(low)}" for low in (0.0, *SPACING_EDGES)),
+  *(f"angle_{i * 180 // ANGLE_BINS}" for i in range(ANGLE_BINS)),
+  *(f"rhythm_{snap}" for snap in SNAPS),
+  *ATTRIBUTE_FIELDS,
+  *(f"{name}_fraction" for name in COUNT_FIELDS),
+  "slider_fraction", "spinner_fraction", "log_objects", "objects_per_second",
+  *(f"aim_strain_p{p}" for p in STRAIN_PERCENTILES),
+  *(f"speed_strain_p{p}" for p in STRAIN_PERCENTILES),
+)
+# Bump when FEATURES or how they are computed changes; stores of another version are rebuilt.
+VERSION = 1
+
+# Below this many maps the index is exact by default.
+APPROXIMATE_MIN = 20000
+KMEANS_ITERATIONS = 10
+DEFAULT_PROBES = 8
+_CHUNK_ELEMENTS = 1 << 22
+
+
+def _fractions(counts: np.ndarray) -> np.ndarray:
+  total = counts.sum()
+  return counts / total if total else counts.astype(np.float64)
+
+
+def _percentiles(values: Sequence[float]) -> np.ndarray:
+  if not len(values):
+    return np.zeros(len(STRAIN_PERCENTILES))
+  return np.percentile(np.asarray(values, dtype=np.float64), STRAIN_PERCENTILES)
+
+
+def describe(beatmap, mods=None, *, backend: Optional[str] = None) -> np.ndarray:
+  # One pass of preprocessing and skills gives the attributes, the object strains and the
+  # arrays the histograms are taken from.
+  from .difficulty.arrays import DifficultyArrays
+  from .difficulty.calculator import aggregate_attributes, calculate_difficulty, prepare_beatmap, run_skills
+
+  prepared = prepare_beatmap(beatmap, mods)
+  if prepared.hit_objects:
+    skills = run_skills(prepared, backend=backend)
+    attributes = aggregate_attributes(beatmap, prepared, skills)
+    aim_strains, speed_strains = skills[0].object_strains, skills[2].object_strains
+    arrays = DifficultyArrays.from_objects(prepared.hit_objects)
+    spacing = np.bincount(np.searchsorted(SPACING_EDGES, arrays.lazy_jump_distance, side="right"), minlength=len(SPACING_EDGES) + 1)
+    angles = arrays.angle[~np.isnan(arrays.angle)]
+    angle = np.bincount(np.minimum((angles / math.pi * ANGLE_BINS).astype(np.int64), ANGLE_BINS - 1), minlength=ANGLE_BINS)
+  else:
+    attributes = calculate_difficulty(beatmap, mods)
+    aim_strains = speed_strains = []
+    spacing = np.zeros(len(SPACING_EDGES) + 1)
+    angle = np.zeros(ANGLE_BINS)
+
+  columns = beatmap.hit_object_columns()
+  snaps = (tokenize(columns, RedLines.from_beatmap(beatmap)).astype(np.int64) >> 8) & 0xF
+  rhythm = np.bincount(snaps[snaps != _NONE_SNAP], minlength=len(SNAPS))
+
+  count = len(columns)
+  time = np.asarray(columns.time, dtype=np.float64)
+  duration = (time[-1] - time[0]) / attributes.clock_rate if count > 1 else 0.0
+  vector = np.concatenate([
+    _fractions(spacing),
+    _fractions(angle),
+    _fractions(rhythm),
+    [getattr(attributes, name) for name in ATTRIBUTE_FIELDS],
+    [getattr(attributes, name) / max(count, 1) for name in COUNT_FIELDS],
+    [
+      attributes.slider_count / max(count, 1),
+      attributes.spinner_count / max(count, 1),
+      math.log1p(count),
+      count / (duration / 1000.0) if duration > 0 else 0.0,
+    ],
+    _percentiles(aim_strains),
+    _percentiles(speed_strains),
+  ])
+  return vector.astype(np.float32)
+
+
+def _describe_file(path: str, data: bytes, mods, backend: Optional[str]) -> np.ndarray:
+  from .beatmap import Beatmap
+
+  beatmap = Beatmap(raw=data.decode("utf-8-sig", errors="replace"), file_path=path)
+  return describe(beatmap, mods, backend=backend)
+
+
+class DescriptorStore:
+  def __init__(self, db_path: str, *, mods: Optional[Sequence[str]] = None, backend: Optional[str] = None):
+    self.db_path = db_path
+    self.mods = list(mods or [])
+    # Rows of every mod combination share the file; each store only sees its own.
+    self.mods_key = ",".join(sorted(self.mods))
+    self.backend = backend
+    self.connection = sqlite3.connect(db_path)
+    self.connection.row_factory = sqlite3.Row
+    self._create_schema()
+
+  def _create_schema(self):
+    layout = json.dumps({"version": VERSION, "features": len(FEATURES)})
+    with self.connection:
+      self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+      row = self.connection.execute("SELECT value FROM meta WHERE name = 'layout'").fetchone()
+      if row is not None and row[0] != layout:
+        # Descriptors of another layout cannot be mixed with new ones.
+        self.connection.execute("DROP TABLE IF EXISTS maps")
+      self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('layout', ?)", (layout,))
+      self.connection.execute(
+        "CREATE TABLE IF NOT EXISTS maps (id INTEGER PRIMARY KEY, path TEXT, mods TEXT, mtime REAL, size INTEGER, "
+        "content_hash TEXT, vector BLOB, UNIQUE (path, mods))"
+      )
+      self.connection.execute("CREATE INDEX IF NOT EXISTS idx_maps_hash ON maps (content_hash, mods)")
+
+  def close(self):
+    self.connection.close()
+
+  def __enter__(self) -> "DescriptorStore":
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def __len__(self) -> int:
+    return self.connection.execute("SELECT COUNT(*) FROM maps WHERE mods = ?", (self.mods_key,)).fetchone()[0]
+
+  def update(self, root: str, *, prune: bool = True, max_workers: Optional[int] = None) -> Dict[str, int]:
+    # Incremental like BeatmapIndex.update. Files with a known content hash reuse its vector;
+    # the rest are described on a thread pool (see calculate_difficulty_batch). Maps that fail
+    # to parse or calculate are counted and left out.
+    known = {
+      row["path"]: (row["id"], row["mtime"], row["size"], row["content_hash"])
+      for row in self.connection.execute("SELECT id, path, mtime, size, content_hash FROM maps WHERE mods = ?", (self.mods_key,))
+    }
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    seen = set()
+    pending: List[Tuple[str, os.stat_result, str, bytes]] = []
+
+    with self.connection:
+      for file_path in iter_beatmap_files(root):
+        path = os.path.abspath(file_path)
+        seen.add(path)
+        stat = os.stat(path)
+        previous = known.get(path)
+        if previous and previous[1] == stat.st_mtime and previous[2] == stat.st_size:
+          stats["unchanged"] += 1
+          continue
+        with open(path, "rb") as f:
+          data = f.read()
+        content_hash = hashlib.sha1(data).hexdigest()
+        if previous and previous[3] == content_hash:
+          self.connection.execute("UPDATE maps SET mtime = ?, size = ? WHERE id = ?", (stat.st_mtime, stat.st_size, previous[0]))
+          stats["unchanged"] += 1
+          continue
+        if previous:
+          self.connection.execute("DELETE FROM maps WHERE id = ?", (previous[0],))
+        stats["updated" if previous else "added"] += 1
+        copy = self.connection.execute("SELECT vector FROM maps WHERE content_hash = ? AND mods = ? LIMIT 1", (content_hash, self.mods_key)).fetchone()
+        if copy is not None:
+          self._insert(path, stat, content_hash, copy[0])
+        else:
+          pending.append((path, stat, content_hash, data))
+
+      def run(item):
+        path, _, _, data = item
+        try:
+          return _describe_file(path, data, self.mods, self.backend)
+        except Exception:
+          return None
+
+      with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for (path, stat, content_hash, _), vector in zip(pending, pool.map(run, pending)):
+          if vector is None:
+            stats["failed"] += 1
+            stats["updated" if path in known else "added"] -= 1
+            continue
+          self._insert(path, stat, content_hash, vector.tobytes())
+
+      if prune:
+        prefix = os.path.abspath(root)
+        for path, (map_id, *_) in known.items():
+          if path not in seen and (path == prefix or path.startswith(prefix + os.sep)):
+            self.connection.execute("DELETE FROM maps WHERE id = ?", (map_id,))
+            stats["removed"] += 1
+    return stats
+
+  def _insert(self, path: str, stat: os.stat_result, content_hash: str, vector: bytes):
+    self.connection.execute(
+      "INSERT INTO maps (path, mods, mtime, size, content_hash, vector) VALUES (?, ?, ?, ?, ?, ?)",
+      (path, self.mods_key, stat.st_mtime, stat.st_size, content_hash, vector),
+    )
+
+  def load(self) -> Tuple[List[str], np.ndarray]:
+    # (paths, (maps, len(FEATURES)) float32 matrix), ordered by path.
+    rows = self.connection.execute("SELECT path, vector FROM maps WHERE mods = ? ORDER BY path", (self.mods_key,)).fetchall()
+    vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), len(FEATURES))
+    return [row[0] for row in rows], vectors.copy()
+
+
+def _squared_distances(queries: np.ndarray, points: np.ndarray, point_norms: np.ndarray) -> np.ndarray:
+  distances = point_norms[None, :] - 2.0 * (queries @ points.T) + (queries * queries).sum(axis=1)[:, None]
+  return np.maximum(distances, 0.0)
+
+
+def _kmeans(points: np.ndarray, k: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+  centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+  assignment = np.zeros(len(points), dtype=np.int64)
+  for _ in range(KMEANS_ITERATIONS):
+    norms = (centroids * centroids).sum(axis=1)
+    step = max(1, _CHUNK_ELEMENTS // k)
+    for start in range(0, len(points), step):
+      assignment[start:start + step] = _squared_distances(points[start:start + step], centroids, norms).argmin(axis=1)
+    counts = np.bincount(assignment, minlength=k)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, assignment, points)
+    filled = counts > 0
+    centroids[filled] = sums[filled] / counts[filled, None]
+  return centroids, assignment
+
+
+class NeighbourIndex:
+  def __init__(
+    self,
+    vectors: np.ndarray,
+    paths: Optional[Sequence[str]] = None,
+    *,
+    weights: Optional[Dict[str, float]] = None,
+    scale: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    lists: Optional[int] = None,
+    seed: int = 0,
+  ):
+    # `scale` is a (mean, std) pair to standardise with instead of this corpus' own, so an
+    # index over a subset measures distances the same way as one over the whole corpus.
+    vectors = np.asarray(vectors, dtype=np.float32)
+    self.paths = list(paths) if paths is not None else None
+    if scale is None:
+      mean = vectors.mean(axis=0) if len(vectors) else np.zeros(vectors.shape[1], dtype=np.float32)
+      std = vectors.std(axis=0) if len(vectors) else np.ones(vectors.shape[1], dtype=np.float32)
+      scale = (mean, np.where(std > 0, std, 1.0).astype(np.float32))
+    self.scale = scale
+    self.weights = np.ones(vectors.shape[1], dtype=np.float32)
+    for name, weight in (weights or {}).items():
+      self.weights[FEATURES.index(name)] = weight
+    self.points = self.transform(vectors)
+    self.norms = (self.points * self.points).sum(axis=1)
+
+    if lists is None:
+      lists = int(math.sqrt(len(vectors))) if len(vectors) >= APPROXIMATE_MIN else 0
+    self.lists = min(lists, len(vectors))
+    if self.lists:
+      self.centroids, assignment = _kmeans(self.points, self.lists, np.random.default_rng(seed))
+      self.order = np.argsort(assignment, kind="stable")
+      self.offsets = np.searchsorted(assignment[self.order], np.arange(self.lists + 1))
+
+  def __len__(self) -> int:
+    return len(self.points)
+
+  def transform(self, vectors: np.ndarray) -> np.ndarray:
+    mean, std = self.scale
+    return ((np.asarray(vectors, dtype=np.float32) - mean) / std * self.weights).astype(np.float32)
+
+  def subset(self, rows: Sequence[int]) -> "NeighbourIndex":
+    # An exact index over some of the points, standardised and weighted like this one.
+    subset = object.__new__(NeighbourIndex)
+    rows = np.asarray(rows, dtype=np.int64)
+    subset.paths = [self.paths[i] for i in rows] if self.paths is not None else None
+    subset.scale, subset.weights = self.scale, self.weights
+    subset.points, subset.norms = self.points[rows], self.norms[rows]
+    subset.lists = 0
+    return subset
+
+  def search(
+    self,
+    queries: np.ndarray,
+    k: int = 10,
+    *,
+    probes: Optional[int] = DEFAULT_PROBES,
+    exclude: Optional[Sequence[int]] = None,
+  ) -> Tuple[np.ndarray, np.ndarray]:
+    # (distances, indices), both (queries, k) and nearest first; rows are padded with inf / -1
+    # when fewer than k points are found. Exact when the index has no lists or probes is None.
+    # exclude[i] is a point index left out of the results for query i (its own, say).
+    return self._search(self.transform(np.atleast_2d(queries)), k, probes, exclude)
+
+  def _search(self, queries: np.ndarray, k: int, probes: Optional[int], exclude: Optional[Sequence[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    k = min(k, len(self))
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    indices = np.full((len(queries), k), -1, dtype=np.int64)
+    if not k:
+      return distances, indices
+    if not self.lists or probes is None or probes >= self.lists:
+      step = max(1, _CHUNK_ELEMENTS // len(self))
+      for start in range(0, len(queries), step):
+        block = _squared_distances(queries[start:start + step], self.points, self.norms)
+        if exclude is not None:
+          own = np.asarray(exclude[start:start + step])
+          block[np.flatnonzero(own >= 0), own[own >= 0]] = np.inf
+        self._take(block, np.arange(len(self)), distances[start:start + step], indices[start:start + step])
+      return distances, indices
+
+    centroid_norms = (self.centroids * self.centroids).sum(axis=1)
+    nearest_lists = np.argsort(_squared_distances(queries, self.centroids, centroid_norms), axis=1)[:, :probes]
+    for row, chosen in enumerate(nearest_lists):
+      candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in chosen])
+      if exclude is not None and exclude[row] >= 0:
+        candidates = candidates[candidates != exclude[row]]
+      block = _squared_distances(queries[row:row + 1], self.points[candidates], self.norms[candidates])
+      self._take(block, candidates, distances[row:row + 1], indices[row:row + 1])
+    return distances, indices
+
+  @staticmethod
+  def _take(block: np.ndarray, candidates: np.ndarray, distances: np.ndarray, indices: np.ndarray):
+    k = min(distances.shape[1], block.shape[1])
+    if not k:
+      return
+    top = np.argpartition(block, k - 1, axis=1)[:, :k] if k < block.shape[1] else np.tile(np.arange(block.shape[1]), (len(block), 1))
+    top_distances = np.take_along_axis(block, top, axis=1)
+    order = np.argsort(top_distances, axis=1, kind="stable")
+    found = np.sqrt(np.take_along_axis(top_distances, order, axis=1))
+    distances[:, :k] = found
+    indices[:, :k] = np.where(np.isfinite(found), candidates[np.take_along_axis(top, order, axis=1)], -1)
+
+  def neighbours(self, index: int, k: int = 10, *, probes: Optional[int] = DEFAULT_PROBES) -> List[Tuple[int, float]]:
+    # The k nearest other points of a point already in the index.
+    distances, indices = self._search(self.points[index:index + 1], k, probes, [index])
+    return [(int(i), float(d)) for i, d in zip(indices[0], distances[0]) if i >= 0]
+
+
+def class_labels(paths: Sequence[str], classes_dir: str) -> List[Optional[str]]:
+  # Hand-assigned labels from the layout classes_dir/<label>/...; None outside it.
+  root = os.path.abspath(classes_dir)
+  labels = []
+  for path in paths:
+    relative = os.path.relpath(os.path.abspath(path), root)
+    parts = relative.split(os.sep)
+    labels.append(parts[0] if len(parts) > 1 and parts[0] != os.pardir else None)
+  return labels
+
+
+def knn_labels(
+  index: NeighbourIndex,
+  labels: Sequence[Optional[str]],
+  *,
+  k: int = 5,
+) -> List[Tuple[Optional[str], float]]:
+  # (label, vote share) for every point from its k nearest labelled neighbours, weighted by
+  # 1 / (1 + distance). A labelled point does not vote for itself, so the predictions for
+  # labelled maps are a leave-one-out check of the hand labels.
+  labelled = np.flatnonzero([label is not None for label in labels])
+  if not len(labelled):
+    return [(None, 0.0)] * len(labels)
+  position = np.full(len(labels), -1, dtype=np.int64)
+  position[labelled] = np.arange(len(labelled))
+  distances, indices = index.subset(labelled)._search(index.points, k, None, position)
+
+  results = []
+  for row_distances, row_indices in zip(distances, indices):
+    votes: Dict[str, float] = defaultdict(float)
+    for distance, neighbour in zip(row_distances, row_indices):
+      if neighbour >= 0:
+        votes[labels[labelled[neighbour]]] += 1.0 / (1.0 + float(distance))
+    if not votes:
+      results.append((None, 0.0))
+      continue
+    label = max(votes, key=votes.get)
+    results.append((label, votes[label] / sum(votes.values())))
+  return results
+
+
+def balance_weights(labels: Sequence[Optional[str]]) -> np.ndarray:
+  # Per-map sample weights that give every class the same total weight (mean weight 1 over the
+  # labelled maps); unlabelled maps get 0.
+  counts = Counter(label for label in labels if label is not None)
+  if not counts:
+    return np.zeros(len(labels))
+  total = sum(counts.values())
+  return np.array([total / (len(counts) * counts[label]) if label is not None else 0.0 for label in labels])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(prog="python -m src.osu.descriptors", description="Describe maps and find similar ones.")
+  parser.add_argument("root", help="directory (or file) of .osu files to describe")
+  parser.add_argument("--db", required=True, help="descriptor store (updated incrementally)")
+  parser.add_argument("--workers", type=int, help="threads for describing new maps")
+  parser.add_argument("--mods", default="", help="comma-separated mod combination to describe maps under")
+  parser.add_argument("--backend", help="difficulty backend (python, numba, auto)")
+  parser.add_argument("--similar", action="append", default=[], metavar="PATH", help="print the nearest maps of PATH")
+  parser.add_argument("-k", type=int, default=10, help="neighbours per query")
+  parser.add_argument("--classes", help="classes directory; prints a predicted label and class weight per map")
+  parser.add_argument("--exact", action="store_true", help="always search exactly")
+  args = parser.parse_args(argv)
+
+  mods = [mod for mod in args.mods.split(",") if mod and mod != "NoMod"]
+  with DescriptorStore(args.db, mods=mods, backend=args.backend) as store:
+    stats = store.update(args.root, max_workers=args.workers)
+    sys.stderr.write(json.dumps(stats) + "\n")
+    paths, vectors = store.load()
+  index = NeighbourIndex(vectors, paths)
+  probes = None if args.exact else DEFAULT_PROBES
+  position = {path: i for i, path in enumerate(paths)}
+
+  for path in args.similar:
+    path = os.path.abspath(path)
+    if path not in position:
+      sys.stderr.write(f"not in the store: {path}\n")
+      return 1
+    found = index.neighbours(position[path], args.k, probes=probes)
+    sys.stdout.write(json.dumps({"path": path, "neighbours": [{"path": paths[i], "distance": d} for i, d in found]}) + "\n")
+
+  if args.classes:
+    labels = class_labels(paths, args.classes)
+    weights = balance_weights(labels)
+    for path, label, (predicted, share), weight in zip(paths, labels, knn_labels(index, labels, k=args.k), weights):
+      sys.stdout.write(json.dumps({"path": path, "label": label, "predicted": predicted, "share": share, "weight": weight}) + "\n")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,10 +1,26 @@
 from .attributes import DifficultyAttributes, PerformanceAttributes
 from .calculator import calculate_difficulty, calculate_performance
+from .batch import calculate_difficulty_batch, iter_difficulty_batch
+from .sectional import SectionalDifficulty, SectionRating, calculate_sectional_difficulty
+from .streaming import calculate_difficulty_streaming
+from .profiling import DifficultyProfiler, ProfileRecord, StageTiming
+from .backend import get_backend, set_backend
 
 __all__ = [
     "DifficultyAttributes",
     "PerformanceAttributes",
     "calculate_difficulty",
     "calculate_performance",
+    "calculate_difficulty_batch",
+    "iter_difficulty_batch",
+    "calculate_sectional_difficulty",
+    "SectionalDifficulty",
+    "SectionRating",
+    "calculate_difficulty_streaming",
+    "DifficultyProfiler",
+    "ProfileRecord",
+    "StageTiming",
+    "get_backend",
+    "set_backend",
 ]
 
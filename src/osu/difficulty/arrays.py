@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from .preprocessing import OsuDifficultyHitObject
+
+CIRCLE = 0
+SLIDER = 1
+SPINNER = 2
+
+_OBJECT_TYPES = {"Circle": CIRCLE, "Slider": SLIDER, "Spinner": SPINNER}
+
+
+@dataclass
+class DifficultyArrays:
+    object_type: np.ndarray
+    start_time: np.ndarray
+    delta_time: np.ndarray
+    strain_time: np.ndarray
+    lazy_jump_distance: np.ndarray
+    minimum_jump_distance: np.ndarray
+    minimum_jump_time: np.ndarray
+    travel_distance: np.ndarray
+    travel_time: np.ndarray
+    # NaN where the object has no angle (OsuDifficultyHitObject.angle is None).
+    angle: np.ndarray
+    hit_window_great: np.ndarray
+    cumulative_strain_time: np.ndarray
+    lazy_travel_distance: np.ndarray
+    # Base object values: unscaled times, playfield positions and slider span counts.
+    base_start_time: np.ndarray
+    object_radius: np.ndarray
+    time_preempt: np.ndarray
+    time_fade_in: np.ndarray
+    stacked_x: np.ndarray
+    stacked_y: np.ndarray
+    stacked_end_x: np.ndarray
+    stacked_end_y: np.ndarray
+    span_count: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.start_time)
+
+    @classmethod
+    def from_objects(cls, objects: Sequence[OsuDifficultyHitObject]) -> "DifficultyArrays":
+        columns = [[] for _ in range(22)]
+        (object_type, start_time, delta_time, strain_time, lazy_jump_distance, minimum_jump_distance,
+         minimum_jump_time, travel_distance, travel_time, angle, hit_window_great, cumulative_strain_time,
+         lazy_travel_distance, base_start_time, object_radius, time_preempt, time_fade_in, stacked_x, stacked_y,
+         stacked_end_x, stacked_end_y, span_count) = columns
+        for obj in objects:
+            base = obj.base_object
+            object_type.append(_OBJECT_TYPES.get(base.object_type, CIRCLE))
+            start_time.append(obj.start_time)
+            delta_time.append(obj.delta_time)
+            strain_time.append(obj.strain_time)
+            lazy_jump_distance.append(obj.lazy_jump_distance)
+            minimum_jump_distance.append(obj.minimum_jump_distance)
+            minimum_jump_time.append(obj.minimum_jump_time)
+            travel_distance.append(obj.travel_distance)
+            travel_time.append(obj.travel_time)
+            angle.append(math.nan if obj.angle is None else obj.angle)
+            hit_window_great.append(obj.hit_window_great)
+            cumulative_strain_time.append(obj.cumulative_strain_time)
+            lazy_travel_distance.append(obj.lazy_travel_distance)
+            base_start_time.append(base.start_time)
+            object_radius.append(base.object_radius)
+            time_preempt.append(base.time_preempt)
+            time_fade_in.append(base.time_fade_in)
+            stacked_x.append(base.stacked_position[0])
+            stacked_y.append(base.stacked_position[1])
+            stacked_end_x.append(base.stacked_end_position[0])
+            stacked_end_y.append(base.stacked_end_position[1])
+            span_count.append(base.slider_repeat_count)
+
+        return cls(
+            np.asarray(object_type, dtype=np.int8),
+            *(np.asarray(column, dtype=np.float64) for column in columns[1:]),
+        )
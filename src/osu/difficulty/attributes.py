@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Sequence
+from typing import TYPE_CHECKING, Optional, Sequence
+
+if TYPE_CHECKING:
+    from .timeline import StrainTimeline
 
 
 @dataclass
@@ -25,7 +28,9 @@ class DifficultyAttributes:
     slider_count: int
     spinner_count: int
     mods: Sequence[str]
+    # Aim strain per object: a list, or a float32 array when a strain timeline was requested.
     strains: Sequence[float]
+    strain_timeline: Optional[StrainTimeline] = None
 
     @property
     def aim(self) -> float:
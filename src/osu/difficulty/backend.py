@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+from typing import Optional
+
+# "python" runs the evaluator classes in evaluators.py (the reference implementation),
+# "numba" runs the jitted ports in kernels.py, "auto" picks numba when it is installed.
+BACKENDS = ("python", "numba", "auto")
+BACKEND_ENV = "OSU_DIFFICULTY_BACKEND"
+
+_backend = os.environ.get(BACKEND_ENV, "python")
+
+
+def numba_available() -> bool:
+    # find_spec does not import numba, so choosing the python backend stays cheap.
+    return importlib.util.find_spec("numba") is not None
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(name: str) -> None:
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown difficulty backend {name!r}, expected one of {BACKENDS}")
+    _backend = name
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    name = name or _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown difficulty backend {name!r}, expected one of {BACKENDS}")
+    if name == "auto":
+        return "numba" if numba_available() else "python"
+    if name == "numba" and not numba_available():
+        raise ImportError("The numba difficulty backend needs numba installed (pip install numba)")
+    return name
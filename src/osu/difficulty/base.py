@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import heapq
 import math
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 from .math_utils import clamp
 
@@ -58,6 +59,11 @@ class StrainSkill(Skill):
         self._current_section_end = 0.0
         self._strain_peaks: List[float] = []
         self.object_strains: List[float] = []
+        # Approximate mode: keep only the largest max_peaks section peaks (as a min-heap,
+        # so _strain_peaks loses its time order) and no per-object strains.
+        self.max_peaks: Optional[int] = None
+        self.record_object_strains = True
+        self.dropped_peaks = 0
 
     def strain_value_at(self, current: DifficultyHitObject) -> float:
         raise NotImplementedError
@@ -76,7 +82,8 @@ class StrainSkill(Skill):
 
         strain = self.strain_value_at(current)
         self._current_section_peak = max(strain, self._current_section_peak)
-        self.object_strains.append(strain)
+        if self.record_object_strains:
+            self.object_strains.append(strain)
 
     def count_top_weighted_strains(self) -> float:
         if not self.object_strains:
@@ -89,7 +96,23 @@ class StrainSkill(Skill):
         return sum(1.1 / (1.0 + math.exp(-10.0 * (s / consistent_top_strain - 0.88))) for s in self.object_strains)
 
     def _save_current_peak(self) -> None:
-        self._strain_peaks.append(self._current_section_peak)
+        if self.max_peaks is None:
+            self._strain_peaks.append(self._current_section_peak)
+        elif len(self._strain_peaks) < self.max_peaks:
+            heapq.heappush(self._strain_peaks, self._current_section_peak)
+        else:
+            heapq.heappushpop(self._strain_peaks, self._current_section_peak)
+            self.dropped_peaks += 1
+
+    def peak_error_bound(self) -> float:
+        # Upper bound on (exact - approximate) difficulty_value when peaks were dropped: every
+        # dropped peak is <= the smallest kept one, and ranks at least max_peaks - 10 in the
+        # sorted list (only the top ten are rescaled), so the tail sums to at most
+        # smallest_kept * sum(0.9^i for i >= max_peaks - 10) = smallest_kept * 10 * 0.9^(max_peaks - 10).
+        if not self.dropped_peaks or not self._strain_peaks:
+            return 0.0
+        rank = max(0, self.max_peaks - 10)
+        return self._strain_peaks[0] * math.pow(self.decay_weight, rank) / (1.0 - self.decay_weight)
 
     def _start_new_section_from(self, time: float, current: DifficultyHitObject) -> None:
         self._current_section_peak = self.calculate_initial_strain(time, current)
@@ -98,7 +121,10 @@ class StrainSkill(Skill):
         return [*self._strain_peaks, self._current_section_peak]
 
     def difficulty_value(self) -> float:
-        peaks = [p for p in self.get_current_strain_peaks() if p > 0]
+        return self.difficulty_value_from_peaks(self.get_current_strain_peaks())
+
+    def difficulty_value_from_peaks(self, strain_peaks: Iterable[float]) -> float:
+        peaks = [p for p in strain_peaks if p > 0]
         peaks.sort(reverse=True)
 
         difficulty = 0.0
@@ -113,8 +139,8 @@ class OsuStrainSkill(StrainSkill):
     reduced_section_count: int = 10
     reduced_strain_baseline: float = 0.75
 
-    def difficulty_value(self) -> float:
-        peaks = [p for p in self.get_current_strain_peaks() if p > 0]
+    def difficulty_value_from_peaks(self, strain_peaks: Iterable[float]) -> float:
+        peaks = [p for p in strain_peaks if p > 0]
         peaks.sort(reverse=True)
 
         limited = peaks[:]
@@ -155,3 +181,6 @@ class DifficultyObject:
     hit_window_great: float = 0.0
     lazy_travel_distance: float = 0.0
     lazy_travel_time: float = 0.0
+    # Unscaled milliseconds, from the mod-adjusted approach rate.
+    time_preempt: float = 0.0
+    time_fade_in: float = 0.0
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from ..beatmap import Beatmap
+from ..mods import Mods
+from .attributes import DifficultyAttributes
+from .calculator import calculate_difficulty
+from .profiling import DifficultyProfiler
+
+BeatmapSource = Union[Beatmap, str]
+ModCombo = Optional[Sequence[Union[Mods, str]]]
+
+
+def _load(source: BeatmapSource) -> Beatmap:
+    return Beatmap(file_path=source) if isinstance(source, str) else source
+
+
+def _run(source: BeatmapSource, mod_combos: Sequence[ModCombo], profiler: Optional[DifficultyProfiler]) -> List[DifficultyAttributes]:
+    beatmap = _load(source)
+    return [calculate_difficulty(beatmap, mods, profiler=profiler) for mods in mod_combos]
+
+
+def iter_difficulty_batch(
+    sources: Iterable[BeatmapSource],
+    mod_combos: Sequence[ModCombo] = (None,),
+    *,
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    profiler: Optional[DifficultyProfiler] = None,
+) -> Iterator[Tuple[int, List[DifficultyAttributes]]]:
+    """Yield ``(input_index, [attributes per mod combo])`` in completion order.
+
+    Sources are parsed inside the worker, once per source, and shared by every
+    mod combo. Parsing and ``calculate_difficulty`` never mutate shared state,
+    so a ``ThreadPoolExecutor`` is safe. On free-threaded (no-GIL) builds the
+    threads run in parallel without the pickling cost of a process pool. Pass
+    an existing ``executor`` to reuse a pool across batches.
+    """
+    own_executor = executor is None
+    pool = ThreadPoolExecutor(max_workers=max_workers) if own_executor else executor
+    try:
+        futures = {pool.submit(_run, source, mod_combos, profiler): idx for idx, source in enumerate(sources)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        if own_executor:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def calculate_difficulty_batch(
+    sources: Iterable[BeatmapSource],
+    mods: ModCombo = None,
+    *,
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    profiler: Optional[DifficultyProfiler] = None,
+) -> List[DifficultyAttributes]:
+    """Calculate difficulty for many beatmaps (objects or ``.osu`` paths) on a thread pool.
+
+    Results are returned in input order. See :func:`iter_difficulty_batch` for
+    several mod combos per map and streaming results.
+    """
+    sources = list(sources)
+    results: List[Optional[DifficultyAttributes]] = [None] * len(sources)
+    for idx, attributes in iter_difficulty_batch(
+        sources, (mods,), max_workers=max_workers, executor=executor, profiler=profiler
+    ):
+        results[idx] = attributes[0]
+    return results  # type: ignore[return-value]
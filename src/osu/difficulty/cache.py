@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, replace
+from typing import Dict, Optional, Sequence, Tuple
+
+from ..mods import Mods
+from .attributes import DifficultyAttributes
+from .mods import normalise_mods
+
+CacheKey = Tuple[str, str]
+
+# Entries are JSON; float32 strain arrays and strain timelines go to an .npz next to the
+# entry as-is (no list conversion) and the JSON field holds "npz" in their place.
+NPZ = "npz"
+
+
+def content_hash(data: bytes | str) -> str:
+    # Same digest as the corpus index (src/osu/index.py) so both can be joined on it.
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    # content_hash of the file's text, without reading it into memory at once.
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def mods_key(mods: Sequence[Mods | str] | None) -> str:
+    # Mod order does not change the result, so ["HardRock", "DoubleTime"] and
+    # ["DoubleTime", "HardRock"] share an entry.
+    return "+".join(sorted(set(normalise_mods(mods)) - {"NoMod"})) or "NM"
+
+
+def variant_key(mods: Sequence[Mods | str] | None, timeline: bool = False, timeline_points: int | None = None) -> str:
+    # Results with a strain timeline carry arrays and a different `strains` type, so they are
+    # kept apart from the plain entries that the CLI and the server read.
+    key = mods_key(mods)
+    if timeline:
+        key += f".timeline{timeline_points or ''}"
+    return key
+
+
+class AttributeCache:
+    def __init__(self, max_entries: int = 4096, directory: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[CacheKey, DifficultyAttributes] = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, key: CacheKey) -> str:
+        digest, mods = key
+        return os.path.join(self.directory, digest[:2], f"{digest}.{mods}.json")
+
+    def get(
+        self,
+        digest: str,
+        mods: Sequence[Mods | str] | None,
+        *,
+        timeline: bool = False,
+        timeline_points: int | None = None,
+    ) -> Optional[DifficultyAttributes]:
+        # timeline/timeline_points as passed to calculate_difficulty for the entry.
+        key = (digest, variant_key(mods, timeline, timeline_points))
+        with self._lock:
+            attributes = self._entries.get(key)
+            if attributes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return attributes
+
+        if self.directory:
+            try:
+                attributes = self._load(self._path(key))
+            except (OSError, ValueError, TypeError, KeyError):
+                attributes = None
+            if attributes is not None:
+                self._remember(key, attributes)
+                with self._lock:
+                    self.hits += 1
+                return attributes
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(
+        self,
+        digest: str,
+        mods: Sequence[Mods | str] | None,
+        attributes: DifficultyAttributes,
+        *,
+        timeline_points: int | None = None,
+    ) -> None:
+        key = (digest, variant_key(mods, attributes.strain_timeline is not None, timeline_points))
+        self._remember(key, attributes)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers never see a half-written entry.
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            record, arrays = self._record(attributes)
+            if arrays:
+                # The arrays land first, so a visible JSON entry always has its .npz.
+                with open(tmp_path, "wb") as f:
+                    _numpy().savez(f, **arrays)
+                os.replace(tmp_path, _npz_path(path))
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def _record(attributes: DifficultyAttributes):
+        # asdict would deep-copy the arrays, so they are split off before it.
+        arrays = {}
+        strains = attributes.strains
+        if not isinstance(strains, (list, tuple)):
+            arrays["strains"] = strains
+            strains = NPZ
+        timeline = attributes.strain_timeline
+        if timeline is not None:
+            arrays.update({f"timeline.{name}": values for name, values in timeline.to_arrays().items()})
+        record = asdict(replace(attributes, strains=[], strain_timeline=None))
+        record["strains"] = strains
+        record["strain_timeline"] = NPZ if timeline is not None else None
+        return record, arrays
+
+    @staticmethod
+    def _load(path: str) -> DifficultyAttributes:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        if NPZ in (record.get("strains"), record.get("strain_timeline")):
+            from .timeline import StrainTimeline
+
+            with _numpy().load(_npz_path(path)) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            if record["strains"] == NPZ:
+                record["strains"] = arrays["strains"]
+            if record["strain_timeline"] == NPZ:
+                prefix = "timeline."
+                record["strain_timeline"] = StrainTimeline.from_arrays(
+                    {name[len(prefix):]: values for name, values in arrays.items() if name.startswith(prefix)}
+                )
+        return DifficultyAttributes(**record)
+
+    def _remember(self, key: CacheKey, attributes: DifficultyAttributes) -> None:
+        with self._lock:
+            self._entries[key] = attributes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def _npz_path(path: str) -> str:
+    return path[: -len(".json")] + ".npz"
+
+
+def _numpy():
+    # Only entries with arrays need numpy; the cache itself stays importable without it.
+    import numpy
+
+    return numpy
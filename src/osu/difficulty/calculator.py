@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import math
-from typing import List, Sequence, Tuple
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Tuple
 
 from ..beatmap import Beatmap
 from ..hit_object import Circle, Slider, Spinner
@@ -13,7 +14,10 @@ from .legacy import calculate_scale_from_circle_size
 from .math_utils import clamp
 from .mods import clock_rate_for_mods, normalise_mods
 from .preprocessing import OsuDifficultyHitObject
+from .profiling import NULL_RECORDING, DifficultyProfiler
+from .backend import resolve_backend
 from .rating import calculate_difficulty_rating, calculate_star_rating_from_performance, difficulty_to_performance
+from .evaluators import RhythmEvaluator
 from .skills import Aim, Speed, Flashlight
 
 
@@ -21,6 +25,11 @@ PREEMPT_MAX = 1800.0
 PREEMPT_MID = 1200.0
 PREEMPT_MIN = 450.0
 
+# approximate=True: section peaks kept per skill (see StrainSkill.peak_error_bound) and
+# objects of rhythm history (the exact evaluator looks back at up to 32).
+APPROXIMATE_TOP_PEAKS = 100
+APPROXIMATE_RHYTHM_HISTORY = 16
+
 
 def calculate_rate_adjusted_approach_rate(approach_rate: float, clock_rate: float) -> float:
     preempt = difficulty_range(approach_rate, DifficultyRange(PREEMPT_MAX, PREEMPT_MID, PREEMPT_MIN)) / clock_rate
@@ -34,11 +43,30 @@ def calculate_rate_adjusted_overall_difficulty(overall_difficulty: float, clock_
     return (79.5 - hit_window_great) / 6.0
 
 
-def calculate_difficulty(beatmap: Beatmap, mods: Sequence[Mods | str] | None = None) -> DifficultyAttributes:
-    mods_list = normalise_mods(mods)
-    clock_rate = clock_rate_for_mods(mods_list)
+@dataclass
+class ModSettings:
+    # Map settings with HardRock/Easy applied; approach_rate and overall_difficulty are not
+    # yet adjusted for the clock rate (hit windows and preempt use the unscaled values).
+    mods: List[str]
+    clock_rate: float
+    approach_rate: float
+    overall_difficulty: float
+    drain_rate: float
+    circle_size: float
+    hit_window_great: float
+    radius: float
+
+    @property
+    def rate_adjusted_approach_rate(self) -> float:
+        return calculate_rate_adjusted_approach_rate(self.approach_rate, self.clock_rate)
+
+    @property
+    def rate_adjusted_overall_difficulty(self) -> float:
+        return calculate_rate_adjusted_overall_difficulty(self.overall_difficulty, self.clock_rate)
 
-    difficulty = beatmap.difficulty
+
+def mod_settings(difficulty, mods: Sequence[Mods | str] | None = None) -> ModSettings:
+    mods_list = normalise_mods(mods)
     approach_rate = float(difficulty.approach_rate)
     overall_difficulty = float(difficulty.overall_difficulty)
     circle_size = float(difficulty.circle_size)
@@ -55,99 +83,276 @@ def calculate_difficulty(beatmap: Beatmap, mods: Sequence[Mods | str] | None = N
         circle_size *= 0.5
         drain_rate *= 0.5
 
-    approach_rate_rate_adjusted = calculate_rate_adjusted_approach_rate(approach_rate, clock_rate)
-    overall_difficulty_rate_adjusted = calculate_rate_adjusted_overall_difficulty(overall_difficulty, clock_rate)
-
     hit_windows = OsuHitWindows()
     hit_windows.set_difficulty(overall_difficulty)
-    hit_window_great = hit_windows.window_for(HitResult.Great)
-    per_object_hit_window = hit_window_great
 
-    radius = 64.0 * calculate_scale_from_circle_size(circle_size, apply_fudge=True)
+    return ModSettings(
+        mods=mods_list,
+        clock_rate=clock_rate_for_mods(mods_list),
+        approach_rate=approach_rate,
+        overall_difficulty=overall_difficulty,
+        drain_rate=drain_rate,
+        circle_size=circle_size,
+        hit_window_great=hit_windows.window_for(HitResult.Great),
+        radius=64.0 * calculate_scale_from_circle_size(circle_size, apply_fudge=True),
+    )
+
+
+@dataclass
+class PreparedBeatmap:
+    mods: List[str]
+    clock_rate: float
+    approach_rate: float
+    overall_difficulty: float
+    drain_rate: float
+    circle_size: float
+    difficulty_objects: List[DifficultyObject]
+    hit_objects: List[OsuDifficultyHitObject]
+
+
+def prepare_beatmap(
+    beatmap: Beatmap,
+    mods: Sequence[Mods | str] | None = None,
+    *,
+    recording=NULL_RECORDING,
+) -> PreparedBeatmap:
+    with recording.stage("mods") as stage:
+        settings = mod_settings(beatmap.difficulty, mods)
+        mods_list = settings.mods
+        clock_rate = settings.clock_rate
+        stage.count = len(mods_list)
 
     stack_leniency = getattr(getattr(beatmap, "general", None), "stack_leniency", 0.7)
     difficulty_objects = _generate_difficulty_objects(
         beatmap,
-        radius,
-        per_object_hit_window,
-        approach_rate=approach_rate,
+        settings.radius,
+        settings.hit_window_great,
+        approach_rate=settings.approach_rate,
         stack_leniency=stack_leniency,
+        recording=recording,
     )
 
-    if len(difficulty_objects) <= 1:
-        hit_circle_count = sum(isinstance(obj, Circle) for obj in beatmap.hit_objects)
-        slider_count = sum(isinstance(obj, Slider) for obj in beatmap.hit_objects)
-        spinner_count = sum(isinstance(obj, Spinner) for obj in beatmap.hit_objects)
-        return DifficultyAttributes(
-            star_rating=0.0,
-            aim_difficulty=0.0,
-            speed_difficulty=0.0,
-            flashlight_difficulty=0.0,
-            slider_factor=1.0,
-            aim_difficult_slider_count=0.0,
-            speed_note_count=0.0,
-            aim_difficult_strain_count=0.0,
-            speed_difficult_strain_count=0.0,
-            approach_rate=approach_rate_rate_adjusted,
-            overall_difficulty=overall_difficulty_rate_adjusted,
-            drain_rate=drain_rate,
-            circle_size=circle_size,
-            clock_rate=clock_rate,
-            max_combo=len(beatmap.hit_objects),
-            hit_circle_count=hit_circle_count,
-            slider_count=slider_count,
-            spinner_count=spinner_count,
-            strains=[],
-            mods=mods_list,
+    difficulty_hit_objects: List[OsuDifficultyHitObject] = []
+    if len(difficulty_objects) > 1:
+        with recording.stage("preprocessing") as stage:
+            for idx in range(1, len(difficulty_objects)):
+                current = difficulty_objects[idx]
+                last = difficulty_objects[idx - 1]
+                diff_obj = OsuDifficultyHitObject(
+                    base_object=current,
+                    last_object=last,
+                    clock_rate=clock_rate,
+                    objects=difficulty_hit_objects,
+                    index=len(difficulty_hit_objects),
+                )
+                difficulty_hit_objects.append(diff_obj)
+            stage.count = len(difficulty_hit_objects)
+
+    return PreparedBeatmap(
+        mods=mods_list,
+        clock_rate=clock_rate,
+        approach_rate=settings.rate_adjusted_approach_rate,
+        overall_difficulty=settings.rate_adjusted_overall_difficulty,
+        drain_rate=settings.drain_rate,
+        circle_size=settings.circle_size,
+        difficulty_objects=difficulty_objects,
+        hit_objects=difficulty_hit_objects,
+    )
+
+
+def calculate_difficulty(
+    beatmap: Beatmap,
+    mods: Sequence[Mods | str] | None = None,
+    *,
+    profiler: DifficultyProfiler | None = None,
+    backend: str | None = None,
+    approximate: bool = False,
+    strain_timeline: bool = False,
+    timeline_points: int | None = None,
+) -> DifficultyAttributes:
+    # strain_timeline=True also returns every skill's strains and section peaks as float32
+    # arrays (attributes.strain_timeline), downsampled to timeline_points bins when given.
+    if strain_timeline and approximate:
+        raise ValueError("strain timelines need the exact calculation (approximate=False)")
+    backend = resolve_backend(backend)
+    recording = profiler.start(getattr(beatmap, "file_path", "")) if profiler is not None else NULL_RECORDING
+
+    prepared = prepare_beatmap(beatmap, mods, recording=recording)
+    mods_list = prepared.mods
+
+    if len(prepared.difficulty_objects) <= 1:
+        recording.finish()
+        attributes = empty_attributes(
+            mods_list,
+            object_counts(beatmap.hit_objects),
+            approach_rate=prepared.approach_rate,
+            overall_difficulty=prepared.overall_difficulty,
+            drain_rate=prepared.drain_rate,
+            circle_size=prepared.circle_size,
+            clock_rate=prepared.clock_rate,
         )
+        if strain_timeline:
+            attributes.strain_timeline = _strain_timeline(prepared, {}, None, timeline_points)[1]
+        return attributes
 
-    difficulty_hit_objects: List[OsuDifficultyHitObject] = []
-    for idx in range(1, len(difficulty_objects)):
-        current = difficulty_objects[idx]
-        last = difficulty_objects[idx - 1]
-        diff_obj = OsuDifficultyHitObject(
-            base_object=current,
-            last_object=last,
-            clock_rate=clock_rate,
-            objects=difficulty_hit_objects,
-            index=len(difficulty_hit_objects),
+    aim_skill, aim_no_sliders_skill, speed_skill, flashlight_skill = run_skills(
+        prepared, backend=backend, approximate=approximate, recording=recording
+    )
+
+    with recording.stage("aggregation") as stage:
+        attributes = aggregate_attributes(
+            beatmap, prepared, (aim_skill, aim_no_sliders_skill, speed_skill, flashlight_skill)
         )
-        difficulty_hit_objects.append(diff_obj)
+        stage.count = sum(skill is not None for skill in (aim_skill, aim_no_sliders_skill, speed_skill, flashlight_skill))
+        if strain_timeline:
+            skills = {"aim": aim_skill, "aim_no_sliders": aim_no_sliders_skill, "speed": speed_skill, "flashlight": flashlight_skill}
+            full, attributes.strain_timeline = _strain_timeline(prepared, skills, speed_skill.object_rhythms, timeline_points)
+            # The per-object aim strains as the timeline's compact array instead of a float list.
+            attributes.strains = full.strains["aim"]
+
+    recording.finish()
+    return attributes
+
+
+def run_skills(
+    prepared: PreparedBeatmap,
+    *,
+    backend: str | None = None,
+    approximate: bool = False,
+    recording=NULL_RECORDING,
+) -> Tuple[Aim, Aim | None, Speed, Flashlight | None]:
+    backend = resolve_backend(backend)
+    mods_list = prepared.mods
+    difficulty_hit_objects = prepared.hit_objects
+    rhythm_history = APPROXIMATE_RHYTHM_HISTORY if approximate else RhythmEvaluator.HISTORY_OBJECTS_MAX
+
+    evaluations = {}
+    if backend == "numba":
+        with recording.stage("kernels") as stage:
+            from .arrays import DifficultyArrays
+            from .kernels import evaluate_all
+
+            arrays = DifficultyArrays.from_objects(difficulty_hit_objects)
+            evaluations = evaluate_all(
+                arrays, mods_list, include_aim_no_sliders=not approximate, rhythm_history=rhythm_history
+            )
+            evaluations = {name: values.tolist() for name, values in evaluations.items()}
+            stage.count = len(arrays)
+
+    aim_skill = Aim(mods_list, include_sliders=True, evaluations=evaluations.get("aim"))
+    aim_no_sliders_skill = None
+    if not approximate:
+        aim_no_sliders_skill = Aim(mods_list, include_sliders=False, evaluations=evaluations.get("aim_no_sliders"))
+    speed_skill = Speed(mods_list, evaluations.get("speed"), evaluations.get("rhythm"))
+    speed_skill.rhythm_history = rhythm_history
+    if approximate:
+        for skill in (aim_skill, speed_skill):
+            skill.max_peaks = APPROXIMATE_TOP_PEAKS
+            skill.record_object_strains = False
 
-    aim_skill = Aim(mods_list, include_sliders=True)
-    aim_no_sliders_skill = Aim(mods_list, include_sliders=False)
-    speed_skill = Speed(mods_list)
     flashlight_skill = None
     if any(mod.lower() == "flashlight" for mod in mods_list):
-        flashlight_skill = Flashlight(mods_list)
+        # Flashlight sums all of its peaks, so it is never truncated.
+        flashlight_skill = Flashlight(mods_list, evaluations.get("flashlight"))
 
-    for diff_obj in difficulty_hit_objects:
-        aim_skill.process(diff_obj)
-        aim_no_sliders_skill.process(diff_obj)
-        speed_skill.process(diff_obj)
-        if flashlight_skill is not None:
-            flashlight_skill.process(diff_obj)
+    skills = [("aim", aim_skill), ("speed", speed_skill)]
+    if aim_no_sliders_skill is not None:
+        skills.insert(1, ("aim_no_sliders", aim_no_sliders_skill))
+    if flashlight_skill is not None:
+        skills.append(("flashlight", flashlight_skill))
 
-    aim_difficulty_value = aim_skill.difficulty_value()
-    aim_rating = calculate_difficulty_rating(aim_difficulty_value)
-    aim_difficult_strain_count = aim_skill.count_top_weighted_strains()
-    difficult_sliders = aim_skill.get_difficult_sliders()
+    # Skills keep independent state, so each one can run over the whole map in turn.
+    for name, skill in skills:
+        with recording.stage(f"skill.{name}") as stage:
+            for diff_obj in difficulty_hit_objects:
+                skill.process(diff_obj)
+            stage.count = len(difficulty_hit_objects)
 
-    aim_no_slider_difficulty_value = aim_no_sliders_skill.difficulty_value()
-    aim_rating_no_sliders = calculate_difficulty_rating(aim_no_slider_difficulty_value)
-    slider_factor = aim_rating_no_sliders / aim_rating if aim_rating > 0 else 1.0
+    return aim_skill, aim_no_sliders_skill, speed_skill, flashlight_skill
 
-    speed_difficulty_value = speed_skill.difficulty_value()
-    speed_rating = calculate_difficulty_rating(speed_difficulty_value)
-    speed_notes = speed_skill.relevant_note_count()
-    speed_difficult_strain_count = speed_skill.count_top_weighted_strains()
 
-    flashlight_rating = 0.0
-    flashlight_difficulty_value = 0.0
-    if flashlight_skill is not None:
-        flashlight_difficulty_value = flashlight_skill.difficulty_value()
-        flashlight_rating = calculate_difficulty_rating(flashlight_difficulty_value)
+def _strain_timeline(prepared: PreparedBeatmap, skills: dict, speed_rhythms, points: int | None):
+    # numpy is only imported when a timeline is requested.
+    from .timeline import build_strain_timeline
+
+    timeline = build_strain_timeline(prepared.hit_objects, skills, speed_rhythms)
+    return timeline, (timeline.downsample(points) if points else timeline)
+
+
+def object_counts(hit_objects: Iterable[Circle | Slider | Spinner]) -> Tuple[int, int, int]:
+    # (circles, sliders, spinners)
+    counts = [0, 0, 0]
+    for obj in hit_objects:
+        if isinstance(obj, Circle):
+            counts[0] += 1
+        elif isinstance(obj, Slider):
+            counts[1] += 1
+        elif isinstance(obj, Spinner):
+            counts[2] += 1
+    return counts[0], counts[1], counts[2]
 
+
+def empty_attributes(
+    mods_list: List[str],
+    counts: Tuple[int, int, int],
+    *,
+    approach_rate: float,
+    overall_difficulty: float,
+    drain_rate: float,
+    circle_size: float,
+    clock_rate: float,
+) -> DifficultyAttributes:
+    # Maps with at most one object have nothing to rate.
+    return DifficultyAttributes(
+        star_rating=0.0,
+        aim_difficulty=0.0,
+        speed_difficulty=0.0,
+        flashlight_difficulty=0.0,
+        slider_factor=1.0,
+        aim_difficult_slider_count=0.0,
+        speed_note_count=0.0,
+        aim_difficult_strain_count=0.0,
+        speed_difficult_strain_count=0.0,
+        approach_rate=approach_rate,
+        overall_difficulty=overall_difficulty,
+        drain_rate=drain_rate,
+        circle_size=circle_size,
+        clock_rate=clock_rate,
+        max_combo=sum(counts),
+        hit_circle_count=counts[0],
+        slider_count=counts[1],
+        spinner_count=counts[2],
+        strains=[],
+        mods=mods_list,
+    )
+
+
+def aggregate_attributes(
+    beatmap: Beatmap,
+    prepared: PreparedBeatmap,
+    skills: Tuple[Aim, Aim | None, Speed, Flashlight | None],
+) -> DifficultyAttributes:
+    # Attributes from skills that already ran (see run_skills), for callers that also need
+    # the skills themselves, e.g. their object strains.
+    return _aggregate(
+        object_counts(beatmap.hit_objects),
+        prepared.mods,
+        *skills,
+        approach_rate=prepared.approach_rate,
+        overall_difficulty=prepared.overall_difficulty,
+        drain_rate=prepared.drain_rate,
+        circle_size=prepared.circle_size,
+        clock_rate=prepared.clock_rate,
+    )
+
+
+def combine_ratings(
+    mods_list: Sequence[str],
+    aim_rating: float,
+    speed_rating: float,
+    flashlight_rating: float,
+) -> Tuple[float, float, float, float]:
+    # Returns (star_rating, aim_rating, speed_rating, flashlight_rating) after mod adjustments.
     mod_set = {mod.lower() for mod in mods_list}
     if "touchdevice" in mod_set:
         aim_rating = math.pow(aim_rating, 0.8)
@@ -176,10 +381,51 @@ def calculate_difficulty(beatmap: Beatmap, mods: Sequence[Mods | str] | None = N
     )
 
     star_rating = calculate_star_rating_from_performance(base_performance)
+    return star_rating, aim_rating, speed_rating, flashlight_rating
+
+
+def _aggregate(
+    counts: Tuple[int, int, int],
+    mods_list: List[str],
+    aim_skill: Aim,
+    aim_no_sliders_skill: Aim | None,
+    speed_skill: Speed,
+    flashlight_skill: Flashlight | None,
+    *,
+    approach_rate: float,
+    overall_difficulty: float,
+    drain_rate: float,
+    circle_size: float,
+    clock_rate: float,
+    keep_strains: bool = True,
+) -> DifficultyAttributes:
+    aim_difficulty_value = aim_skill.difficulty_value()
+    aim_rating = calculate_difficulty_rating(aim_difficulty_value)
+    aim_difficult_strain_count = aim_skill.count_top_weighted_strains()
+    difficult_sliders = aim_skill.get_difficult_sliders()
+
+    # Count-based attributes come out as 0 and slider_factor as 1 in approximate mode, where
+    # object strains are not kept and the no-slider aim pass is skipped.
+    slider_factor = 1.0
+    if aim_no_sliders_skill is not None:
+        aim_no_slider_difficulty_value = aim_no_sliders_skill.difficulty_value()
+        aim_rating_no_sliders = calculate_difficulty_rating(aim_no_slider_difficulty_value)
+        slider_factor = aim_rating_no_sliders / aim_rating if aim_rating > 0 else 1.0
+
+    speed_difficulty_value = speed_skill.difficulty_value()
+    speed_rating = calculate_difficulty_rating(speed_difficulty_value)
+    speed_notes = speed_skill.relevant_note_count()
+    speed_difficult_strain_count = speed_skill.count_top_weighted_strains()
+
+    flashlight_rating = 0.0
+    flashlight_difficulty_value = 0.0
+    if flashlight_skill is not None:
+        flashlight_difficulty_value = flashlight_skill.difficulty_value()
+        flashlight_rating = calculate_difficulty_rating(flashlight_difficulty_value)
 
-    hit_circle_count = sum(isinstance(obj, Circle) for obj in beatmap.hit_objects)
-    slider_count = sum(isinstance(obj, Slider) for obj in beatmap.hit_objects)
-    spinner_count = sum(isinstance(obj, Spinner) for obj in beatmap.hit_objects)
+    star_rating, aim_rating, speed_rating, flashlight_rating = combine_ratings(
+        mods_list, aim_rating, speed_rating, flashlight_rating
+    )
 
     return DifficultyAttributes(
         star_rating=star_rating,
@@ -191,17 +437,17 @@ def calculate_difficulty(beatmap: Beatmap, mods: Sequence[Mods | str] | None = N
         speed_note_count=speed_notes,
         aim_difficult_strain_count=aim_difficult_strain_count,
         speed_difficult_strain_count=speed_difficult_strain_count,
-        approach_rate=approach_rate_rate_adjusted,
-        overall_difficulty=overall_difficulty_rate_adjusted,
+        approach_rate=approach_rate,
+        overall_difficulty=overall_difficulty,
         drain_rate=drain_rate,
         circle_size=circle_size,
         clock_rate=clock_rate,
-        max_combo=len(beatmap.hit_objects),
-        hit_circle_count=hit_circle_count,
-        slider_count=slider_count,
-        spinner_count=spinner_count,
+        max_combo=sum(counts),
+        hit_circle_count=counts[0],
+        slider_count=counts[1],
+        spinner_count=counts[2],
         mods=mods_list,
-        strains=list(aim_skill.object_strains),
+        strains=list(aim_skill.object_strains) if keep_strains else [],
     )
 
 
@@ -212,86 +458,107 @@ def _generate_difficulty_objects(
     *,
     approach_rate: float,
     stack_leniency: float,
+    recording=NULL_RECORDING,
 ) -> List[DifficultyObject]:
-    objects: List[DifficultyObject] = []
-
     sorted_objects = sorted(beatmap.hit_objects, key=lambda obj: obj.time)
-    stack_offsets = _compute_stack_offsets(sorted_objects, radius, approach_rate, stack_leniency)
-
-    for idx, ho in enumerate(sorted_objects):
-        stack_offset = stack_offsets[idx]
-        base_pos = (float(ho.x), float(ho.y))
-        stacked_pos = _apply_stack_offset(base_pos, stack_offset)
-
-        if isinstance(ho, Circle):
-            start_time = float(ho.time)
-            objects.append(
-                DifficultyObject(
-                    start_time=start_time,
-                    end_time=start_time,
-                    position=base_pos,
-                    stacked_position=stacked_pos,
-                    end_position=base_pos,
-                    stacked_end_position=stacked_pos,
-                    object_radius=radius,
-                    object_type="Circle",
-                    hit_window_great=hit_window_great,
-                )
-            )
-        elif isinstance(ho, Slider):
-            start_time = float(ho.time)
-            duration = float(getattr(ho.object_params, "duration", 0.0) or 0.0)
-            end_time = start_time + duration
-            end_pos = _get_slider_end_position(ho)
-            stacked_end_pos = _apply_stack_offset(end_pos, stack_offset)
-            slider_length = float(getattr(ho.object_params, "length", 0.0) or 0.0)
-            repeat_count = int(getattr(ho.object_params, "slides", 1) or 1)
-
-            scaling_factor = OsuDifficultyHitObject.NORMALISED_RADIUS / radius if radius > 0 else 1.0
-            span_count = max(1, repeat_count)
-            lazy_travel_distance = slider_length * span_count * scaling_factor / 100.0
-            lazy_travel_time = duration
-
-            slider_length = float(getattr(ho.object_params, "length", 0.0) or 0.0)
-            repeat_count = int(getattr(ho.object_params, "slides", 1) or 1)
-            objects.append(
-                DifficultyObject(
-                    start_time=start_time,
-                    end_time=end_time,
-                    position=base_pos,
-                    stacked_position=stacked_pos,
-                    end_position=end_pos,
-                    stacked_end_position=stacked_end_pos,
-                    object_radius=radius,
-                    object_type="Slider",
-                    slider_length=slider_length,
-                    slider_duration=duration,
-                    slider_repeat_count=repeat_count,
-                    hit_window_great=hit_window_great,
-                    lazy_travel_distance=lazy_travel_distance,
-                    lazy_travel_time=lazy_travel_time,
-                )
-            )
-        elif isinstance(ho, Spinner):
-            start_time = float(ho.time)
-            end_time = float(getattr(ho.object_params, "end_time", ho.time))
-            objects.append(
-                DifficultyObject(
-                    start_time=start_time,
-                    end_time=end_time,
-                    position=base_pos,
-                    stacked_position=stacked_pos,
-                    end_position=base_pos,
-                    stacked_end_position=stacked_pos,
-                    object_radius=radius,
-                    object_type="Spinner",
-                    hit_window_great=hit_window_great,
-                )
-            )
+    time_preempt, time_fade_in = approach_times(approach_rate)
+    with recording.stage("stacking") as stage:
+        stack_offsets = _compute_stack_offsets(sorted_objects, radius, approach_rate, stack_leniency)
+        stage.count = len(sorted_objects)
+
+    with recording.stage("difficulty_objects") as stage:
+        objects = [
+            difficulty_object(ho, stack_offsets[idx], radius, hit_window_great, time_preempt, time_fade_in)
+            for idx, ho in enumerate(sorted_objects)
+        ]
+        stage.count = len(objects)
 
     return objects
 
 
+def approach_times(approach_rate: float) -> Tuple[float, float]:
+    # (time_preempt, time_fade_in) in unscaled milliseconds.
+    time_preempt = difficulty_range(approach_rate, DifficultyRange(PREEMPT_MAX, PREEMPT_MID, PREEMPT_MIN))
+    return time_preempt, 400.0 * min(1.0, time_preempt / PREEMPT_MIN)
+
+
+def difficulty_object(
+    ho: Circle | Slider | Spinner,
+    stack_offset: float,
+    radius: float,
+    hit_window_great: float,
+    time_preempt: float,
+    time_fade_in: float,
+) -> DifficultyObject:
+    base_pos = (float(ho.x), float(ho.y))
+    stacked_pos = _apply_stack_offset(base_pos, stack_offset)
+
+    if isinstance(ho, Circle):
+        start_time = float(ho.time)
+        return DifficultyObject(
+            start_time=start_time,
+            end_time=start_time,
+            position=base_pos,
+            stacked_position=stacked_pos,
+            end_position=base_pos,
+            stacked_end_position=stacked_pos,
+            object_radius=radius,
+            time_preempt=time_preempt,
+            time_fade_in=time_fade_in,
+            object_type="Circle",
+            hit_window_great=hit_window_great,
+        )
+    if isinstance(ho, Slider):
+        start_time = float(ho.time)
+        duration = float(getattr(ho.object_params, "duration", 0.0) or 0.0)
+        end_time = start_time + duration
+        end_pos = _get_slider_end_position(ho)
+        stacked_end_pos = _apply_stack_offset(end_pos, stack_offset)
+        slider_length = float(getattr(ho.object_params, "length", 0.0) or 0.0)
+        repeat_count = int(getattr(ho.object_params, "slides", 1) or 1)
+
+        scaling_factor = OsuDifficultyHitObject.NORMALISED_RADIUS / radius if radius > 0 else 1.0
+        span_count = max(1, repeat_count)
+        lazy_travel_distance = slider_length * span_count * scaling_factor / 100.0
+        lazy_travel_time = duration
+
+        return DifficultyObject(
+            start_time=start_time,
+            end_time=end_time,
+            position=base_pos,
+            stacked_position=stacked_pos,
+            end_position=end_pos,
+            stacked_end_position=stacked_end_pos,
+            object_radius=radius,
+            time_preempt=time_preempt,
+            time_fade_in=time_fade_in,
+            object_type="Slider",
+            slider_length=slider_length,
+            slider_duration=duration,
+            slider_repeat_count=repeat_count,
+            hit_window_great=hit_window_great,
+            lazy_travel_distance=lazy_travel_distance,
+            lazy_travel_time=lazy_travel_time,
+        )
+    if isinstance(ho, Spinner):
+        start_time = float(ho.time)
+        end_time = float(getattr(ho.object_params, "end_time", ho.time))
+        return DifficultyObject(
+            start_time=start_time,
+            end_time=end_time,
+            position=base_pos,
+            stacked_position=stacked_pos,
+            end_position=base_pos,
+            stacked_end_position=stacked_pos,
+            object_radius=radius,
+            time_preempt=time_preempt,
+            time_fade_in=time_fade_in,
+            object_type="Spinner",
+            hit_window_great=hit_window_great,
+        )
+    raise TypeError(f"not a hit object: {ho!r}")
+
+
 def _compute_stack_offsets(
     hit_objects: Sequence[Circle | Slider | Spinner],
     radius: float,
@@ -12,6 +12,7 @@ from .math_utils import (
     bpm_to_milliseconds,
     logistic,
 )
+from .base import DifficultyObject
 from .preprocessing import OsuDifficultyHitObject
 
 
@@ -174,7 +175,7 @@ class RhythmEvaluator:
     RHYTHM_RATIO_MULTIPLIER = 12.0
 
     @classmethod
-    def evaluate(cls, current: OsuDifficultyHitObject) -> float:
+    def evaluate(cls, current: OsuDifficultyHitObject, history_objects: int = HISTORY_OBJECTS_MAX) -> float:
         if current.base_object.object_type == "Spinner":
             return 0.0
 
@@ -188,9 +189,11 @@ class RhythmEvaluator:
         first_delta_switch = False
 
         historical_note_count = min(current.index, cls.HISTORY_OBJECTS_MAX)
+        # A shorter history only stops the scan early; note decay keeps the full-history weights.
+        scanned_note_count = min(historical_note_count, history_objects)
 
         rhythm_start = 0
-        while rhythm_start < historical_note_count - 2:
+        while rhythm_start < scanned_note_count - 2:
             prev_candidate = current.previous(rhythm_start)
             if prev_candidate is None or current.start_time - prev_candidate.start_time >= cls.HISTORY_TIME_MAX:
                 break
@@ -298,6 +301,95 @@ class RhythmEvaluator:
         return math.sqrt(4.0 + rhythm_complexity_sum * cls.RHYTHM_OVERALL_MULTIPLIER) / 2.0
 
 
+class FlashlightEvaluator:
+    MAX_OPACITY_BONUS = 0.4
+    HIDDEN_BONUS = 0.2
+    MIN_VELOCITY = 0.5
+    SLIDER_MULTIPLIER = 1.3
+    MIN_ANGLE_MULTIPLIER = 0.2
+    HIDDEN_FADE_IN_MULTIPLIER = 0.4
+    HIDDEN_FADE_OUT_MULTIPLIER = 0.3
+    # Lookback stops after this many objects or once the strain time back to an object
+    # exceeds HISTORY_TIME_MAX, whichever comes first.
+    HISTORY_OBJECTS_MAX = 10
+    HISTORY_TIME_MAX = 5 * 1000
+
+    @classmethod
+    def opacity_at(cls, base: DifficultyObject, time: float, hidden: bool) -> float:
+        # Opacity of `base` at (unscaled) `time`; treated as gone once its start time passes.
+        if time > base.start_time:
+            return 0.0
+
+        fade_in_start_time = base.start_time - base.time_preempt
+        fade_in_duration = base.time_preempt * cls.HIDDEN_FADE_IN_MULTIPLIER if hidden else base.time_fade_in
+        opacity = clamp((time - fade_in_start_time) / fade_in_duration, 0.0, 1.0) if fade_in_duration > 0 else 1.0
+
+        if hidden:
+            fade_out_start_time = fade_in_start_time + fade_in_duration
+            fade_out_duration = base.time_preempt * cls.HIDDEN_FADE_OUT_MULTIPLIER
+            if fade_out_duration > 0:
+                opacity = min(opacity, 1.0 - clamp((time - fade_out_start_time) / fade_out_duration, 0.0, 1.0))
+        return opacity
+
+    @classmethod
+    def evaluate(
+        cls,
+        current: OsuDifficultyHitObject,
+        hidden: bool,
+        history_objects: int = HISTORY_OBJECTS_MAX,
+        history_time: float = HISTORY_TIME_MAX,
+    ) -> float:
+        base = current.base_object
+        if base.object_type == "Spinner":
+            return 0.0
+
+        scaling_factor = 52.0 / base.object_radius
+        small_dist_nerf = 1.0
+        angle_repeat_count = 0.0
+        result = 0.0
+
+        for i in range(min(current.index, history_objects)):
+            prev = current.previous(i)
+            # Strain time from the object after `prev` up to and including `current`.
+            cumulative_strain_time = current.cumulative_strain_time - prev.cumulative_strain_time
+            if cumulative_strain_time > history_time:
+                break
+
+            prev_base = prev.base_object
+            if prev_base.object_type == "Spinner":
+                continue
+
+            jump_distance = math.hypot(
+                base.stacked_position[0] - prev_base.stacked_end_position[0],
+                base.stacked_position[1] - prev_base.stacked_end_position[1],
+            )
+            if i == 0:
+                small_dist_nerf = min(1.0, jump_distance / 75.0)
+
+            stack_nerf = min(1.0, (prev.lazy_jump_distance / scaling_factor) / 25.0)
+            opacity_bonus = 1.0 + cls.MAX_OPACITY_BONUS * (1.0 - cls.opacity_at(base, prev_base.start_time, hidden))
+            result += stack_nerf * opacity_bonus * scaling_factor * jump_distance / cumulative_strain_time
+
+            if current.angle is not None and prev.angle is not None and abs(prev.angle - current.angle) < 0.02:
+                angle_repeat_count += max(1.0 - 0.1 * i, 0.0)
+
+        result = math.pow(small_dist_nerf * result, 2.0)
+        if hidden:
+            result *= 1.0 + cls.HIDDEN_BONUS
+        result *= cls.MIN_ANGLE_MULTIPLIER + (1.0 - cls.MIN_ANGLE_MULTIPLIER) / (angle_repeat_count + 1.0)
+
+        slider_bonus = 0.0
+        if base.object_type == "Slider" and current.travel_time > 0:
+            pixel_travel_distance = current.lazy_travel_distance / scaling_factor
+            slider_bonus = math.sqrt(max(0.0, pixel_travel_distance / current.travel_time - cls.MIN_VELOCITY))
+            slider_bonus *= pixel_travel_distance
+            # slider_repeat_count counts spans; repeats are the spans after the first.
+            if base.slider_repeat_count > 1:
+                slider_bonus /= base.slider_repeat_count
+
+        return result + slider_bonus * cls.SLIDER_MULTIPLIER
+
+
 class _Island:
     def __init__(self, epsilon: float, delta: Optional[int] = None) -> None:
         self._epsilon = epsilon
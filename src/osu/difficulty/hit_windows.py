@@ -29,7 +29,8 @@ def difficulty_range(difficulty: float, range_: DifficultyRange) -> float:
 def inverse_difficulty_range(value: float, range_: DifficultyRange) -> float:
     if (value - range_.mid) == 0:
         return 5.0
-    if value > range_.mid:
+    # Ranges can decrease with difficulty (preempt does), so pick the side by direction.
+    if (value - range_.mid) * (range_.max - range_.mid) > 0:
         return ((value - range_.mid) / (range_.max - range_.mid)) * 5.0 + 5.0
     return ((value - range_.mid) / (range_.mid - range_.min)) * 5.0 + 5.0
 
@@ -0,0 +1,489 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Sequence
+
+import numpy as np
+
+from .arrays import SLIDER, SPINNER, DifficultyArrays
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - numba is optional
+    numba = None
+
+# Array-at-a-time ports of AimEvaluator, SpeedEvaluator, RhythmEvaluator and FlashlightEvaluator. The classes in
+# evaluators.py stay the reference implementation; these must match them to 1e-9, including
+# their quirks, which test_kernels.py checks on every dataset map.
+
+
+def _jit(fn):
+    return numba.njit(cache=True, nogil=True)(fn) if numba is not None else fn
+
+
+_NORMALISED_RADIUS = 50.0
+_NORMALISED_DIAMETER = 100.0
+_MIN_DELTA_TIME = 25
+
+_WIDE_ANGLE_MULTIPLIER = 1.5
+_ACUTE_ANGLE_MULTIPLIER = 2.6
+_SLIDER_MULTIPLIER = 1.35
+_VELOCITY_CHANGE_MULTIPLIER = 0.75
+_WIGGLE_MULTIPLIER = 1.02
+
+_SINGLE_SPACING_THRESHOLD = _NORMALISED_DIAMETER * 1.25
+_MIN_SPEED_BONUS = 200.0
+_SPEED_BALANCING_FACTOR = 40.0
+_DISTANCE_MULTIPLIER = 0.9
+
+_HISTORY_TIME_MAX = 5 * 1000
+_HISTORY_OBJECTS_MAX = 32
+_RHYTHM_OVERALL_MULTIPLIER = 0.95
+_RHYTHM_RATIO_MULTIPLIER = 12.0
+
+_FL_MAX_OPACITY_BONUS = 0.4
+_FL_HIDDEN_BONUS = 0.2
+_FL_MIN_VELOCITY = 0.5
+_FL_SLIDER_MULTIPLIER = 1.3
+_FL_MIN_ANGLE_MULTIPLIER = 0.2
+_FL_HIDDEN_FADE_IN_MULTIPLIER = 0.4
+_FL_HIDDEN_FADE_OUT_MULTIPLIER = 0.3
+_FL_HISTORY_OBJECTS_MAX = 10
+_FL_HISTORY_TIME_MAX = 5 * 1000
+
+
+@_jit
+def _clamp(value, min_value, max_value):
+    return max(min_value, min(max_value, value))
+
+
+@_jit
+def _smoothstep(x, start, end):
+    t = _clamp((x - start) / (end - start), 0.0, 1.0)
+    return t * t * (3.0 - 2.0 * t)
+
+
+@_jit
+def _smootherstep(x, start, end):
+    t = _clamp((x - start) / (end - start), 0.0, 1.0)
+    return t * t * t * (t * (6.0 * t - 15.0) + 10.0)
+
+
+@_jit
+def _reverse_lerp(x, start, end):
+    return _clamp((x - start) / (end - start), 0.0, 1.0)
+
+
+@_jit
+def _doubletapness(delta_time, hit_window_great, current, following):
+    curr_delta_time = max(1.0, delta_time[current])
+    next_delta_time = max(1.0, delta_time[following])
+    delta_difference = abs(next_delta_time - curr_delta_time)
+    speed_ratio = curr_delta_time / max(curr_delta_time, delta_difference)
+    window_ratio = 0.0
+    if hit_window_great[current] > 0:
+        window_ratio = math.pow(min(1.0, curr_delta_time / hit_window_great[current]), 2.0)
+    return 1.0 - math.pow(speed_ratio, 1.0 - window_ratio)
+
+
+@_jit
+def _aim(object_type, strain_time, lazy_jump_distance, minimum_jump_distance, minimum_jump_time,
+         travel_distance, travel_time, angle, include_sliders):
+    n = len(strain_time)
+    out = np.zeros(n)
+    radius = _NORMALISED_RADIUS
+    diameter = _NORMALISED_DIAMETER
+    wide_low, wide_high = math.radians(40), math.radians(140)
+    wiggle_low, wiggle_high = math.radians(110), math.radians(60)
+
+    for i in range(2, n):
+        prev = i - 1
+        prev_prev = i - 2
+        if object_type[i] == SPINNER or object_type[prev] == SPINNER:
+            continue
+
+        curr_velocity = lazy_jump_distance[i] / strain_time[i] if strain_time[i] > 0 else 0.0
+        if include_sliders and object_type[prev] == SLIDER:
+            travel_velocity = travel_distance[prev] / travel_time[prev] if travel_time[prev] > 0 else 0.0
+            movement_velocity = minimum_jump_distance[i] / minimum_jump_time[i] if minimum_jump_time[i] > 0 else 0.0
+            curr_velocity = max(curr_velocity, movement_velocity + travel_velocity)
+
+        prev_velocity = lazy_jump_distance[prev] / strain_time[prev] if strain_time[prev] > 0 else 0.0
+        if include_sliders and object_type[prev_prev] == SLIDER:
+            travel_velocity = travel_distance[prev_prev] / travel_time[prev_prev] if travel_time[prev_prev] > 0 else 0.0
+            movement_velocity = minimum_jump_distance[prev] / minimum_jump_time[prev] if minimum_jump_time[prev] > 0 else 0.0
+            prev_velocity = max(prev_velocity, movement_velocity + travel_velocity)
+
+        wide_angle_bonus = 0.0
+        acute_angle_bonus = 0.0
+        slider_bonus = 0.0
+        velocity_change_bonus = 0.0
+        wiggle_bonus = 0.0
+
+        aim_strain = curr_velocity
+
+        if max(strain_time[i], strain_time[prev]) < 1.25 * min(strain_time[i], strain_time[prev]):
+            if not math.isnan(angle[i]) and not math.isnan(angle[prev]):
+                curr_angle = angle[i]
+                last_angle = angle[prev]
+
+                angle_bonus = min(curr_velocity, prev_velocity)
+
+                wide_angle_bonus = _smoothstep(curr_angle, wide_low, wide_high)
+                acute_angle_bonus = _smoothstep(curr_angle, wide_high, wide_low)
+
+                wide_angle_bonus *= 1 - min(wide_angle_bonus, math.pow(_smoothstep(last_angle, wide_low, wide_high), 3))
+                acute_angle_bonus *= 0.08 + 0.92 * (1 - min(acute_angle_bonus, math.pow(_smoothstep(last_angle, wide_high, wide_low), 3)))
+
+                wide_angle_bonus *= angle_bonus * _smootherstep(lazy_jump_distance[i], 0.0, diameter)
+                acute_angle_bonus *= (
+                    angle_bonus
+                    * _smootherstep(60000.0 / (strain_time[i] * 2), 300, 400)
+                    * _smootherstep(lazy_jump_distance[i], diameter, diameter * 2)
+                )
+
+                wiggle_bonus = (
+                    angle_bonus
+                    * _smootherstep(lazy_jump_distance[i], radius, diameter)
+                    * math.pow(_reverse_lerp(lazy_jump_distance[i], diameter * 3, diameter), 1.8)
+                    * _smootherstep(curr_angle, wiggle_low, wiggle_high)
+                    * _smootherstep(lazy_jump_distance[prev], radius, diameter)
+                    * math.pow(_reverse_lerp(lazy_jump_distance[prev], diameter * 3, diameter), 1.8)
+                    * _smootherstep(last_angle, wiggle_low, wiggle_high)
+                )
+
+        if max(prev_velocity, curr_velocity) > 0:
+            prev_velocity = (lazy_jump_distance[prev] + travel_distance[prev_prev]) / strain_time[prev] if strain_time[prev] > 0 else 0.0
+            curr_velocity = (lazy_jump_distance[i] + travel_distance[prev]) / strain_time[i] if strain_time[i] > 0 else 0.0
+
+            max_velocity = max(prev_velocity, curr_velocity)
+            if max_velocity > 0:
+                dist_ratio = math.pow(math.sin(math.pi / 2 * abs(prev_velocity - curr_velocity) / max_velocity), 2)
+                min_strain = min(strain_time[i], strain_time[prev])
+                max_strain = max(strain_time[i], strain_time[prev])
+                overlap_velocity_buff = min(diameter * 1.25 / min_strain if min_strain > 0 else 0.0, abs(prev_velocity - curr_velocity))
+                velocity_change_bonus = overlap_velocity_buff * dist_ratio
+                if max_strain > 0:
+                    velocity_change_bonus *= math.pow(min_strain / max_strain, 2)
+
+        if include_sliders and object_type[prev] == SLIDER:
+            slider_bonus = travel_distance[prev] / travel_time[prev] if travel_time[prev] > 0 else 0.0
+
+        aim_strain += wiggle_bonus * _WIGGLE_MULTIPLIER
+        aim_strain += max(
+            acute_angle_bonus * _ACUTE_ANGLE_MULTIPLIER,
+            wide_angle_bonus * _WIDE_ANGLE_MULTIPLIER + velocity_change_bonus * _VELOCITY_CHANGE_MULTIPLIER,
+        )
+
+        if include_sliders:
+            aim_strain += slider_bonus * _SLIDER_MULTIPLIER
+
+        out[i] = aim_strain
+    return out
+
+
+@_jit
+def _speed(object_type, delta_time, strain_time, minimum_jump_distance, travel_distance, hit_window_great, autopilot):
+    n = len(strain_time)
+    out = np.zeros(n)
+    min_speed_ms = 60000.0 / 4 / _MIN_SPEED_BONUS
+
+    for i in range(1, n):
+        if object_type[i] == SPINNER:
+            continue
+
+        current_strain_time = strain_time[i]
+        if hit_window_great[i] > 0:
+            current_strain_time /= _clamp((current_strain_time / hit_window_great[i]) / 0.93, 0.92, 1.0)
+
+        doubletapness = 1.0
+        if i + 1 < n:
+            doubletapness = 1.0 - _doubletapness(delta_time, hit_window_great, i, i + 1)
+
+        speed_bonus = 0.0
+        if 60000.0 / (current_strain_time * 4) > _MIN_SPEED_BONUS:
+            speed_bonus = 0.75 * math.pow((min_speed_ms - current_strain_time) / _SPEED_BALANCING_FACTOR, 2)
+
+        distance = min(travel_distance[i - 1] + minimum_jump_distance[i], _SINGLE_SPACING_THRESHOLD)
+        distance_bonus = math.pow(distance / _SINGLE_SPACING_THRESHOLD, 3.95) * _DISTANCE_MULTIPLIER
+
+        if autopilot:
+            distance_bonus = 0.0
+
+        difficulty = (1.0 + speed_bonus + distance_bonus) * 1000.0 / current_strain_time if current_strain_time > 0 else 0.0
+        out[i] = difficulty * doubletapness
+    return out
+
+
+@_jit
+def _island_equals(delta_a, count_a, delta_b, count_b, epsilon):
+    # An island with delta -1 has no delta yet (_Island.delta is None) and equals nothing.
+    if delta_a < 0 or delta_b < 0:
+        return False
+    return abs(delta_a - delta_b) < epsilon and count_a == count_b
+
+
+@_jit
+def _rhythm(object_type, start_time, delta_time, strain_time, hit_window_great, history_objects):
+    n = len(strain_time)
+    out = np.ones(n)
+    count_deltas = np.empty(max(1, history_objects), dtype=np.int64)
+    count_sizes = np.empty(max(1, history_objects), dtype=np.int64)
+    count_counts = np.empty(max(1, history_objects), dtype=np.int64)
+
+    for current in range(n):
+        if object_type[current] == SPINNER:
+            out[current] = 0.0
+            continue
+
+        delta_difference_epsilon = hit_window_great[current] * 0.3
+        island_delta, island_count = -1, 0
+        previous_delta, previous_count = -1, 0
+        island_total = 0
+
+        rhythm_complexity_sum = 0.0
+        start_ratio = 0.0
+        first_delta_switch = False
+
+        historical_note_count = min(current, _HISTORY_OBJECTS_MAX)
+        scanned_note_count = min(historical_note_count, history_objects)
+
+        rhythm_start = 0
+        while rhythm_start < scanned_note_count - 2:
+            candidate = current - rhythm_start - 1
+            if candidate < 0 or start_time[current] - start_time[candidate] >= _HISTORY_TIME_MAX:
+                break
+            rhythm_start += 1
+
+        prev_obj = current - rhythm_start - 1
+        last_obj = current - rhythm_start - 2
+        if prev_obj < 0 or last_obj < 0:
+            continue
+
+        for i in range(rhythm_start, 0, -1):
+            curr_obj = current - i
+
+            time_decay = (_HISTORY_TIME_MAX - (start_time[current] - start_time[curr_obj])) / _HISTORY_TIME_MAX
+            note_decay = (historical_note_count - i) / historical_note_count if historical_note_count > 0 else 0.0
+            curr_historical_decay = max(0.0, min(note_decay, time_decay))
+
+            curr_delta = strain_time[curr_obj]
+            prev_delta = strain_time[prev_obj]
+            last_delta = strain_time[last_obj]
+
+            if curr_delta <= 0 or prev_delta <= 0:
+                prev_obj = curr_obj
+                last_obj = prev_obj
+                continue
+
+            delta_difference_ratio = min(prev_delta, curr_delta) / max(prev_delta, curr_delta)
+            if delta_difference_ratio <= 0:
+                delta_difference_ratio = 1.0
+
+            curr_ratio = 1.0 + _RHYTHM_RATIO_MULTIPLIER * min(0.5, math.pow(math.sin(math.pi / delta_difference_ratio), 2))
+
+            fraction = max(prev_delta / curr_delta, curr_delta / prev_delta)
+            fraction_multiplier = _clamp(2.0 - fraction / 8.0, 0.0, 1.0)
+
+            if delta_difference_epsilon <= 0:
+                window_penalty = 1.0
+            else:
+                window_penalty = min(1.0, max(0.0, abs(prev_delta - curr_delta) - delta_difference_epsilon) / delta_difference_epsilon)
+
+            effective_ratio = window_penalty * curr_ratio * fraction_multiplier
+
+            if first_delta_switch:
+                if abs(prev_delta - curr_delta) < delta_difference_epsilon:
+                    if island_delta < 0:
+                        island_delta = max(int(curr_delta), _MIN_DELTA_TIME)
+                    island_count += 1
+                else:
+                    if object_type[curr_obj] == SLIDER:
+                        effective_ratio *= 0.125
+
+                    if object_type[prev_obj] == SLIDER:
+                        effective_ratio *= 0.3
+
+                    if island_count % 2 == previous_count % 2:
+                        effective_ratio *= 0.5
+
+                    if last_delta > prev_delta + delta_difference_epsilon and prev_delta > curr_delta + delta_difference_epsilon:
+                        effective_ratio *= 0.125
+
+                    if previous_count == island_count:
+                        effective_ratio *= 0.5
+
+                    existing_index = -1
+                    for idx in range(island_total):
+                        if _island_equals(count_deltas[idx], count_sizes[idx], island_delta, island_count, delta_difference_epsilon):
+                            existing_index = idx
+                            break
+
+                    if existing_index >= 0:
+                        existing_count = count_counts[existing_index]
+                        if _island_equals(previous_delta, previous_count, island_delta, island_count, delta_difference_epsilon):
+                            existing_count += 1
+                        island_value = float(island_delta) if island_delta > 0 else 0.0
+                        power = 2.75 / (1.0 + math.exp(0.24 * (58.33 - island_value)))
+                        effective_ratio *= min(3.0 / existing_count, math.pow(1.0 / existing_count, power))
+                        count_counts[existing_index] = existing_count
+                    else:
+                        count_deltas[island_total] = island_delta
+                        count_sizes[island_total] = island_count
+                        count_counts[island_total] = 1
+                        island_total += 1
+
+                    doubletapness = _doubletapness(delta_time, hit_window_great, prev_obj, curr_obj)
+                    effective_ratio *= 1 - doubletapness * 0.75
+
+                    rhythm_complexity_sum += math.sqrt(max(0.0, effective_ratio * start_ratio)) * curr_historical_decay
+                    start_ratio = effective_ratio
+
+                    previous_delta, previous_count = island_delta, island_count
+
+                    if prev_delta + delta_difference_epsilon < curr_delta:
+                        first_delta_switch = False
+
+                    island_delta, island_count = max(int(curr_delta), _MIN_DELTA_TIME), 1
+            elif prev_delta > curr_delta + delta_difference_epsilon:
+                first_delta_switch = True
+
+                if object_type[curr_obj] == SLIDER:
+                    effective_ratio *= 0.6
+
+                if object_type[prev_obj] == SLIDER:
+                    effective_ratio *= 0.6
+
+                start_ratio = effective_ratio
+                island_delta, island_count = max(int(curr_delta), _MIN_DELTA_TIME), 1
+
+            last_obj = prev_obj
+            prev_obj = curr_obj
+
+        out[current] = math.sqrt(4.0 + rhythm_complexity_sum * _RHYTHM_OVERALL_MULTIPLIER) / 2.0
+    return out
+
+
+@_jit
+def _opacity_at(start_time, time_preempt, time_fade_in, time, hidden):
+    if time > start_time:
+        return 0.0
+
+    fade_in_start_time = start_time - time_preempt
+    fade_in_duration = time_preempt * _FL_HIDDEN_FADE_IN_MULTIPLIER if hidden else time_fade_in
+    opacity = _clamp((time - fade_in_start_time) / fade_in_duration, 0.0, 1.0) if fade_in_duration > 0 else 1.0
+
+    if hidden:
+        fade_out_start_time = fade_in_start_time + fade_in_duration
+        fade_out_duration = time_preempt * _FL_HIDDEN_FADE_OUT_MULTIPLIER
+        if fade_out_duration > 0:
+            opacity = min(opacity, 1.0 - _clamp((time - fade_out_start_time) / fade_out_duration, 0.0, 1.0))
+    return opacity
+
+
+@_jit
+def _flashlight(object_type, cumulative_strain_time, lazy_jump_distance, angle, travel_time, lazy_travel_distance,
+                base_start_time, object_radius, time_preempt, time_fade_in, stacked_x, stacked_y, stacked_end_x,
+                stacked_end_y, span_count, hidden, history_objects, history_time):
+    n = len(object_type)
+    out = np.zeros(n)
+
+    for current in range(n):
+        if object_type[current] == SPINNER:
+            continue
+
+        scaling_factor = 52.0 / object_radius[current]
+        small_dist_nerf = 1.0
+        angle_repeat_count = 0.0
+        result = 0.0
+
+        for i in range(min(current, history_objects)):
+            prev = current - (i + 1)
+            cumulative = cumulative_strain_time[current] - cumulative_strain_time[prev]
+            if cumulative > history_time:
+                break
+            if object_type[prev] == SPINNER:
+                continue
+
+            jump_distance = math.hypot(stacked_x[current] - stacked_end_x[prev], stacked_y[current] - stacked_end_y[prev])
+            if i == 0:
+                small_dist_nerf = min(1.0, jump_distance / 75.0)
+
+            stack_nerf = min(1.0, (lazy_jump_distance[prev] / scaling_factor) / 25.0)
+            opacity = _opacity_at(base_start_time[current], time_preempt[current], time_fade_in[current], base_start_time[prev], hidden)
+            opacity_bonus = 1.0 + _FL_MAX_OPACITY_BONUS * (1.0 - opacity)
+            result += stack_nerf * opacity_bonus * scaling_factor * jump_distance / cumulative
+
+            if not math.isnan(angle[current]) and not math.isnan(angle[prev]) and abs(angle[prev] - angle[current]) < 0.02:
+                angle_repeat_count += max(1.0 - 0.1 * i, 0.0)
+
+        result = math.pow(small_dist_nerf * result, 2.0)
+        if hidden:
+            result *= 1.0 + _FL_HIDDEN_BONUS
+        result *= _FL_MIN_ANGLE_MULTIPLIER + (1.0 - _FL_MIN_ANGLE_MULTIPLIER) / (angle_repeat_count + 1.0)
+
+        slider_bonus = 0.0
+        if object_type[current] == SLIDER and travel_time[current] > 0:
+            pixel_travel_distance = lazy_travel_distance[current] / scaling_factor
+            slider_bonus = math.sqrt(max(0.0, pixel_travel_distance / travel_time[current] - _FL_MIN_VELOCITY))
+            slider_bonus *= pixel_travel_distance
+            if span_count[current] > 1:
+                slider_bonus /= span_count[current]
+
+        out[current] = result + slider_bonus * _FL_SLIDER_MULTIPLIER
+    return out
+
+
+def evaluate_aim(arrays: DifficultyArrays, include_sliders: bool) -> np.ndarray:
+    return _aim(
+        arrays.object_type, arrays.strain_time, arrays.lazy_jump_distance, arrays.minimum_jump_distance,
+        arrays.minimum_jump_time, arrays.travel_distance, arrays.travel_time, arrays.angle, include_sliders,
+    )
+
+
+def evaluate_speed(arrays: DifficultyArrays, mods: Sequence[str]) -> np.ndarray:
+    autopilot = any(mod.lower() == "autopilot" for mod in mods)
+    return _speed(
+        arrays.object_type, arrays.delta_time, arrays.strain_time, arrays.minimum_jump_distance,
+        arrays.travel_distance, arrays.hit_window_great, autopilot,
+    )
+
+
+def evaluate_rhythm(arrays: DifficultyArrays, history_objects: int = _HISTORY_OBJECTS_MAX) -> np.ndarray:
+    return _rhythm(
+        arrays.object_type, arrays.start_time, arrays.delta_time, arrays.strain_time, arrays.hit_window_great, history_objects,
+    )
+
+
+def evaluate_flashlight(
+    arrays: DifficultyArrays,
+    hidden: bool,
+    history_objects: int = _FL_HISTORY_OBJECTS_MAX,
+    history_time: float = _FL_HISTORY_TIME_MAX,
+) -> np.ndarray:
+    return _flashlight(
+        arrays.object_type, arrays.cumulative_strain_time, arrays.lazy_jump_distance, arrays.angle, arrays.travel_time,
+        arrays.lazy_travel_distance, arrays.base_start_time, arrays.object_radius, arrays.time_preempt,
+        arrays.time_fade_in, arrays.stacked_x, arrays.stacked_y, arrays.stacked_end_x, arrays.stacked_end_y,
+        arrays.span_count, hidden, history_objects, float(history_time),
+    )
+
+
+def evaluate_all(
+    arrays: DifficultyArrays,
+    mods: Sequence[str],
+    *,
+    include_aim_no_sliders: bool = True,
+    rhythm_history: int = _HISTORY_OBJECTS_MAX,
+) -> Dict[str, np.ndarray]:
+    evaluations = {
+        "aim": evaluate_aim(arrays, True),
+        "speed": evaluate_speed(arrays, mods),
+        "rhythm": evaluate_rhythm(arrays, rhythm_history),
+    }
+    if include_aim_no_sliders:
+        evaluations["aim_no_sliders"] = evaluate_aim(arrays, False)
+    mod_set = {mod.lower() for mod in mods}
+    if "flashlight" in mod_set:
+        evaluations["flashlight"] = evaluate_flashlight(arrays, "hidden" in mod_set)
+    return evaluations
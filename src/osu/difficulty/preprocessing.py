@@ -35,6 +35,9 @@ class OsuDifficultyHitObject(DifficultyHitObject):
     ASSUMED_SLIDER_RADIUS: float = NORMALISED_RADIUS * 1.8
 
     strain_time: float = 0.0
+    # Sum of strain_time over this and every earlier object, so the strain time between any
+    # two objects is one subtraction.
+    cumulative_strain_time: float = 0.0
     lazy_jump_distance: float = 0.0
     minimum_jump_distance: float = 0.0
     minimum_jump_time: float = 0.0
@@ -54,6 +57,7 @@ class OsuDifficultyHitObject(DifficultyHitObject):
         last_last = self.previous(1)
 
         self.strain_time = max(self.delta_time, self.MIN_DELTA_TIME)
+        self.cumulative_strain_time = (last.cumulative_strain_time if last is not None else 0.0) + self.strain_time
         self.hit_window_great = (2.0 * base.hit_window_great) / self.clock_rate if base.hit_window_great else 0.0
 
         self._initialise_slider_values(base)
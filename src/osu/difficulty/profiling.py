@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Log-spaced histogram edges (seconds), four buckets per decade from 10us to 10s.
+DEFAULT_HISTOGRAM_EDGES: Tuple[float, ...] = tuple(10.0 ** (k / 4.0) for k in range(-20, 5))
+
+
+@dataclass
+class StageTiming:
+    name: str
+    seconds: float
+    count: int = 0
+
+
+@dataclass
+class ProfileRecord:
+    label: str
+    stages: List[StageTiming] = field(default_factory=list)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages)
+
+    def seconds(self, name: str) -> float:
+        return sum(stage.seconds for stage in self.stages if stage.name == name)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "label": self.label,
+            "total_seconds": self.total_seconds,
+            "stages": {stage.name: {"seconds": stage.seconds, "count": stage.count} for stage in self.stages},
+        }
+
+
+class _Stage:
+    __slots__ = ("_recording", "_name", "_start", "count")
+
+    def __init__(self, recording: "_Recording", name: str) -> None:
+        self._recording = recording
+        self._name = name
+        self._start = 0.0
+        self.count = 0
+
+    def __enter__(self) -> "_Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self._start
+        self._recording.record.stages.append(StageTiming(self._name, elapsed, self.count))
+
+
+class _Recording:
+    __slots__ = ("_profiler", "record")
+
+    def __init__(self, profiler: "DifficultyProfiler", label: str) -> None:
+        self._profiler = profiler
+        self.record = ProfileRecord(label)
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def finish(self) -> ProfileRecord:
+        self._profiler._add(self.record)
+        return self.record
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    @property
+    def count(self) -> int:
+        return 0
+
+    @count.setter
+    def count(self, value: int) -> None:
+        pass
+
+
+class _NullRecording:
+    __slots__ = ()
+    record = None
+
+    def stage(self, name: str) -> _NullStage:
+        return _NULL_STAGE
+
+    def finish(self) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+NULL_RECORDING = _NullRecording()
+
+
+class DifficultyProfiler:
+    def __init__(self) -> None:
+        self.records: List[ProfileRecord] = []
+        self._lock = threading.Lock()
+
+    def start(self, label: str = "") -> _Recording:
+        return _Recording(self, label)
+
+    def _add(self, record: ProfileRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def merge(self, records: Sequence[ProfileRecord]) -> None:
+        # Records collected elsewhere, e.g. returned from worker processes.
+        with self._lock:
+            self.records.extend(records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+
+    @property
+    def last(self) -> Optional[ProfileRecord]:
+        return self.records[-1] if self.records else None
+
+    def stage_names(self) -> List[str]:
+        names: Dict[str, None] = {}
+        for record in self.records:
+            for stage in record.stages:
+                names.setdefault(stage.name, None)
+        return list(names)
+
+    def stage_seconds(self, name: str) -> List[float]:
+        return [record.seconds(name) for record in self.records if any(s.name == name for s in record.stages)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = {}
+        for name in [*self.stage_names(), "total"]:
+            if name == "total":
+                samples = sorted(record.total_seconds for record in self.records)
+                counts = [0]
+            else:
+                samples = sorted(self.stage_seconds(name))
+                counts = [s.count for record in self.records for s in record.stages if s.name == name]
+            if not samples:
+                continue
+            result[name] = {
+                "calls": len(samples),
+                "objects": sum(counts),
+                "total": sum(samples),
+                "mean": sum(samples) / len(samples),
+                "p50": _percentile(samples, 50.0),
+                "p90": _percentile(samples, 90.0),
+                "p99": _percentile(samples, 99.0),
+                "max": samples[-1],
+            }
+        return result
+
+    def histogram(self, name: str = "total", edges: Sequence[float] = DEFAULT_HISTOGRAM_EDGES) -> List[Tuple[float, int]]:
+        if name == "total":
+            samples = [record.total_seconds for record in self.records]
+        else:
+            samples = self.stage_seconds(name)
+
+        buckets = [0] * (len(edges) + 1)
+        for value in samples:
+            idx = 0
+            while idx < len(edges) and value > edges[idx]:
+                idx += 1
+            buckets[idx] += 1
+        return list(zip([*edges, math.inf], buckets))
+
+    def slowest(self, n: int = 10, name: str = "total") -> List[ProfileRecord]:
+        key = (lambda r: r.total_seconds) if name == "total" else (lambda r: r.seconds(name))
+        return sorted(self.records, key=key, reverse=True)[:n]
+
+    def format_summary(self) -> str:
+        lines = [f"{'stage':<24}{'calls':>8}{'objects':>10}{'total s':>11}{'mean ms':>10}{'p90 ms':>10}{'max ms':>10}"]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name:<24}{int(stats['calls']):>8}{int(stats['objects']):>10}{stats['total']:>11.3f}"
+                f"{stats['mean'] * 1000:>10.2f}{stats['p90'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}"
+            )
+        return "\n".join(lines)
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import heapq
+import math
+from dataclasses import dataclass
+from itertools import accumulate, islice
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from ..beatmap import Beatmap
+from ..mods import Mods
+from ..timing_point import TimingPoint
+from .base import StrainSkill
+from .calculator import combine_ratings, prepare_beatmap, run_skills
+from .rating import calculate_difficulty_rating
+
+# Peaks are weighted by decay_weight ** rank (0.9), so everything past rank 300 moves a
+# difficulty value by less than 0.9 ** 300 / 0.075 ~ 3e-13 of itself.
+TOP_K = 300
+
+EFFECT_KIAI = 1
+
+
+@dataclass
+class SectionRating:
+    start_time: float
+    end_time: float
+    star_rating: float
+    aim_difficulty: float
+    speed_difficulty: float
+    flashlight_difficulty: float
+    section_count: int
+
+
+class PeakRangeIndex:
+    # Segment tree over per-section strain peaks. Each node keeps the top-k positive peaks
+    # of its span sorted descending, so a range query merges O(log n) short lists.
+    def __init__(self, peaks: Sequence[float], k: int = TOP_K) -> None:
+        self.k = k
+        self.length = len(peaks)
+        self._size = 1
+        while self._size < max(1, self.length):
+            self._size *= 2
+        self._nodes: List[List[float]] = [[] for _ in range(2 * self._size)]
+        for idx, peak in enumerate(peaks):
+            if peak > 0:
+                self._nodes[self._size + idx] = [peak]
+        for idx in range(self._size - 1, 0, -1):
+            self._nodes[idx] = self._merge(self._nodes[2 * idx], self._nodes[2 * idx + 1])
+
+    def __len__(self) -> int:
+        return self.length
+
+    def _merge(self, *lists: List[float]) -> List[float]:
+        return list(islice(heapq.merge(*lists, reverse=True), self.k))
+
+    def top(self, start: int, stop: int) -> List[float]:
+        # Top-k positive peaks of sections [start, stop), largest first.
+        start = max(0, start) + self._size
+        stop = min(self.length, stop) + self._size
+        parts: List[List[float]] = []
+        while start < stop:
+            if start & 1:
+                parts.append(self._nodes[start])
+                start += 1
+            if stop & 1:
+                stop -= 1
+                parts.append(self._nodes[stop])
+            start //= 2
+            stop //= 2
+        return self._merge(*parts)
+
+
+class SectionalDifficulty:
+    def __init__(
+        self,
+        mods: List[str],
+        clock_rate: float,
+        first_section_end: float,
+        skills: Sequence[Optional[StrainSkill]],
+        *,
+        top_k: int = TOP_K,
+    ) -> None:
+        self.mods = mods
+        self.clock_rate = clock_rate
+        self.section_length = StrainSkill.section_length
+        # Section i covers (end_i - section_length, end_i] in rate-adjusted time.
+        self.first_section_start = first_section_end - self.section_length
+        self._aim, self._speed, self._flashlight = skills
+
+        peaks = [skill.get_current_strain_peaks() if skill is not None else [] for skill in skills]
+        self.section_count = max(len(p) for p in peaks)
+        self._aim_peaks = PeakRangeIndex(peaks[0], top_k)
+        self._speed_peaks = PeakRangeIndex(peaks[1], top_k)
+        # Flashlight sums every peak rather than weighting the top ones.
+        self._flashlight_sums = [0.0, *accumulate(peaks[2])]
+
+    def section_times(self, index: int) -> Tuple[float, float]:
+        # Map (unscaled) time span of section `index`.
+        start = self.first_section_start + index * self.section_length
+        return start * self.clock_rate, (start + self.section_length) * self.clock_rate
+
+    def _section_index(self, time: float) -> int:
+        if time == -math.inf:
+            return 0
+        if time == math.inf:
+            return self.section_count
+        offset = (time / self.clock_rate - self.first_section_start) / self.section_length
+        return min(self.section_count, max(0, math.ceil(offset)))
+
+    def rating(self, start_time: float, end_time: float) -> SectionRating:
+        # Sections whose start lies in [start_time, end_time), so adjacent ranges never share one.
+        start = self._section_index(start_time)
+        stop = max(start, self._section_index(end_time))
+
+        aim = speed = flashlight = 0.0
+        if self._aim is not None:
+            aim = calculate_difficulty_rating(self._aim.difficulty_value_from_peaks(self._aim_peaks.top(start, stop)))
+        if self._speed is not None:
+            speed = calculate_difficulty_rating(self._speed.difficulty_value_from_peaks(self._speed_peaks.top(start, stop)))
+        if self._flashlight is not None and len(self._flashlight_sums) > 1:
+            last = len(self._flashlight_sums) - 1
+            total = self._flashlight_sums[min(stop, last)] - self._flashlight_sums[min(start, last)]
+            flashlight = calculate_difficulty_rating(total)
+
+        star_rating, aim, speed, flashlight = combine_ratings(self.mods, aim, speed, flashlight)
+        return SectionRating(start_time, end_time, star_rating, aim, speed, flashlight, stop - start)
+
+    def ratings(self, ranges: Iterable[Tuple[float, float]]) -> List[SectionRating]:
+        return [self.rating(start, end) for start, end in ranges]
+
+    def sliding(self, window: float = 30000.0, step: Optional[float] = None, *, start_time: Optional[float] = None) -> List[SectionRating]:
+        if window <= 0 or (step is not None and step <= 0):
+            raise ValueError("window and step must be positive")
+        if self.section_count == 0:
+            return []
+        step = window if step is None else step
+        first, _ = self.section_times(0)
+        _, last = self.section_times(self.section_count - 1)
+
+        time = first if start_time is None else start_time
+        results = []
+        while time < last:
+            results.append(self.rating(time, time + window))
+            time += step
+        return results
+
+    def kiai(self, beatmap: Beatmap) -> List[SectionRating]:
+        _, last = self.section_times(max(0, self.section_count - 1))
+        return self.ratings(kiai_ranges(beatmap.timing_points, last))
+
+
+def kiai_ranges(timing_points: Sequence[TimingPoint], end_time: float) -> List[Tuple[float, float]]:
+    ranges: List[Tuple[float, float]] = []
+    start = None
+    for tp in sorted(timing_points, key=lambda tp: tp.time):
+        active = bool(tp.effects & EFFECT_KIAI)
+        if active and start is None:
+            start = tp.time
+        elif not active and start is not None:
+            if tp.time > start:
+                ranges.append((start, tp.time))
+            start = None
+    if start is not None and end_time > start:
+        ranges.append((start, end_time))
+    return ranges
+
+
+def calculate_sectional_difficulty(
+    beatmap: Beatmap,
+    mods: Sequence[Mods | str] | None = None,
+    *,
+    backend: str | None = None,
+    top_k: int = TOP_K,
+) -> SectionalDifficulty:
+    prepared = prepare_beatmap(beatmap, mods)
+    if not prepared.hit_objects:
+        return SectionalDifficulty(prepared.mods, prepared.clock_rate, 0.0, (None, None, None), top_k=top_k)
+
+    aim, _, speed, flashlight = run_skills(prepared, backend=backend)
+    first_section_end = math.ceil(prepared.hit_objects[0].start_time / StrainSkill.section_length) * StrainSkill.section_length
+    return SectionalDifficulty(prepared.mods, prepared.clock_rate, first_section_end, (aim, speed, flashlight), top_k=top_k)
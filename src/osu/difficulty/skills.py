@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 import math
-from typing import List, Sequence
+from typing import Iterable, List, Optional, Sequence
 
 from .base import DifficultyHitObject, OsuStrainSkill
-from .evaluators import AimEvaluator, RhythmEvaluator, SpeedEvaluator
+from .evaluators import AimEvaluator, FlashlightEvaluator, RhythmEvaluator, SpeedEvaluator
 from .strain_utils import count_top_weighted_sliders
 
 
@@ -12,9 +12,11 @@ class Aim(OsuStrainSkill):
     skill_multiplier: float = 25.6
     strain_decay_base: float = 0.15
 
-    def __init__(self, mods: Sequence[str], include_sliders: bool) -> None:
+    def __init__(self, mods: Sequence[str], include_sliders: bool, evaluations: Optional[Sequence[float]] = None) -> None:
         super().__init__(list(mods))
         self.include_sliders = include_sliders
+        # Precomputed AimEvaluator results per object index (see kernels.py).
+        self.evaluations = evaluations
         self._current_strain = 0.0
         self._slider_strains: List[float] = []
 
@@ -34,10 +36,13 @@ class Aim(OsuStrainSkill):
 
         delta_time = current.delta_time
         self._current_strain *= self._strain_decay(delta_time)
-        difficulty = AimEvaluator.evaluate(current, self.include_sliders)
+        if self.evaluations is not None:
+            difficulty = self.evaluations[current.index]
+        else:
+            difficulty = AimEvaluator.evaluate(current, self.include_sliders)
         self._current_strain += difficulty * self.skill_multiplier
 
-        if current.base_object.object_type == "Slider":
+        if current.base_object.object_type == "Slider" and self.record_object_strains:
             self._slider_strains.append(self._current_strain)
 
         return self._current_strain
@@ -64,11 +69,21 @@ class Speed(OsuStrainSkill):
     strain_decay_base: float = 0.3
     reduced_section_count: int = 5
 
-    def __init__(self, mods: Sequence[str]) -> None:
+    def __init__(
+        self,
+        mods: Sequence[str],
+        evaluations: Optional[Sequence[float]] = None,
+        rhythm_evaluations: Optional[Sequence[float]] = None,
+    ) -> None:
         super().__init__(list(mods))
         self._current_strain = 0.0
         self._current_rhythm = 0.0
         self._mods = list(mods)
+        self.evaluations = evaluations
+        self.rhythm_evaluations = rhythm_evaluations
+        self.rhythm_history = RhythmEvaluator.HISTORY_OBJECTS_MAX
+        # None stops recording the per-object rhythm multipliers.
+        self.object_rhythms: Optional[List[float]] = []
 
     def _strain_decay(self, ms: float) -> float:
         return math.pow(self.strain_decay_base, ms / 1000.0)
@@ -82,15 +97,25 @@ class Speed(OsuStrainSkill):
     def strain_value_at(self, current: DifficultyHitObject) -> float:
         prev = current.previous(0)
         if prev is None:
+            if self.record_object_strains and self.object_rhythms is not None:
+                self.object_rhythms.append(self._current_rhythm)
             return 0.0
 
         strain_time = getattr(current, "strain_time", current.delta_time)
         self._current_strain *= self._strain_decay(strain_time)
-        difficulty = SpeedEvaluator.evaluate(current, self._mods)
+        if self.evaluations is not None:
+            difficulty = self.evaluations[current.index]
+        else:
+            difficulty = SpeedEvaluator.evaluate(current, self._mods)
         self._current_strain += difficulty * self.skill_multiplier
 
-        self._current_rhythm = RhythmEvaluator.evaluate(current)
+        if self.rhythm_evaluations is not None:
+            self._current_rhythm = self.rhythm_evaluations[current.index]
+        else:
+            self._current_rhythm = RhythmEvaluator.evaluate(current, self.rhythm_history)
         total_strain = self._current_strain * self._current_rhythm
+        if self.record_object_strains and self.object_rhythms is not None:
+            self.object_rhythms.append(self._current_rhythm)
 
         return total_strain
 
@@ -110,10 +135,11 @@ class Flashlight(OsuStrainSkill):
     skill_multiplier: float = 0.05512
     strain_decay_base: float = 0.15
 
-    def __init__(self, mods: Sequence[str]) -> None:
+    def __init__(self, mods: Sequence[str], evaluations: Optional[Sequence[float]] = None) -> None:
         super().__init__(list(mods))
         self._current_strain = 0.0
         self._has_hidden = any(mod.lower() == "hidden" for mod in mods)
+        self.evaluations = evaluations
 
     def _strain_decay(self, ms: float) -> float:
         return math.pow(self.strain_decay_base, ms / 1000.0)
@@ -125,14 +151,19 @@ class Flashlight(OsuStrainSkill):
         return self._current_strain * self._strain_decay(time - prev.start_time)
 
     def strain_value_at(self, current: DifficultyHitObject) -> float:
-        prev = current.previous(0)
-        if prev is None:
-            return 0.0
         self._current_strain *= self._strain_decay(current.delta_time)
+        if self.evaluations is not None:
+            difficulty = self.evaluations[current.index]
+        else:
+            difficulty = FlashlightEvaluator.evaluate(current, self._has_hidden)
+        self._current_strain += difficulty * self.skill_multiplier
         return self._current_strain
 
     def difficulty_value(self) -> float:
-        return sum(self.get_current_strain_peaks())
+        return self.difficulty_value_from_peaks(self.get_current_strain_peaks())
+
+    def difficulty_value_from_peaks(self, strain_peaks: Iterable[float]) -> float:
+        return sum(strain_peaks)
 
     @staticmethod
     def difficulty_to_performance(difficulty: float) -> float:
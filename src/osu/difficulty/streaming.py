@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..hit_object import Circle, Slider, Spinner
+from ..mods import Mods
+from ..stream import BeatmapStream
+from .attributes import DifficultyAttributes
+from .base import DifficultyObject
+from .calculator import (
+    _aggregate,
+    _distance,
+    _get_end_time,
+    _get_slider_end_position,
+    approach_times,
+    difficulty_object,
+    empty_attributes,
+    mod_settings,
+)
+from .evaluators import FlashlightEvaluator, RhythmEvaluator
+from .preprocessing import OsuDifficultyHitObject
+from .skills import Aim, Flashlight, Speed
+
+# Streaming difficulty: hit objects flow from a BeatmapStream through stacking, difficulty
+# object creation and every skill at once, and only a rolling window of difficulty objects
+# stays alive. The results equal calculate_difficulty(..., backend="python") except that
+# `strains` is left empty.
+#
+# Memory does not depend on the object count apart from one 8-byte double per object and skill
+# (the count attributes need every object strain once the final difficulty is known) and one
+# per 400 ms section peak. The numba kernels need whole-map arrays, so this path always uses
+# the Python evaluators.
+
+# previous() reaches back RhythmEvaluator.HISTORY_OBJECTS_MAX objects from the object being
+# processed, and SpeedEvaluator reads next(0), so processing trails the newest object by one.
+WINDOW = max(RhythmEvaluator.HISTORY_OBJECTS_MAX, FlashlightEvaluator.HISTORY_OBJECTS_MAX) + 2
+
+
+class RollingObjects:
+    # The `objects` list of streamed difficulty objects: indexed by the global object index
+    # like the full list, but only the last `size` objects are kept.
+    def __init__(self, size: int = WINDOW) -> None:
+        self._items: deque = deque(maxlen=size)
+        self._count = 0
+
+    def append(self, item: OsuDifficultyHitObject) -> None:
+        self._items.append(item)
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> OsuDifficultyHitObject:
+        offset = index - (self._count - len(self._items))
+        if offset < 0 or index >= self._count:
+            raise IndexError(f"difficulty object {index} is outside the rolling window")
+        return self._items[offset]
+
+
+class _StackState:
+    __slots__ = ("hit_object", "height", "end_time", "position", "tail_position", "open")
+
+    def __init__(self, hit_object: Circle | Slider | Spinner) -> None:
+        self.hit_object = hit_object
+        self.height = 0
+        self.open = not isinstance(hit_object, Spinner)
+        start = float(hit_object.time)
+        end = _get_end_time(hit_object)
+        self.end_time = end if end >= start else start
+        self.position = (float(hit_object.x), float(hit_object.y))
+        self.tail_position = _get_slider_end_position(hit_object) if isinstance(hit_object, Slider) else None
+
+
+def iter_stacked(
+    hit_objects: Iterable[Circle | Slider | Spinner],
+    radius: float,
+    approach_rate: float,
+    stack_leniency: float,
+) -> Iterator[Tuple[Circle | Slider | Spinner, float]]:
+    # Incremental _compute_stack_offsets for time-ordered objects: yields (object, stack offset)
+    # as soon as no later object can stack onto it, i.e. once an object starts more than the
+    # stack threshold after its (extended) end time.
+    scale = radius / 64.0 if radius > 0 else 1.0
+    stack_distance = 3.0
+    stack_threshold = max(approach_times(approach_rate)[0] * stack_leniency, 0.0)
+    offset_per_stack = -6.4 * scale
+
+    pending: deque = deque()
+    for other in hit_objects:
+        if not isinstance(other, Spinner):
+            other_start = float(other.time)
+            other_pos = (float(other.x), float(other.y))
+            for state in pending:
+                if not state.open:
+                    continue
+                if other_start - stack_threshold > state.end_time:
+                    state.open = False
+                elif _distance(state.position, other_pos) < stack_distance or (
+                    state.tail_position is not None and _distance(state.tail_position, other_pos) < stack_distance
+                ):
+                    state.height += 1
+                    state.end_time = other_start
+        while pending and not pending[0].open:
+            state = pending.popleft()
+            yield state.hit_object, state.height * offset_per_stack
+        pending.append(_StackState(other))
+
+    for state in pending:
+        yield state.hit_object, state.height * offset_per_stack
+
+
+def calculate_difficulty_streaming(
+    source: str | BeatmapStream,
+    mods: Sequence[Mods | str] | None = None,
+) -> DifficultyAttributes:
+    stream = source if isinstance(source, BeatmapStream) else BeatmapStream(source)
+    settings = mod_settings(stream.difficulty, mods)
+    mods_list = settings.mods
+    stack_leniency = getattr(stream.general, "stack_leniency", 0.7)
+    time_preempt, time_fade_in = approach_times(settings.approach_rate)
+
+    aim_skill = Aim(mods_list, include_sliders=True)
+    aim_no_sliders_skill = Aim(mods_list, include_sliders=False)
+    speed_skill = Speed(mods_list)
+    flashlight_skill = Flashlight(mods_list) if any(mod.lower() == "flashlight" for mod in mods_list) else None
+    skills: List = [aim_skill, aim_no_sliders_skill, speed_skill]
+    if flashlight_skill is not None:
+        skills.append(flashlight_skill)
+    for skill in skills:
+        # Doubles instead of float objects for everything that grows with the map.
+        skill.object_strains = array("d")
+        skill._strain_peaks = array("d")
+    for skill in (aim_skill, aim_no_sliders_skill):
+        skill._slider_strains = array("d")
+    speed_skill.object_rhythms = None
+
+    circles = sliders = spinners = 0
+    window = RollingObjects()
+    last: Optional[DifficultyObject] = None
+    pending: Optional[OsuDifficultyHitObject] = None
+    for hit_object, stack_offset in iter_stacked(
+        stream.iter_hit_objects(), settings.radius, settings.approach_rate, stack_leniency
+    ):
+        circles += isinstance(hit_object, Circle)
+        sliders += isinstance(hit_object, Slider)
+        spinners += isinstance(hit_object, Spinner)
+        current = difficulty_object(
+            hit_object, stack_offset, settings.radius, settings.hit_window_great, time_preempt, time_fade_in
+        )
+        if last is not None:
+            diff_obj = OsuDifficultyHitObject(
+                base_object=current,
+                last_object=last,
+                clock_rate=settings.clock_rate,
+                objects=window,
+                index=len(window),
+            )
+            window.append(diff_obj)
+            if pending is not None:
+                for skill in skills:
+                    skill.process(pending)
+            pending = diff_obj
+        last = current
+    if pending is not None:
+        for skill in skills:
+            skill.process(pending)
+
+    attribute_settings = dict(
+        approach_rate=settings.rate_adjusted_approach_rate,
+        overall_difficulty=settings.rate_adjusted_overall_difficulty,
+        drain_rate=settings.drain_rate,
+        circle_size=settings.circle_size,
+        clock_rate=settings.clock_rate,
+    )
+    if pending is None:
+        return empty_attributes(mods_list, (circles, sliders, spinners), **attribute_settings)
+    return _aggregate(
+        (circles, sliders, spinners),
+        mods_list,
+        aim_skill,
+        aim_no_sliders_skill,
+        speed_skill,
+        flashlight_skill,
+        keep_strains=False,
+        **attribute_settings,
+    )
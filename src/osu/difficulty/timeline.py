@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+from .base import StrainSkill
+
+# Strain timelines: per-object strains and per-section peaks of every skill as float32 arrays,
+# with the object start times and section end times they belong to. Times are in playback
+# time (map time divided by the clock rate), like the difficulty objects themselves.
+#
+# Skill names: "aim", "aim_no_sliders", "speed", "flashlight" (only with Flashlight) and
+# "rhythm", the speed skill's rhythm multiplier per object, which has no section peaks.
+
+
+@dataclass
+class StrainTimeline:
+    times: np.ndarray
+    strains: Dict[str, np.ndarray] = field(default_factory=dict)
+    section_times: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    peaks: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def downsample(self, points: int) -> "StrainTimeline":
+        # Max-pools objects and sections onto `points` equal bins spanning the map, so every
+        # map gets the same shape; both time arrays become the bin start times. Empty bins are 0.
+        if points <= 0:
+            raise ValueError("points must be positive")
+        times = np.concatenate([self.times, self.section_times])
+        start, end = (float(times.min()), float(times.max())) if len(times) else (0.0, 0.0)
+        width = (end - start) / points if end > start else 1.0
+        grid = (start + width * np.arange(points)).astype(np.float32)
+
+        def pool(values: np.ndarray, at: np.ndarray) -> np.ndarray:
+            bins = np.clip(((at - start) / width).astype(np.int64), 0, points - 1)
+            pooled = np.zeros(points, dtype=np.float32)
+            np.maximum.at(pooled, bins, values)
+            return pooled
+
+        return StrainTimeline(
+            times=grid,
+            strains={name: pool(values, self.times) for name, values in self.strains.items()},
+            section_times=grid,
+            peaks={name: pool(values, self.section_times) for name, values in self.peaks.items()},
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        # Flat name -> array mapping for np.savez; from_arrays reverses it.
+        arrays = {"times": self.times, "section_times": self.section_times}
+        arrays.update({f"strains.{name}": values for name, values in self.strains.items()})
+        arrays.update({f"peaks.{name}": values for name, values in self.peaks.items()})
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "StrainTimeline":
+        names = list(arrays.keys())
+        return cls(
+            times=np.asarray(arrays["times"]),
+            strains={name[len("strains."):]: np.asarray(arrays[name]) for name in names if name.startswith("strains.")},
+            section_times=np.asarray(arrays["section_times"]),
+            peaks={name[len("peaks."):]: np.asarray(arrays[name]) for name in names if name.startswith("peaks.")},
+        )
+
+
+def build_strain_timeline(hit_objects, skills, speed_rhythms: Optional[np.ndarray] = None) -> StrainTimeline:
+    # hit_objects: the prepared difficulty objects; skills: name -> skill that processed them
+    # (None entries are skipped). Section k of a skill ends at first_end + k * section_length.
+    times = np.fromiter((obj.start_time for obj in hit_objects), dtype=np.float32, count=len(hit_objects))
+    first_end = math.ceil(hit_objects[0].start_time / StrainSkill.section_length) * StrainSkill.section_length if hit_objects else 0.0
+    strains: Dict[str, np.ndarray] = {}
+    peaks: Dict[str, np.ndarray] = {}
+    section_count = 0
+    for name, skill in skills.items():
+        if skill is None:
+            continue
+        strains[name] = np.asarray(skill.object_strains, dtype=np.float32)
+        peaks[name] = np.asarray(skill.get_current_strain_peaks(), dtype=np.float32)
+        section_count = max(section_count, len(peaks[name]))
+    if speed_rhythms is not None:
+        strains["rhythm"] = np.asarray(speed_rhythms, dtype=np.float32)
+    section_times = (first_end + StrainSkill.section_length * np.arange(section_count)).astype(np.float32)
+    return StrainTimeline(times=times, strains=strains, section_times=section_times, peaks=peaks)
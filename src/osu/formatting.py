@@ -0,0 +1,21 @@
+def format_float(value: float) -> str:
+  formatted = format(value, ".15g")
+  if formatted.endswith(".0"):
+    formatted = formatted[:-2]
+  if formatted == "-0":
+    return "0"
+  return formatted
+
+
+def format_number(value) -> str:
+  # Integral values are written without a trailing ".0"; everything else uses the shortest
+  # representation that parses back to the same float, so re-serialising never loses precision.
+  if type(value) is int:
+    return str(value)
+  value = float(value)
+  if value.is_integer() and abs(value) < 1e15:
+    return str(int(value))
+  formatted = repr(value)
+  if "e" in formatted or "n" in formatted:
+    return format_float(value)
+  return formatted
@@ -0,0 +1,322 @@
+from __future__ import annotations
+import hashlib
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, asdict, fields
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .sections.general import General
+from .sections.difficulty import Difficulty
+from .sections.metadata import Metadata
+from .timing_point import TimingPoint
+
+HEADER_SECTIONS = ("General", "Difficulty", "Metadata", "TimingPoints")
+
+
+@dataclass
+class BeatmapHeader:
+  path: str
+  content_hash: str
+  mtime: float
+  size: int
+  class_name: Optional[str]
+  set_id: Optional[int]
+  beatmap_id: int
+  title: str
+  artist: str
+  creator: str
+  version: str
+  audio_filename: str
+  mode: int
+  hp: float
+  cs: float
+  od: float
+  ar: float
+  slider_multiplier: float
+  bpm_min: float
+  bpm_max: float
+  bpm_main: float
+  timing_point_count: int
+  first_object_time: float
+  last_object_time: float
+  length_ms: float
+  circle_count: int
+  slider_count: int
+  spinner_count: int
+  object_count: int
+
+
+def split_header(text: str) -> Tuple[Dict[str, str], str]:
+  # Returns the raw header sections we care about and the untouched [HitObjects] body.
+  marker = text.find("[HitObjects]")
+  head, hit_objects = (text, "") if marker < 0 else (text[:marker], text[marker + len("[HitObjects]"):])
+
+  sections: Dict[str, List[str]] = {}
+  current = None
+  for line in head.splitlines():
+    line = line.strip()
+    if line.startswith("[") and line.endswith("]"):
+      current = line[1:-1].strip()
+      continue
+    if current in HEADER_SECTIONS and line and not line.startswith("//"):
+      sections.setdefault(current, []).append(line)
+  return {name: "\n".join(lines) for name, lines in sections.items()}, hit_objects
+
+
+def bpm_stats(timing_points: List[TimingPoint], end_time: float) -> Tuple[float, float, float]:
+  red_lines = [tp for tp in timing_points if tp.uninherited == 1 and tp.beat_length > 0]
+  if not red_lines:
+    return 0.0, 0.0, 0.0
+
+  bpms = [tp.get_bpm() for tp in red_lines]
+  # The "main" BPM is the one that is active for the longest time, like osu! reports it.
+  durations: Dict[float, float] = {}
+  for idx, tp in enumerate(red_lines):
+    start = tp.time if idx > 0 else min(tp.time, 0.0)
+    end = red_lines[idx + 1].time if idx + 1 < len(red_lines) else max(end_time, tp.time)
+    bpm = round(bpms[idx], 3)
+    durations[bpm] = durations.get(bpm, 0.0) + max(0.0, end - start)
+  bpm_main = max(durations.items(), key=lambda kv: (kv[1], kv[0]))[0]
+  return min(bpms), max(bpms), bpm_main
+
+
+def count_hit_objects(raw: str) -> Tuple[int, int, int, float, float]:
+  circles = sliders = spinners = 0
+  first_time = last_time = 0.0
+  for line in raw.splitlines():
+    parts = line.split(",", 4)
+    if len(parts) < 5:
+      continue
+    try:
+      type_id = int(parts[3])
+      time = float(parts[2])
+    except ValueError:
+      continue
+    if circles + sliders + spinners == 0:
+      first_time = time
+    last_time = time
+    if type_id & 1:
+      circles += 1
+    elif type_id & 2:
+      sliders += 1
+    elif type_id & 8:
+      spinners += 1
+      # Spinners encode their end time right after the hit sound.
+      try:
+        last_time = max(last_time, float(parts[4].split(",", 2)[1]))
+      except (IndexError, ValueError):
+        pass
+  return circles, sliders, spinners, first_time, last_time
+
+
+def class_name_for(path: str) -> Optional[str]:
+  parts = os.path.normpath(path).split(os.sep)
+  if "classes" in parts:
+    idx = len(parts) - 1 - parts[::-1].index("classes")
+    if idx + 1 < len(parts) - 1:
+      return parts[idx + 1]
+  return None
+
+
+def set_id_for(path: str, metadata: Metadata) -> Optional[int]:
+  if metadata.beatmap_set_id > 0:
+    return metadata.beatmap_set_id
+  match = re.match(r"^(\d+)\s", os.path.basename(os.path.dirname(path)))
+  return int(match.group(1)) if match else None
+
+
+def scan_header(file_path: str, *, data: Optional[bytes] = None, count_objects: bool = True) -> BeatmapHeader:
+  stat = os.stat(file_path)
+  if data is None:
+    with open(file_path, "rb") as f:
+      data = f.read()
+
+  text = data.decode("utf-8-sig", errors="replace")
+  sections, hit_objects_raw = split_header(text)
+  general = General(raw=sections.get("General", ""))
+  difficulty = Difficulty(raw=sections.get("Difficulty", ""))
+  metadata = Metadata(raw=sections.get("Metadata", ""))
+  timing_points = [TimingPoint(raw=line) for line in sections.get("TimingPoints", "").splitlines() if "," in line]
+
+  circles = sliders = spinners = 0
+  first_time = last_time = 0.0
+  if count_objects:
+    circles, sliders, spinners, first_time, last_time = count_hit_objects(hit_objects_raw)
+  bpm_min, bpm_max, bpm_main = bpm_stats(timing_points, last_time)
+
+  return BeatmapHeader(
+    path=os.path.abspath(file_path),
+    content_hash=hashlib.sha1(data).hexdigest(),
+    mtime=stat.st_mtime,
+    size=stat.st_size,
+    class_name=class_name_for(file_path),
+    set_id=set_id_for(file_path, metadata),
+    beatmap_id=metadata.beatmap_id,
+    title=metadata.title,
+    artist=metadata.artist,
+    creator=metadata.creator,
+    version=metadata.version,
+    audio_filename=general.audio_filename,
+    mode=general.mode,
+    hp=difficulty.hp_drain_rate,
+    cs=difficulty.circle_size,
+    od=difficulty.overall_difficulty,
+    ar=difficulty.approach_rate,
+    slider_multiplier=difficulty.slider_multiplier,
+    bpm_min=bpm_min,
+    bpm_max=bpm_max,
+    bpm_main=bpm_main,
+    timing_point_count=len(timing_points),
+    first_object_time=first_time,
+    last_object_time=last_time,
+    length_ms=last_time - first_time,
+    circle_count=circles,
+    slider_count=sliders,
+    spinner_count=spinners,
+    object_count=circles + sliders + spinners,
+  )
+
+
+def iter_beatmap_files(root: str) -> Iterator[str]:
+  if os.path.isfile(root):
+    yield root
+    return
+  for dirpath, dirnames, filenames in os.walk(root):
+    dirnames.sort()
+    for filename in sorted(filenames):
+      if filename.endswith(".osu"):
+        yield os.path.join(dirpath, filename)
+
+
+_COLUMNS = [f.name for f in fields(BeatmapHeader)]
+_SQL_TYPES = {"str": "TEXT", "float": "REAL", "int": "INTEGER"}
+
+Filter = Union[object, Tuple[Optional[float], Optional[float]]]
+
+
+class BeatmapIndex:
+  def __init__(self, db_path: str):
+    self.db_path = db_path
+    self.connection = sqlite3.connect(db_path)
+    self.connection.row_factory = sqlite3.Row
+    self._create_schema()
+
+  def _create_schema(self):
+    columns = []
+    for f in fields(BeatmapHeader):
+      base_type = str(f.type).replace("Optional[", "").rstrip("]")
+      sql_type = _SQL_TYPES.get(base_type, "TEXT")
+      columns.append(f"{f.name} {sql_type}{' PRIMARY KEY' if f.name == 'path' else ''}")
+    with self.connection:
+      self.connection.execute(f"CREATE TABLE IF NOT EXISTS beatmaps ({', '.join(columns)})")
+      for column in ("content_hash", "class_name", "set_id", "ar", "od", "cs", "bpm_main"):
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS idx_beatmaps_{column} ON beatmaps ({column})")
+
+  def close(self):
+    self.connection.close()
+
+  def __enter__(self) -> "BeatmapIndex":
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def __len__(self) -> int:
+    return self.connection.execute("SELECT COUNT(*) FROM beatmaps").fetchone()[0]
+
+  def update(self, root: str, *, prune: bool = True) -> Dict[str, int]:
+    known = {
+      row["path"]: (row["mtime"], row["size"], row["content_hash"])
+      for row in self.connection.execute("SELECT path, mtime, size, content_hash FROM beatmaps")
+    }
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    seen = set()
+
+    with self.connection:
+      for file_path in iter_beatmap_files(root):
+        path = os.path.abspath(file_path)
+        seen.add(path)
+        stat = os.stat(path)
+        previous = known.get(path)
+        if previous and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+          stats["unchanged"] += 1
+          continue
+
+        with open(path, "rb") as f:
+          data = f.read()
+        if previous and previous[2] == hashlib.sha1(data).hexdigest():
+          # Touched but not modified: only refresh the stat fields.
+          self.connection.execute(
+            "UPDATE beatmaps SET mtime = ?, size = ? WHERE path = ?", (stat.st_mtime, stat.st_size, path)
+          )
+          stats["unchanged"] += 1
+          continue
+
+        try:
+          header = scan_header(path, data=data)
+        except (ValueError, IndexError):
+          if previous:
+            self.connection.execute("DELETE FROM beatmaps WHERE path = ?", (path,))
+          stats["failed"] += 1
+          continue
+        self._upsert(header)
+        stats["updated" if previous else "added"] += 1
+
+      if prune:
+        prefix = os.path.abspath(root)
+        for path in known:
+          if path not in seen and (path == prefix or path.startswith(prefix + os.sep)):
+            self.connection.execute("DELETE FROM beatmaps WHERE path = ?", (path,))
+            stats["removed"] += 1
+
+    return stats
+
+  def _upsert(self, header: BeatmapHeader):
+    values = asdict(header)
+    placeholders = ", ".join("?" for _ in _COLUMNS)
+    self.connection.execute(
+      f"INSERT OR REPLACE INTO beatmaps ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+      [values[column] for column in _COLUMNS],
+    )
+
+  def _where(self, filters: Dict[str, Filter]) -> Tuple[str, List[object]]:
+    clauses: List[str] = []
+    params: List[object] = []
+    for column, value in filters.items():
+      if column == "bpm":
+        column = "bpm_main"
+      if column not in _COLUMNS:
+        raise ValueError(f"Unknown index column: {column}")
+      if isinstance(value, tuple):
+        low, high = value
+        if low is not None:
+          clauses.append(f"{column} >= ?")
+          params.append(low)
+        if high is not None:
+          clauses.append(f"{column} <= ?")
+          params.append(high)
+      elif isinstance(value, (list, set, frozenset)):
+        clauses.append(f"{column} IN ({', '.join('?' for _ in value)})")
+        params.extend(value)
+      elif value is None:
+        clauses.append(f"{column} IS NULL")
+      else:
+        clauses.append(f"{column} = ?")
+        params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+  def query(self, **filters: Filter) -> List[str]:
+    where, params = self._where(filters)
+    return [row[0] for row in self.connection.execute(f"SELECT path FROM beatmaps{where} ORDER BY path", params)]
+
+  def headers(self, **filters: Filter) -> List[BeatmapHeader]:
+    where, params = self._where(filters)
+    rows = self.connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM beatmaps{where} ORDER BY path", params)
+    return [BeatmapHeader(**dict(row)) for row in rows]
+
+  def get(self, path: str) -> Optional[BeatmapHeader]:
+    row = self.connection.execute(
+      f"SELECT {', '.join(_COLUMNS)} FROM beatmaps WHERE path = ?", (os.path.abspath(path),)
+    ).fetchone()
+    return BeatmapHeader(**dict(row)) if row else None
@@ -0,0 +1,385 @@
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from .columns import SLIDER, SPINNER, HitObjectColumns
+from .index import iter_beatmap_files, split_header
+from .snapping import RedLines
+from .timing_point import TimingPoint
+
+# Inverted index of hit object patterns.
+#
+# Every object becomes a 12-bit symbol describing how it is reached from the previous one:
+#   snap      time since the previous object in beats, rounded to the nearest of SNAPS
+#   distance  distance from the previous object (start positions, unstacked), see DISTANCES
+#   angle     turn between the last two movements, see ANGLES
+#   kind      c(ircle), s(lider) or p (spinner)
+# The first object of a map has no snap, distance or angle ("-"). Every n-gram of symbols is
+# packed into one integer key (maps are padded at the end so every object starts one); postings
+# map a key to the maps and object positions where it occurs. A pattern query intersects the
+# postings of its n-gram windows, aligned to the pattern start, and because the windows cover
+# the whole pattern every hit is an exact match.
+#
+# Patterns are written as whitespace-separated elements `snap:distance:angle:kind`, each field
+# a value, several values joined by "|", or "*"; missing trailing fields mean "*". For example
+# "* 1/4 1/4 *:jump|far 1/2:*:*:s" is a 1/4 triplet, a jump, then a slider 1/2 later.
+
+SNAPS = ("1/16", "1/12", "1/8", "1/6", "1/4", "1/3", "1/2", "2/3", "3/4", "1", "3/2", "2", "long")
+_SNAP_BEATS = np.array([1 / 16, 1 / 12, 1 / 8, 1 / 6, 1 / 4, 1 / 3, 1 / 2, 2 / 3, 3 / 4, 1, 3 / 2, 2, 4])
+DISTANCES = (("stack", 20.0), ("near", 60.0), ("mid", 120.0), ("jump", 220.0), ("far", np.inf))
+ANGLES = (("straight", 45.0), ("turn", 100.0), ("sharp", 150.0), ("back", 180.0))
+KINDS = ("c", "s", "p")
+NONE = "-"
+_NONE_SNAP = 15
+_NONE_FIELD = 7
+_PAD = (14 << 8) | 3
+_SYMBOL_BITS = 12
+DEFAULT_N = 3
+_BATCH = 900
+
+
+@dataclass(frozen=True)
+class Symbol:
+  snap: str
+  distance: str
+  angle: str
+  kind: str
+
+  @classmethod
+  def decode(cls, code: int) -> "Symbol":
+    snap, distance, angle, kind = (code >> 8) & 0xF, (code >> 5) & 0x7, (code >> 2) & 0x7, code & 0x3
+    return cls(
+      NONE if snap == _NONE_SNAP else SNAPS[snap],
+      NONE if distance == _NONE_FIELD else DISTANCES[distance][0],
+      NONE if angle == _NONE_FIELD else ANGLES[angle][0],
+      KINDS[kind],
+    )
+
+  def __str__(self) -> str:
+    return f"{self.snap}:{self.distance}:{self.angle}:{self.kind}"
+
+
+def tokenize(columns: HitObjectColumns, red_lines: RedLines) -> np.ndarray:
+  # One uint16 symbol per object.
+  count = len(columns)
+  if not count:
+    return np.zeros(0, dtype=np.uint16)
+  time = np.asarray(columns.time, dtype=np.float64)
+  xy = np.stack([np.asarray(columns.x, dtype=np.float64), np.asarray(columns.y, dtype=np.float64)], axis=1)
+  types = np.asarray(columns.type, dtype=np.int64)
+  kind = np.where(types & SLIDER, 1, np.where(types & SPINNER, 2, 0))
+
+  snap = np.full(count, _NONE_SNAP, dtype=np.int64)
+  distance = np.full(count, _NONE_FIELD, dtype=np.int64)
+  angle = np.full(count, _NONE_FIELD, dtype=np.int64)
+  if count > 1:
+    beats = np.diff(time) / red_lines.beat_length[red_lines.active(time[1:])]
+    ratio = np.log(np.maximum(beats, 1e-3)[:, None] / _SNAP_BEATS[None, :])
+    snap[1:] = np.abs(ratio).argmin(axis=1)
+    move = np.diff(xy, axis=0)
+    length = np.hypot(move[:, 0], move[:, 1])
+    distance[1:] = np.searchsorted([limit for _, limit in DISTANCES], length, side="right").clip(max=len(DISTANCES) - 1)
+    if count > 2:
+      a, b = move[:-1], move[1:]
+      norms = length[:-1] * length[1:]
+      cos = np.where(norms > 0, (a * b).sum(axis=1) / np.where(norms > 0, norms, 1.0), 1.0)
+      degrees = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+      buckets = np.searchsorted([limit for _, limit in ANGLES], degrees, side="left").clip(max=len(ANGLES) - 1)
+      # Undefined for objects reached without movement or after a stack.
+      angle[2:] = np.where(norms > 0, buckets, _NONE_FIELD)
+  return ((snap << 8) | (distance << 5) | (angle << 2) | kind).astype(np.uint16)
+
+
+def ngram_keys(symbols: np.ndarray, n: int = DEFAULT_N, *, pad: bool = False) -> np.ndarray:
+  if pad and len(symbols):
+    symbols = np.concatenate([symbols, np.full(n - 1, _PAD, dtype=symbols.dtype)])
+  if len(symbols) < n:
+    return np.zeros(0, dtype=np.int64)
+  windows = np.lib.stride_tricks.sliding_window_view(symbols.astype(np.int64), n)
+  shifts = np.arange(n - 1, -1, -1, dtype=np.int64) * _SYMBOL_BITS
+  return (windows << shifts).sum(axis=1)
+
+
+def _field_values(field: str, names: Sequence[str], none_code: int) -> Optional[np.ndarray]:
+  # Allowed codes for one pattern field, or None for "*".
+  if field in ("", "*"):
+    return None
+  codes = []
+  for value in field.split("|"):
+    if value == NONE:
+      codes.append(none_code)
+    elif value in names:
+      codes.append(names.index(value))
+    else:
+      raise ValueError(f"unknown pattern value {value!r} (expected one of {', '.join(names)}, {NONE} or *)")
+  return np.asarray(codes, dtype=np.int64)
+
+
+@dataclass
+class PatternElement:
+  snap: Optional[np.ndarray] = None
+  distance: Optional[np.ndarray] = None
+  angle: Optional[np.ndarray] = None
+  kind: Optional[np.ndarray] = None
+
+  @classmethod
+  def parse(cls, text: str) -> "PatternElement":
+    fields = (text.split(":") + ["*"] * 4)[:4]
+    if len(text.split(":")) > 4:
+      raise ValueError(f"pattern element {text!r} has more than four fields")
+    return cls(
+      _field_values(fields[0], SNAPS, _NONE_SNAP),
+      _field_values(fields[1], [name for name, _ in DISTANCES], _NONE_FIELD),
+      _field_values(fields[2], [name for name, _ in ANGLES], _NONE_FIELD),
+      _field_values(fields[3], KINDS, -1),
+    )
+
+  def matches(self, symbols: np.ndarray) -> np.ndarray:
+    symbols = symbols.astype(np.int64)
+    mask = (symbols & 0x3) != (_PAD & 0x3)
+    for allowed, shift, bits in ((self.snap, 8, 0xF), (self.distance, 5, 0x7), (self.angle, 2, 0x7), (self.kind, 0, 0x3)):
+      if allowed is not None:
+        mask &= np.isin((symbols >> shift) & bits, allowed)
+    return mask
+
+
+def parse_pattern(pattern: Union[str, Sequence[str]]) -> List[PatternElement]:
+  elements = pattern.split() if isinstance(pattern, str) else list(pattern)
+  if not elements:
+    raise ValueError("empty pattern")
+  return [PatternElement.parse(element) for element in elements]
+
+
+@dataclass
+class PatternMatch:
+  path: str
+  index: int       # object index of the first pattern element
+  time: float      # its start time in ms
+  score: float = 1.0
+
+
+def _read_map(path: str, data: bytes) -> Tuple[HitObjectColumns, RedLines]:
+  sections, hit_objects = split_header(data.decode("utf-8-sig", errors="replace"))
+  timing_points = [TimingPoint(raw=line) for line in sections.get("TimingPoints", "").splitlines() if "," in line]
+  return HitObjectColumns.from_raw(hit_objects), RedLines.from_timing_points(timing_points)
+
+
+class PatternIndex:
+  def __init__(self, db_path: str, *, n: int = DEFAULT_N):
+    self.db_path = db_path
+    self.connection = sqlite3.connect(db_path)
+    self.connection.row_factory = sqlite3.Row
+    self._create_schema(n)
+    self._vocabulary: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+  def _create_schema(self, n: int):
+    with self.connection:
+      self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+      self.connection.execute("INSERT OR IGNORE INTO meta VALUES ('n', ?)", (str(n),))
+      self.connection.execute(
+        "CREATE TABLE IF NOT EXISTS maps (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL, size INTEGER, "
+        "content_hash TEXT, symbols BLOB, times BLOB)"
+      )
+      # Per (n-gram, map): the object positions where it starts, as a uint32 array.
+      self.connection.execute(
+        "CREATE TABLE IF NOT EXISTS postings (key INTEGER, map_id INTEGER, positions BLOB, PRIMARY KEY (key, map_id)) WITHOUT ROWID"
+      )
+      self.connection.execute("CREATE INDEX IF NOT EXISTS idx_postings_map ON postings (map_id)")
+      self.connection.execute("CREATE TABLE IF NOT EXISTS grams (key INTEGER PRIMARY KEY, maps INTEGER)")
+    self.n = int(self.connection.execute("SELECT value FROM meta WHERE name = 'n'").fetchone()[0])
+
+  def close(self):
+    self.connection.close()
+
+  def __enter__(self) -> "PatternIndex":
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def __len__(self) -> int:
+    return self.connection.execute("SELECT COUNT(*) FROM maps").fetchone()[0]
+
+  def update(self, root: str, *, prune: bool = True) -> Dict[str, int]:
+    # Incremental like BeatmapIndex.update: unchanged files are skipped by (mtime, size) and
+    # then by content hash; changed and removed maps have their postings replaced. Maps that
+    # fail to parse (e.g. no red line) are counted and left out, like DescriptorStore.update.
+    known = {
+      row["path"]: (row["id"], row["mtime"], row["size"], row["content_hash"])
+      for row in self.connection.execute("SELECT id, path, mtime, size, content_hash FROM maps")
+    }
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    seen = set()
+
+    with self.connection:
+      for file_path in iter_beatmap_files(root):
+        path = os.path.abspath(file_path)
+        seen.add(path)
+        stat = os.stat(path)
+        previous = known.get(path)
+        if previous and previous[1] == stat.st_mtime and previous[2] == stat.st_size:
+          stats["unchanged"] += 1
+          continue
+        with open(path, "rb") as f:
+          data = f.read()
+        content_hash = hashlib.sha1(data).hexdigest()
+        if previous and previous[3] == content_hash:
+          self.connection.execute("UPDATE maps SET mtime = ?, size = ? WHERE id = ?", (stat.st_mtime, stat.st_size, previous[0]))
+          stats["unchanged"] += 1
+          continue
+        if previous:
+          self._remove(previous[0])
+        try:
+          columns, red_lines = _read_map(path, data)
+        except (ValueError, IndexError):
+          stats["failed"] += 1
+          continue
+        self._add(path, stat, content_hash, columns, red_lines)
+        stats["updated" if previous else "added"] += 1
+
+      if prune:
+        prefix = os.path.abspath(root)
+        for path, (map_id, *_) in known.items():
+          if path not in seen and (path == prefix or path.startswith(prefix + os.sep)):
+            self._remove(map_id)
+            stats["removed"] += 1
+
+    self._vocabulary = None
+    return stats
+
+  def _add(self, path: str, stat: os.stat_result, content_hash: str, columns: HitObjectColumns, red_lines: RedLines):
+    symbols = tokenize(columns, red_lines)
+    times = np.asarray(columns.time, dtype=np.float64)
+    cursor = self.connection.execute(
+      "INSERT INTO maps (path, mtime, size, content_hash, symbols, times) VALUES (?, ?, ?, ?, ?, ?)",
+      (path, stat.st_mtime, stat.st_size, content_hash, symbols.tobytes(), times.tobytes()),
+    )
+    map_id = cursor.lastrowid
+    keys = ngram_keys(symbols, self.n, pad=True)
+    if not len(keys):
+      return
+    order = np.argsort(keys, kind="stable")
+    unique, starts = np.unique(keys[order], return_index=True)
+    groups = np.split(order.astype(np.uint32), starts[1:])
+    self.connection.executemany(
+      "INSERT INTO postings (key, map_id, positions) VALUES (?, ?, ?)",
+      ((int(key), map_id, positions.tobytes()) for key, positions in zip(unique, groups)),
+    )
+    self.connection.executemany(
+      "INSERT INTO grams (key, maps) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET maps = maps + 1",
+      ((int(key),) for key in unique),
+    )
+
+  def _remove(self, map_id: int):
+    keys = [row[0] for row in self.connection.execute("SELECT key FROM postings WHERE map_id = ?", (map_id,))]
+    self.connection.executemany("UPDATE grams SET maps = maps - 1 WHERE key = ?", ((key,) for key in keys))
+    self.connection.execute("DELETE FROM grams WHERE maps <= 0")
+    self.connection.execute("DELETE FROM postings WHERE map_id = ?", (map_id,))
+    self.connection.execute("DELETE FROM maps WHERE id = ?", (map_id,))
+
+  def vocabulary(self) -> Tuple[np.ndarray, np.ndarray]:
+    # (distinct n-gram keys, number of maps containing each), cached until the next update.
+    if self._vocabulary is None:
+      rows = self.connection.execute("SELECT key, maps FROM grams ORDER BY key").fetchall()
+      self._vocabulary = (
+        np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+      )
+    return self._vocabulary
+
+  def _matching_keys(self, elements: Sequence[PatternElement]) -> np.ndarray:
+    # Vocabulary keys whose first len(elements) symbols match the elements.
+    keys, _ = self.vocabulary()
+    mask = np.ones(len(keys), dtype=bool)
+    for j, element in enumerate(elements):
+      symbols = (keys >> ((self.n - 1 - j) * _SYMBOL_BITS)) & ((1 << _SYMBOL_BITS) - 1)
+      mask &= element.matches(symbols)
+    return keys[mask]
+
+  def _rows(self, keys: Sequence[int]) -> Iterable[Tuple[int, int, np.ndarray]]:
+    # (key, map_id, positions) for every posting of `keys`.
+    keys = list(keys)
+    for start in range(0, len(keys), _BATCH):
+      batch = keys[start:start + _BATCH]
+      rows = self.connection.execute(
+        f"SELECT key, map_id, positions FROM postings WHERE key IN ({', '.join('?' for _ in batch)})", batch
+      )
+      for key, map_id, blob in rows:
+        yield key, map_id, np.frombuffer(blob, dtype=np.uint32).astype(np.int64)
+
+  def _postings(self, keys: np.ndarray, shift: int, map_ids: Optional[set]) -> np.ndarray:
+    # (map_id << 32 | pattern start) for every posting of `keys`, optionally limited to map_ids.
+    found = []
+    for _, map_id, positions in self._rows(keys.tolist()):
+      if map_ids is not None and map_id not in map_ids:
+        continue
+      positions = positions - shift
+      found.append((np.int64(map_id) << 32) | positions[positions >= 0])
+    return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+  def query(self, pattern: Union[str, Sequence[str]], *, limit: Optional[int] = None) -> List[PatternMatch]:
+    elements = parse_pattern(pattern)
+    n = self.n
+    if len(elements) <= n:
+      windows = [(0, elements)]
+    else:
+      # Overlapping windows that cover every element; the last one is aligned to the end.
+      offsets = list(range(0, len(elements) - n + 1, n)) + [len(elements) - n]
+      windows = [(offset, elements[offset:offset + n]) for offset in sorted(set(offsets))]
+
+    # Rarest window first, so later lookups are limited to the maps that can still match.
+    vocabulary, counts = self.vocabulary()
+    keys = [(offset, self._matching_keys(window)) for offset, window in windows]
+    keys.sort(key=lambda item: int(counts[np.searchsorted(vocabulary, item[1])].sum()))
+    hits: Optional[np.ndarray] = None
+    for offset, window_keys in keys:
+      map_ids = None if hits is None else set((hits >> 32).tolist())
+      found = self._postings(window_keys, offset, map_ids)
+      hits = found if hits is None else np.intersect1d(hits, found, assume_unique=True)
+      if not len(hits):
+        return []
+    return self._matches(hits[:limit] if limit else hits)
+
+  def _matches(self, hits: np.ndarray, scores: Optional[np.ndarray] = None) -> List[PatternMatch]:
+    if not len(hits):
+      return []
+    map_ids = np.unique(hits >> 32).tolist()
+    info: Dict[int, Tuple[str, np.ndarray]] = {}
+    for start in range(0, len(map_ids), _BATCH):
+      batch = map_ids[start:start + _BATCH]
+      for row in self.connection.execute(f"SELECT id, path, times FROM maps WHERE id IN ({', '.join('?' for _ in batch)})", batch):
+        info[row["id"]] = (row["path"], np.frombuffer(row["times"], dtype=np.float64))
+    matches = []
+    for i, hit in enumerate(hits.tolist()):
+      path, times = info[hit >> 32]
+      index = hit & 0xFFFFFFFF
+      matches.append(PatternMatch(path, index, float(times[index]), 1.0 if scores is None else float(scores[i])))
+    return matches
+
+  def similar(self, symbols: np.ndarray, *, top_k: int = 10, min_score: float = 0.0) -> List[PatternMatch]:
+    # Corpus passages most like a symbol sequence (e.g. from tokenize() on generated objects):
+    # every shared n-gram votes for the passage start it implies, and passages are ranked by the
+    # share of the query's n-grams they contain at a consistent alignment.
+    keys = ngram_keys(np.asarray(symbols, dtype=np.uint16), self.n)
+    if not len(keys):
+      return []
+    offsets: Dict[int, List[int]] = defaultdict(list)
+    for offset, key in enumerate(keys.tolist()):
+      offsets[key].append(offset)
+    votes = []
+    for key, map_id, positions in self._rows(offsets):
+      for offset in offsets[key]:
+        starts = positions - offset
+        votes.append((np.int64(map_id) << 32) | starts[starts >= 0])
+    if not votes:
+      return []
+    hits, counts = np.unique(np.concatenate(votes), return_counts=True)
+    scores = counts / len(keys)
+    order = np.lexsort((hits, -scores))
+    order = order[scores[order] >= min_score][:top_k]
+    return self._matches(hits[order], scores[order])
@@ -1,7 +1,9 @@
 from .difficulty import Difficulty
 from .general import General
+from .metadata import Metadata
 
 __all__ = [
   "General", 
   "Difficulty",
+  "Metadata",
 ]
\ No newline at end of file
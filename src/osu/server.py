@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .difficulty.attributes import DifficultyAttributes
+from .difficulty.cache import AttributeCache, content_hash, mods_key
+from .difficulty.mods import normalise_mods
+from .difficulty.profiling import _percentile
+from .mods import Mods
+
+
+def _warm_worker():
+  # Pay the import cost once per worker process instead of on the first request.
+  from .difficulty import calculator  # noqa: F401
+
+
+def _compute(raw: str, mod_combos: List[List[str]]) -> List[dict]:
+  # Runs inside a worker: one parse, every requested mod combo.
+  from .beatmap import Beatmap
+  from .difficulty.calculator import calculate_difficulty
+
+  beatmap = Beatmap(raw=raw)
+  return [asdict(calculate_difficulty(beatmap, mods)) for mods in mod_combos]
+
+
+class Overloaded(Exception):
+  pass
+
+
+class _Group:
+  # Requests for the same map that arrive within the batch window share one worker call.
+  __slots__ = ("raw", "mods", "futures")
+
+  def __init__(self, raw: str):
+    self.raw = raw
+    self.mods: Dict[str, List[str]] = {}
+    self.futures: Dict[str, Future] = {}
+
+
+class DifficultyService:
+  def __init__(
+    self, *,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[AttributeCache] = None,
+    max_pending: int = 64,
+    batch_window: float = 0.0,
+    timeout: float = 60.0,
+    latency_samples: int = 10000
+  ):
+    self.own_executor = executor is None
+    self.executor = executor or ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+    # An empty cache is falsy (__len__), so `cache or ...` would drop a caller's on-disk cache.
+    self.cache = cache if cache is not None else AttributeCache()
+    self.batch_window = batch_window
+    self.timeout = timeout
+    self.max_pending = max_pending
+
+    self._slots = threading.BoundedSemaphore(max_pending)
+    self._lock = threading.Lock()
+    self._groups: Dict[str, _Group] = {}
+    self._inflight: Dict[Tuple[str, str], Future] = {}
+    self._latencies = deque(maxlen=latency_samples)
+    self._started = time.time()
+    self.counters = {
+      "requests": 0, "rejected": 0, "errors": 0,
+      "computed": 0, "coalesced": 0, "worker_calls": 0, "pending": 0
+    }
+
+  def close(self):
+    if self.own_executor:
+      self.executor.shutdown(wait=True, cancel_futures=True)
+
+  def _count(self, name: str, value: int = 1):
+    with self._lock:
+      self.counters[name] += value
+
+  def difficulty(self, raw: str, mod_combos: Sequence[Sequence[str]]) -> Tuple[str, List[DifficultyAttributes]]:
+    if not self._slots.acquire(blocking=False):
+      self._count("rejected")
+      raise Overloaded(f"more than {self.max_pending} requests in flight")
+
+    start = time.perf_counter()
+    self._count("requests")
+    self._count("pending")
+    try:
+      digest = content_hash(raw)
+      combos = [normalise_mods(mods) for mods in mod_combos] or [[]]
+      results: List[Optional[DifficultyAttributes]] = [self.cache.get(digest, mods) for mods in combos]
+      missing = [idx for idx, attributes in enumerate(results) if attributes is None]
+      if missing:
+        futures = self._submit(digest, raw, [combos[idx] for idx in missing])
+        deadline = time.monotonic() + self.timeout
+        for idx, future in zip(missing, futures):
+          results[idx] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+      return digest, results
+    except Exception:
+      self._count("errors")
+      raise
+    finally:
+      self._count("pending", -1)
+      with self._lock:
+        self._latencies.append(time.perf_counter() - start)
+      self._slots.release()
+
+  def _submit(self, digest: str, raw: str, combos: List[List[str]]) -> List[Future]:
+    futures: List[Future] = []
+    group = None
+    owner = False
+    with self._lock:
+      for mods in combos:
+        key = mods_key(mods)
+        future = self._inflight.get((digest, key))
+        if future is not None:
+          self.counters["coalesced"] += 1
+          futures.append(future)
+          continue
+        group = self._groups.get(digest)
+        if group is None:
+          group = self._groups[digest] = _Group(raw)
+          owner = True
+        future = Future()
+        group.mods[key] = mods
+        group.futures[key] = future
+        self._inflight[(digest, key)] = future
+        futures.append(future)
+
+    if owner:
+      # Opt-in: give concurrent requests for the same map (other mods) a moment to join before
+      # dispatching. Off by default so that a lone cold request is not delayed.
+      if self.batch_window > 0:
+        time.sleep(self.batch_window)
+      with self._lock:
+        self._groups.pop(digest, None)
+        keys = list(group.mods)
+        self.counters["worker_calls"] += 1
+        self.counters["computed"] += len(keys)
+      try:
+        job = self.executor.submit(_compute, group.raw, [group.mods[key] for key in keys])
+      except Exception as e:
+        job = Future()
+        job.set_exception(e)
+      job.add_done_callback(lambda done: self._finish(digest, group, keys, done))
+    return futures
+
+  def _finish(self, digest: str, group: _Group, keys: List[str], job: Future):
+    error = job.exception()
+    values = None if error else job.result()
+    with self._lock:
+      for key in keys:
+        self._inflight.pop((digest, key), None)
+    for idx, key in enumerate(keys):
+      future = group.futures[key]
+      if error is None:
+        try:
+          attributes = DifficultyAttributes(**values[idx])
+        except Exception as e:
+          error = e
+      if error is not None:
+        future.set_exception(error)
+        continue
+      future.set_result(attributes)
+      try:
+        self.cache.put(digest, group.mods[key], attributes)
+      except OSError:
+        # The result is served either way; only the copy in --cache-dir is lost.
+        pass
+
+  def metrics(self) -> dict:
+    with self._lock:
+      # Handler threads append concurrently; sort a copy taken under the lock.
+      samples = list(self._latencies)
+      counters = dict(self.counters)
+    samples.sort()
+    return {
+      "uptime_seconds": time.time() - self._started,
+      "max_pending": self.max_pending,
+      **counters,
+      "cache": self.cache.stats(),
+      "latency_ms": {
+        "samples": len(samples),
+        "mean": sum(samples) / len(samples) * 1000 if samples else 0.0,
+        "p50": _percentile(samples, 50.0) * 1000,
+        "p90": _percentile(samples, 90.0) * 1000,
+        "p99": _percentile(samples, 99.0) * 1000,
+        "max": samples[-1] * 1000 if samples else 0.0,
+      },
+    }
+
+
+def _mod_combos(request: dict) -> List[List[str]]:
+  combos = request["mod_combos"] if "mod_combos" in request else [request.get("mods")]
+  for mods in combos:
+    for mod in mods or []:
+      if mod not in Mods.__members__:
+        raise ValueError(f"Unknown mod: {mod!r}")
+  return [list(mods or []) for mods in combos]
+
+
+def _read_content(request: dict) -> str:
+  if "content" in request:
+    return request["content"]
+  if "path" in request:
+    with open(request["path"], "r", encoding="utf-8", newline="") as f:
+      return f.read()
+  raise ValueError("request needs either 'content' or 'path'")
+
+
+def handle_difficulty(service: DifficultyService, request: dict) -> dict:
+  from .difficulty.calculator import calculate_performance
+
+  combos = _mod_combos(request)
+  digest, results = service.difficulty(_read_content(request), combos)
+  performance = request.get("performance")
+  entries = []
+  for mods, attributes in zip(combos, results):
+    # Cached attributes may come from an equivalent combo in another order; echo the request.
+    entry = {"mods": mods, "difficulty": {**asdict(attributes), "mods": mods}}
+    del entry["difficulty"]["strain_timeline"]
+    if not request.get("strains", False):
+      del entry["difficulty"]["strains"]
+    if performance is not None:
+      entry["performance"] = asdict(calculate_performance(attributes, **performance))
+    entries.append(entry)
+  return {"content_hash": digest, "results": entries}
+
+
+class DifficultyRequestHandler(BaseHTTPRequestHandler):
+  server_version = "osu-bmg-difficulty/1"
+  protocol_version = "HTTP/1.1"
+
+  @property
+  def service(self) -> DifficultyService:
+    return self.server.service
+
+  def address_string(self):
+    # Unix socket peers have no (host, port) address.
+    return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      super().log_message(format, *args)
+
+  def _send_json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps(payload).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    if self.path == "/metrics":
+      self._send_json(200, self.service.metrics())
+    elif self.path == "/health":
+      self._send_json(200, {"status": "ok"})
+    else:
+      self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+  def do_POST(self):
+    if self.path != "/difficulty":
+      self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+      return
+    try:
+      length = int(self.headers.get("Content-Length", 0))
+      request = json.loads(self.rfile.read(length) or b"{}")
+      self._send_json(200, handle_difficulty(self.service, request))
+    except Overloaded as e:
+      self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+    except FutureTimeoutError:
+      self._send_json(504, {"error": "difficulty calculation timed out"})
+    except (ValueError, TypeError, KeyError, OSError) as e:
+      self._send_json(400, {"error": str(e)})
+    except Exception as e:
+      self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+
+class DifficultyHTTPServer(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, address, service: DifficultyService, *, verbose: bool = False):
+    self.service = service
+    self.verbose = verbose
+    super().__init__(address, DifficultyRequestHandler)
+
+
+class DifficultyUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+  def __init__(self, path: str, service: DifficultyService, *, verbose: bool = False):
+    self.service = service
+    self.verbose = verbose
+    if os.path.exists(path):
+      os.unlink(path)
+    super().__init__(path, DifficultyRequestHandler)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+  parser = argparse.ArgumentParser(description="Serve osu! difficulty attributes over HTTP.")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8727)
+  parser.add_argument("--unix", help="listen on a unix socket instead of TCP")
+  parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cpu count)")
+  parser.add_argument("--threads", action="store_true", help="use a thread pool instead of worker processes")
+  parser.add_argument("--cache-size", type=int, default=4096)
+  parser.add_argument("--cache-dir", help="also persist cached attributes to this directory")
+  parser.add_argument("--max-pending", type=int, default=64, help="requests in flight before answering 503")
+  parser.add_argument("--batch-window-ms", type=float, default=0.0, help="wait this long for requests for the same map to join one worker call (default: off)")
+  parser.add_argument("--timeout", type=float, default=60.0)
+  parser.add_argument("--verbose", action="store_true")
+  args = parser.parse_args(argv)
+
+  executor = ThreadPoolExecutor(max_workers=args.workers) if args.threads else None
+  service = DifficultyService(
+    workers=args.workers,
+    executor=executor,
+    cache=AttributeCache(args.cache_size, args.cache_dir),
+    max_pending=args.max_pending,
+    batch_window=args.batch_window_ms / 1000.0,
+    timeout=args.timeout,
+  )
+  if args.unix:
+    server = DifficultyUnixServer(args.unix, service, verbose=args.verbose)
+    print(f"Listening on unix:{args.unix}")
+  else:
+    server = DifficultyHTTPServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"Listening on http://{args.host}:{server.server_address[1]}")
+
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    service.close()
+    if executor is not None:
+      executor.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+
+from .timing_point import TimingPoint
+
+# Beat snapping over whole arrays of times. Each time is matched to its active red line
+# (uninherited timing point) with searchsorted, turned into a beat phase, and compared with the
+# tick grid of every divisor at once. The reported snap is the simplest divisor whose nearest
+# tick lies within `tolerance_ms`; times that fit none of them get the divisor with the
+# smallest error and `snapped == False`.
+
+DIVISORS: Tuple[int, ...] = (1, 2, 3, 4, 6, 8, 12, 16)
+# osu! stores whole milliseconds, so a correctly snapped object can be off by up to ~1 ms.
+DEFAULT_TOLERANCE_MS = 2.0
+CHUNK_SIZE = 1 << 16
+
+
+@dataclass
+class RedLines:
+  time: np.ndarray
+  beat_length: np.ndarray
+
+  def __len__(self) -> int:
+    return len(self.time)
+
+  @classmethod
+  def from_timing_points(cls, timing_points: Iterable[TimingPoint]) -> "RedLines":
+    red = sorted(
+      ((float(tp.time), float(tp.beat_length)) for tp in timing_points if tp.uninherited and tp.beat_length > 0),
+      key=lambda pair: pair[0],
+    )
+    if not red:
+      raise ValueError("no uninherited timing point with a positive beat length")
+    times, beat_lengths = zip(*red)
+    return cls(np.asarray(times, dtype=np.float64), np.asarray(beat_lengths, dtype=np.float64))
+
+  @classmethod
+  def from_beatmap(cls, beatmap) -> "RedLines":
+    return cls.from_timing_points(beatmap.timing_points)
+
+  def active(self, times: np.ndarray) -> np.ndarray:
+    # Index of the red line in effect at each time; several at the same time resolve to the
+    # last one, and times before the first red line use the first.
+    idx = np.searchsorted(self.time, times, side="right") - 1
+    return np.maximum(idx, 0)
+
+
+@dataclass
+class SnapResult:
+  red_line: np.ndarray     # index into RedLines
+  beat: np.ndarray         # beats since the red line (fractional)
+  divisor: np.ndarray      # chosen divisor (1 = 1/1, 4 = 1/4, ...)
+  snapped_time: np.ndarray # time of the nearest tick of that divisor
+  error: np.ndarray        # time - snapped_time, in ms
+  snapped: np.ndarray      # |error| <= tolerance
+
+  def __len__(self) -> int:
+    return len(self.divisor)
+
+  def histogram(self, divisors: Sequence[int] = DIVISORS) -> np.ndarray:
+    return _histogram(self.divisor, self.snapped, divisors)
+
+
+def _histogram(divisor: np.ndarray, snapped: np.ndarray, divisors: Sequence[int]) -> np.ndarray:
+  # Counts per divisor in `divisors` order, plus a final bucket for unsnapped times.
+  order = np.asarray(divisors, dtype=np.int64)
+  sorter = np.argsort(order)
+  codes = sorter[np.minimum(np.searchsorted(order, divisor, sorter=sorter), len(order) - 1)]
+  codes = np.where(snapped & (order[codes] == divisor), codes, len(order))
+  return np.bincount(codes, minlength=len(order) + 1)
+
+
+def analyse_snaps(
+  times: Sequence[float],
+  red_lines: RedLines,
+  *,
+  divisors: Sequence[int] = DIVISORS,
+  tolerance_ms: float = DEFAULT_TOLERANCE_MS,
+) -> SnapResult:
+  times = np.asarray(times, dtype=np.float64)
+  divisors_arr = np.asarray(sorted(divisors), dtype=np.int64)
+  red_line = red_lines.active(times)
+  beat_length = red_lines.beat_length[red_line]
+  red_time = red_lines.time[red_line]
+  beat = (times - red_time) / beat_length
+
+  choice = np.empty(len(times), dtype=np.intp)
+  snapped_beat = np.empty(len(times), dtype=np.float64)
+  error = np.empty(len(times), dtype=np.float64)
+  snapped = np.empty(len(times), dtype=bool)
+  # The (n, divisors) work matrices are built a chunk at a time to bound memory.
+  for start in range(0, len(times), CHUNK_SIZE):
+    part = slice(start, start + CHUNK_SIZE)
+    ticks = np.rint(beat[part, None] * divisors_arr) / divisors_arr
+    errors = (beat[part, None] - ticks) * beat_length[part, None]
+    abs_errors = np.abs(errors)
+    within = abs_errors <= tolerance_ms
+    snapped[part] = within.any(axis=1)
+    choice[part] = np.where(snapped[part], within.argmax(axis=1), abs_errors.argmin(axis=1))
+    rows = np.arange(len(ticks))
+    snapped_beat[part] = ticks[rows, choice[part]]
+    error[part] = errors[rows, choice[part]]
+
+  return SnapResult(
+    red_line=red_line,
+    beat=beat,
+    divisor=divisors_arr[choice],
+    snapped_time=red_time + snapped_beat * beat_length,
+    error=error,
+    snapped=snapped,
+  )
+
+
+def snap_times(
+  times: np.ndarray,
+  red_lines: RedLines,
+  *,
+  divisors: Sequence[int] = DIVISORS,
+  tolerance_ms: Optional[float] = None,
+  round_ms: bool = False,
+  out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+  # Moves times onto the tick grid; pass out=times to snap generator output in place. Without a
+  # tolerance every time goes to the nearest tick of any divisor (the simplest one on ties); with
+  # one, times further than that from every grid are left where they are.
+  if tolerance_ms is None:
+    snapped_time = analyse_snaps(times, red_lines, divisors=divisors, tolerance_ms=0.0).snapped_time
+  else:
+    result = analyse_snaps(times, red_lines, divisors=divisors, tolerance_ms=tolerance_ms)
+    snapped_time = np.where(result.snapped, result.snapped_time, np.asarray(times, dtype=np.float64))
+  if round_ms:
+    snapped_time = np.rint(snapped_time)
+  if out is None:
+    return snapped_time
+  out[...] = snapped_time
+  return out
+
+
+def beatmap_snaps(beatmap, **kwargs) -> SnapResult:
+  # Snaps of every hit object start, read from the columnar view (no per-object instances).
+  return analyse_snaps(beatmap.hit_object_columns().time, RedLines.from_beatmap(beatmap), **kwargs)
+
+
+def snap_histograms(
+  maps: Iterable[Tuple[Sequence[float], RedLines]],
+  *,
+  divisors: Sequence[int] = DIVISORS,
+  tolerance_ms: float = DEFAULT_TOLERANCE_MS,
+) -> np.ndarray:
+  # (maps, len(divisors) + 1) counts; the last column counts unsnapped times.
+  rows = [
+    analyse_snaps(times, red_lines, divisors=divisors, tolerance_ms=tolerance_ms).histogram(divisors)
+    for times, red_lines in maps
+  ]
+  return np.vstack(rows) if rows else np.zeros((0, len(divisors) + 1), dtype=np.intp)
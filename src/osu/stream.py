@@ -0,0 +1,109 @@
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .beatmap import _SECTION_HEADER
+from .hit_object import Circle, Slider, Spinner
+from .sections.difficulty import Difficulty
+from .sections.general import General
+from .sections.metadata import Metadata
+from .timing_point import TimingPoint
+
+# Bounded-memory reading for marathon/aspire maps. One pass over the file records where every
+# section starts (and keeps the small key-value sections); timing points and hit objects are
+# then read lazily from their own file handles, one line at a time, so nothing proportional to
+# the map length is held. Hit objects must be in time order, as in every ranked map; slider
+# durations come from a timing point cursor that advances with them.
+
+SMALL_SECTIONS = ("General", "Metadata", "Difficulty")
+
+
+class BeatmapStream:
+  def __init__(self, file_path: str):
+    self.file_path = file_path
+    # section -> byte offset of its first line after the header
+    self._offsets: Dict[str, int] = {}
+    small: Dict[str, List[str]] = {}
+
+    with open(file_path, "rb") as f:
+      offset = 0
+      current = None
+      for line in f:
+        offset += len(line)
+        match = _SECTION_HEADER.match(line.decode("utf-8", errors="replace"))
+        if match:
+          current = match.group(1).strip()
+          self._offsets.setdefault(current, offset)
+        elif current in SMALL_SECTIONS:
+          small.setdefault(current, []).append(line.decode("utf-8"))
+
+    self.general = General(raw="".join(small.get("General", [])))
+    self.metadata = Metadata(raw="".join(small.get("Metadata", [])))
+    self.difficulty = Difficulty(raw="".join(small.get("Difficulty", [])))
+
+  @property
+  def sections(self) -> List[str]:
+    return list(self._offsets)
+
+  def iter_lines(self, name: str) -> Iterator[str]:
+    # The section's lines as Beatmap parses them: stripped, without blanks and comments.
+    if name not in self._offsets:
+      return
+    with open(self.file_path, "rb") as f:
+      f.seek(self._offsets[name])
+      for raw in f:
+        line = raw.decode("utf-8")
+        if _SECTION_HEADER.match(line):
+          return
+        line = line.strip()
+        if line and not line.startswith("//"):
+          yield line
+
+  def iter_timing_points(self) -> Iterator[TimingPoint]:
+    for line in self.iter_lines("TimingPoints"):
+      yield TimingPoint(raw=line)
+
+  def iter_hit_objects(self) -> Iterator[Union[Circle, Slider, Spinner]]:
+    # Same objects (and slider durations) as Beatmap.hit_objects, for maps in time order.
+    cursor = _TimingCursor(self.iter_timing_points())
+    slider_multiplier = self.difficulty.slider_multiplier
+    last_time = None
+    for line in self.iter_lines("HitObjects"):
+      type_id = int(line.split(",")[3])
+      if type_id & 1:
+        hit_object = Circle(raw=line)
+      elif type_id & 2:
+        hit_object = Slider(raw=line)
+      elif type_id & 8:
+        hit_object = Spinner(raw=line)
+      else:
+        raise ValueError(f"Unknown hit object type id: {type_id}")
+
+      if last_time is not None and hit_object.time < last_time:
+        raise ValueError(f"{self.file_path}: hit objects are not in time order ({hit_object.time} after {last_time}); load it with Beatmap instead")
+      last_time = hit_object.time
+
+      if isinstance(hit_object, Slider):
+        sv_multiplier, beat_length = cursor.at(hit_object.time)
+        hit_object.object_params._load_duration(sv_multiplier * slider_multiplier, beat_length)
+      yield hit_object
+
+
+class _TimingCursor:
+  # Beatmap.get_previous_timing_point for non-decreasing times: walks the timing points in
+  # file order up to the first one after `time`, remembering the last red and green line.
+  def __init__(self, timing_points: Iterator[TimingPoint]):
+    self._timing_points = timing_points
+    self._next: Optional[TimingPoint] = next(timing_points, None)
+    self._uninherited: Optional[TimingPoint] = None
+    self._inherited: Optional[TimingPoint] = None
+
+  def at(self, time: float) -> Tuple[float, float]:
+    # (slider velocity multiplier, beat length) in effect at `time`.
+    while self._next is not None and self._next.time <= time:
+      if self._next.uninherited == 1:
+        self._uninherited = self._next
+      elif self._next.uninherited == 0:
+        self._inherited = self._next
+      self._next = next(self._timing_points, None)
+    sv_multiplier = self._inherited.get_slider_velocity_multiplier() if self._inherited else 1.0
+    beat_length = self._uninherited.beat_length if self._uninherited else 500
+    return sv_multiplier, beat_length
@@ -1,3 +1,5 @@
+from .formatting import format_float
+
 class TimingPoint:
   def __init__(
     self, *,
@@ -46,12 +48,7 @@ class TimingPoint:
     return -100.0 / self.beat_length
 
   def _format_float(self, value: float) -> str:
-    formatted = format(value, ".15g")
-    if formatted.endswith(".0"):
-      formatted = formatted[:-2]
-    if formatted == "-0":
-      return "0"
-    return formatted
+    return format_float(value)
 
   def __str__(self) -> str:
     beat_length = self._format_float(self.beat_length)
@@ -0,0 +1,438 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .columns import CIRCLE, DEFAULT_HIT_SAMPLE, NEW_COMBO, SLIDER, SPINNER, HitObjectColumns
+from .formatting import format_number
+from .index import iter_beatmap_files, split_header
+
+# Token streams of hit objects for sequence models.
+#
+# The vocabulary is a fixed list of fields, each a contiguous range of token ids (FIELDS). An
+# object is written as
+#   shift* type x y [hit_sound] [sample [sample_index] [volume]]
+#     slider:  (curve (x y)*)+ slides length_hi length_lo [(edge_sound edge_set) * (slides + 1)]
+#     spinner: duration_hi duration_lo
+# where shift tokens move time forward from the previous object (from 0 for the first), and
+# bracketed fields are left out when they hold the default value. Large values use two tokens
+# (base DIGIT digits).
+#
+# encode() builds, for every field at once, arrays of (object, field rank, position, token) and
+# orders them with one lexsort; decode() finds objects by their type token and scatters the
+# fields back by owner. decode(encode(columns)) reproduces every field up to precision:
+# positions, curve points, times and spinner end times are rounded to whole units (so a
+# fractional value, which some editors write, moves by at most 0.5) and slider lengths to
+# 1/1000 px. Values the vocabulary cannot hold at all (custom sample files, positions off the
+# extended playfield, ...) raise ValueError.
+#
+# A TokenCorpus keeps the streams of many maps in one flat memmap with per-map offsets, tagged
+# with the vocabulary signature so that a corpus built with another vocabulary is rebuilt.
+
+POSITION_MIN = -256
+MAX_SHIFT = 1024
+DIGIT = 1024
+LENGTH_SCALE = 1000
+CURVE_TYPES = "BCLP"
+COMBO_SKIP_SHIFT = 4
+_TYPE_BITS = CIRCLE | SLIDER | NEW_COMBO | SPINNER | (7 << COMBO_SKIP_SHIFT)
+
+FIELDS: Tuple[Tuple[str, int], ...] = (
+  ("special", 3),          # PAD, BOS, EOS
+  ("shift", MAX_SHIFT),    # 1..MAX_SHIFT ms
+  ("type", 3 * 2 * 8),     # kind (circle, slider, spinner) x new combo x combo colour skip
+  ("x", 1024),             # POSITION_MIN..POSITION_MIN + 1023
+  ("y", 1024),
+  ("hit_sound", 16),
+  ("sample", 16),          # normal set * 4 + addition set
+  ("sample_index", 256),
+  ("volume", 101),
+  ("curve", len(CURVE_TYPES)),
+  ("slides", 256),         # 1..256
+  ("length_hi", 8192),     # slider length in 1/LENGTH_SCALE px (up to ~8400 px)
+  ("length_lo", DIGIT),
+  ("edge_sound", 16),
+  ("edge_set", 16),        # normal set * 4 + addition set
+  ("duration_hi", DIGIT),  # spinner duration in ms
+  ("duration_lo", DIGIT),
+)
+PAD, BOS, EOS = 0, 1, 2
+
+# Order of the fields inside an object; slider curve points share the curve rank.
+_RANK = {name: rank for rank, name in enumerate((
+  "shift", "type", "x", "y", "hit_sound", "sample", "sample_index", "volume",
+  "curve", "slides", "length", "edges", "duration",
+))}
+_DEFAULT_SAMPLES = frozenset(("", DEFAULT_HIT_SAMPLE, "0:0:0:0"))
+
+
+class Vocabulary:
+  def __init__(self, fields: Sequence[Tuple[str, int]] = FIELDS):
+    self.fields = tuple((name, int(size)) for name, size in fields)
+    sizes = np.array([size for _, size in self.fields], dtype=np.int64)
+    self.starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    self.index = {name: i for i, (name, _) in enumerate(self.fields)}
+    self.size = int(sizes.sum())
+    self.dtype = np.dtype(np.int16 if self.size <= np.iinfo(np.int16).max + 1 else np.int32)
+    self.signature = hashlib.sha1(json.dumps(self.fields).encode()).hexdigest()[:16]
+
+  def __len__(self) -> int:
+    return self.size
+
+  def offset(self, name: str) -> int:
+    return int(self.starts[self.index[name]])
+
+  def field_size(self, name: str) -> int:
+    return self.fields[self.index[name]][1]
+
+  def fields_of(self, tokens: np.ndarray) -> np.ndarray:
+    return np.searchsorted(self.starts, tokens, side="right") - 1
+
+  def name(self, token: int) -> str:
+    # "field:value", for reading token streams.
+    field = int(self.fields_of(np.asarray([token]))[0])
+    return f"{self.fields[field][0]}:{token - int(self.starts[field])}"
+
+
+VOCABULARY = Vocabulary()
+
+
+def _whole(values, what: str) -> np.ndarray:
+  values = np.asarray(values, dtype=np.float64)
+  if not np.isfinite(values).all():
+    raise ValueError(f"cannot tokenise non-finite {what}")
+  return np.rint(values).astype(np.int64)
+
+
+def _sample_value(normal, addition) -> np.ndarray:
+  normal, addition = np.asarray(normal, dtype=np.int64), np.asarray(addition, dtype=np.int64)
+  if ((normal < 0) | (normal > 3) | (addition < 0) | (addition > 3)).any():
+    raise ValueError("cannot tokenise sample sets outside 0..3")
+  return normal * 4 + addition
+
+
+class _Tokens:
+  # Collects (owner, rank, position, token) arrays per field and orders them into a stream.
+  def __init__(self, vocabulary: Vocabulary):
+    self.vocabulary = vocabulary
+    self.parts: List[Tuple[np.ndarray, ...]] = []
+
+  def add(self, name: str, owner, value, *, rank: Optional[str] = None, position=0):
+    value = np.asarray(value, dtype=np.int64)
+    size = self.vocabulary.field_size(name)
+    if len(value) and (value.min() < 0 or value.max() >= size):
+      bad = value[(value < 0) | (value >= size)][0]
+      raise ValueError(f"cannot tokenise {name} = {bad} (field holds 0..{size - 1})")
+    owner = np.asarray(owner, dtype=np.int64)
+    self.parts.append((
+      owner,
+      np.full(len(owner), _RANK[rank or name], dtype=np.int64),
+      np.broadcast_to(np.asarray(position, dtype=np.int64), owner.shape),
+      value + self.vocabulary.offset(name),
+    ))
+
+  def stream(self) -> np.ndarray:
+    if not self.parts:
+      return np.zeros(0, dtype=np.int64)
+    owner, rank, position, token = (np.concatenate(column) for column in zip(*self.parts))
+    return token[np.lexsort((position, rank, owner))]
+
+
+def _runs(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  # (owner, position within owner) for groups of the given sizes.
+  counts = np.asarray(counts, dtype=np.int64)
+  owner = np.repeat(np.arange(len(counts)), counts)
+  starts = np.cumsum(counts) - counts
+  return owner, np.arange(int(np.sum(counts))) - np.repeat(starts, counts)
+
+
+def _encode_sliders(tokens: _Tokens, objects: np.ndarray, params: Sequence[str]):
+  fields = [param.split(",") for param in params]
+  if any(len(f) < 3 for f in fields):
+    raise ValueError("cannot tokenise slider parameters without slides and length")
+  slides = np.array([int(f[1]) for f in fields], dtype=np.int64)
+  length = np.array([float(f[2]) for f in fields], dtype=np.float64)
+  tokens.add("slides", objects, slides - 1)
+  length = np.rint(length * LENGTH_SCALE).astype(np.int64)
+  tokens.add("length_hi", objects, length // DIGIT, rank="length", position=0)
+  tokens.add("length_lo", objects, length % DIGIT, rank="length", position=1)
+
+  curves = [f[0] for f in fields]
+  items = np.array("|".join(curves).split("|"))
+  slider_of_item, _ = _runs(np.array([curve.count("|") + 1 for curve in curves]))
+  keep = items != ""
+  items, slider_of_item = items[keep], slider_of_item[keep]
+  _, item_position = _runs(np.bincount(slider_of_item, minlength=len(curves)))
+  letters = np.isin(items, list(CURVE_TYPES))
+  if not letters[item_position == 0].all() or np.bincount(slider_of_item, minlength=len(curves)).min() == 0:
+    raise ValueError("cannot tokenise a slider curve that does not start with a curve type")
+  owner = objects[slider_of_item]
+  tokens.add("curve", owner[letters], np.searchsorted(np.array(list(CURVE_TYPES)), items[letters]), position=item_position[letters] * 2)
+  points = items[~letters]
+  coordinates = np.array(":".join(points).split(":") if len(points) else [], dtype=np.float64)
+  if len(coordinates) != 2 * len(points):
+    raise ValueError("cannot tokenise malformed slider curve points")
+  coordinates = _whole(coordinates, "curve points").reshape(-1, 2) - POSITION_MIN
+  tokens.add("x", owner[~letters], coordinates[:, 0], rank="curve", position=item_position[~letters] * 2)
+  tokens.add("y", owner[~letters], coordinates[:, 1], rank="curve", position=item_position[~letters] * 2 + 1)
+
+  # Edge sounds and sets only when some edge differs from the default.
+  edged = [i for i, f in enumerate(fields) if (len(f) > 3 and f[3].strip("0|")) or (len(f) > 4 and f[4].strip("0:|"))]
+  if not edged:
+    return
+  edges = slides[edged] + 1
+  sound_text = [fields[i][3] if len(fields[i]) > 3 and fields[i][3] else "|".join(["0"] * n) for i, n in zip(edged, edges.tolist())]
+  set_text = [fields[i][4] if len(fields[i]) > 4 and fields[i][4] else "|".join(["0:0"] * n) for i, n in zip(edged, edges.tolist())]
+  if (np.array([t.count("|") + 1 for t in sound_text]) != edges).any() or (np.array([t.count("|") + 1 for t in set_text]) != edges).any():
+    raise ValueError("cannot tokenise a slider whose edge count differs from slides + 1")
+  sounds = np.array(list(map(int, "|".join(sound_text).split("|"))), dtype=np.int64)
+  sets = np.array(list(map(int, "|".join(set_text).replace(":", "|").split("|"))), dtype=np.int64).reshape(-1, 2)
+  owner, edge = _runs(edges)
+  owner = objects[np.asarray(edged)][owner]
+  tokens.add("edge_sound", owner, sounds, rank="edges", position=edge * 2)
+  tokens.add("edge_set", owner, _sample_value(sets[:, 0], sets[:, 1]), rank="edges", position=edge * 2 + 1)
+
+
+def encode(columns: HitObjectColumns, *, vocabulary: Vocabulary = VOCABULARY, bos_eos: bool = True) -> np.ndarray:
+  tokens = _Tokens(vocabulary)
+  count = len(columns)
+  objects = np.arange(count)
+
+  times = _whole(columns.time, "times")
+  delta = np.diff(times, prepend=0)
+  if (delta < 0).any():
+    raise ValueError("cannot tokenise hit objects before 0 or out of time order")
+  shifts = -(-delta // MAX_SHIFT)
+  owner, step = _runs(shifts)
+  last = step == shifts[owner] - 1
+  tokens.add("shift", owner, np.where(last, delta[owner] - MAX_SHIFT * step, MAX_SHIFT) - 1, position=step)
+
+  types = np.asarray(columns.type, dtype=np.int64)
+  kind_bits = types & (CIRCLE | SLIDER | SPINNER)
+  kind = np.select([kind_bits == CIRCLE, kind_bits == SLIDER, kind_bits == SPINNER], [0, 1, 2], -1)
+  if (kind < 0).any() or (types & ~_TYPE_BITS).any():
+    raise ValueError(f"cannot tokenise hit object type {types[(kind < 0) | (types & ~_TYPE_BITS != 0)][0]}")
+  tokens.add("type", objects, kind * 16 + ((types & NEW_COMBO) > 0) * 8 + ((types >> COMBO_SKIP_SHIFT) & 7))
+  tokens.add("x", objects, _whole(columns.x, "positions") - POSITION_MIN)
+  tokens.add("y", objects, _whole(columns.y, "positions") - POSITION_MIN)
+
+  hit_sound = np.asarray(columns.hit_sound, dtype=np.int64)
+  tokens.add("hit_sound", objects[hit_sound != 0], hit_sound[hit_sound != 0])
+
+  sampled = [i for i, sample in enumerate(columns.hit_sample) if sample not in _DEFAULT_SAMPLES]
+  if sampled:
+    values = [columns.hit_sample[i].split(":") for i in sampled]
+    if any(len(v) < 4 or (len(v) > 4 and v[4].strip()) for v in values):
+      raise ValueError("cannot tokenise hit samples with a custom filename")
+    values = np.array([[int(field) for field in v[:4]] for v in values], dtype=np.int64)
+    owner = np.asarray(sampled)
+    tokens.add("sample", owner, _sample_value(values[:, 0], values[:, 1]))
+    tokens.add("sample_index", owner[values[:, 2] != 0], values[values[:, 2] != 0, 2])
+    tokens.add("volume", owner[values[:, 3] != 0], values[values[:, 3] != 0, 3])
+
+  sliders = objects[kind == 1]
+  if len(sliders):
+    _encode_sliders(tokens, sliders, [columns.params[i] for i in sliders])
+  spinners = objects[kind == 2]
+  if len(spinners):
+    duration = _whole([float(columns.params[i]) for i in spinners], "spinner end times") - times[spinners]
+    if (duration < 0).any():
+      raise ValueError("cannot tokenise a spinner that ends before it starts")
+    tokens.add("duration_hi", spinners, duration // DIGIT, rank="duration", position=0)
+    tokens.add("duration_lo", spinners, duration % DIGIT, rank="duration", position=1)
+
+  stream = tokens.stream()
+  if bos_eos:
+    stream = np.concatenate([[BOS], stream, [EOS]])
+  return stream.astype(vocabulary.dtype)
+
+
+def decode(tokens: np.ndarray, *, vocabulary: Vocabulary = VOCABULARY) -> HitObjectColumns:
+  tokens = np.asarray(tokens, dtype=np.int64)
+  if len(tokens) and (tokens.min() < 0 or tokens.max() >= len(vocabulary)):
+    raise ValueError("token ids outside the vocabulary")
+  tokens = tokens[tokens >= vocabulary.offset("special") + vocabulary.field_size("special")]
+  field = vocabulary.fields_of(tokens)
+  value = tokens - vocabulary.starts[field]
+  ids = vocabulary.index
+
+  starts = np.flatnonzero(field == ids["type"])
+  count = len(starts)
+  owner = np.cumsum(field == ids["type"]) - 1
+  if (owner[field != ids["shift"]] < 0).any():
+    raise ValueError("tokens before the first object")
+  if len(starts) and (starts[-1] + 2 >= len(tokens) or (field[starts + 1] != ids["x"]).any() or (field[starts + 2] != ids["y"]).any()):
+    raise ValueError("every type token must be followed by x and y")
+
+  shift = np.where(field == ids["shift"], value + 1, 0)
+  times = np.cumsum(shift)[starts] if count else np.zeros(0, dtype=np.int64)
+  type_value = value[starts]
+  kind = type_value // 16
+  types = np.choose(kind, (CIRCLE, SLIDER, SPINNER)) | np.where(type_value & 8, NEW_COMBO, 0) | ((type_value & 7) << COMBO_SKIP_SHIFT)
+  x = value[starts + 1] + POSITION_MIN
+  y = value[starts + 2] + POSITION_MIN
+
+  def single(name: str, default: int = 0) -> np.ndarray:
+    values = np.full(count, default, dtype=np.int64)
+    mask = field == ids[name]
+    values[owner[mask]] = value[mask]
+    return values
+
+  hit_sound = single("hit_sound")
+  sample = single("sample", -1)
+  sample_index, volume = single("sample_index"), single("volume")
+  hit_sample = [DEFAULT_HIT_SAMPLE] * count
+  for i in np.flatnonzero((sample >= 0) | (sample_index != 0) | (volume != 0)).tolist():
+    normal, addition = divmod(max(int(sample[i]), 0), 4)
+    hit_sample[i] = f"{normal}:{addition}:{sample_index[i]}:{volume[i]}:"
+
+  params = [""] * count
+  for i, end in zip(np.flatnonzero(kind == 2).tolist(), (times + single("duration_hi") * DIGIT + single("duration_lo"))[kind == 2].tolist()):
+    params[i] = str(end)
+
+  sliders = np.flatnonzero(kind == 1)
+  if len(sliders):
+    slides = single("slides", -1) + 1
+    length = single("length_hi") * DIGIT + single("length_lo")
+    if (slides[sliders] <= 0).any():
+      raise ValueError("slider without a slides token")
+
+    # Curve items: curve type tokens and x/y pairs that are not an object's own position.
+    position = np.zeros(len(tokens), dtype=bool)
+    position[starts + 1] = position[starts + 2] = True
+    is_x = (field == ids["x"]) & ~position
+    if (field[np.flatnonzero(is_x) + 1] != ids["y"]).any() or ((field == ids["y"]) & ~position).sum() != is_x.sum():
+      raise ValueError("curve points must be x, y pairs")
+    items = np.flatnonzero((field == ids["curve"]) | is_x)
+    item_text = np.empty(len(items), dtype=object)
+    letters = field[items] == ids["curve"]
+    item_text[letters] = [CURVE_TYPES[v] for v in value[items[letters]].tolist()]
+    point_x = (value[items[~letters]] + POSITION_MIN).tolist()
+    point_y = (value[items[~letters] + 1] + POSITION_MIN).tolist()
+    item_text[~letters] = [f"{px}:{py}" for px, py in zip(point_x, point_y)]
+    bounds = np.searchsorted(owner[items], np.concatenate([sliders, [count]]))
+
+    edge_sound = field == ids["edge_sound"]
+    edge_set = field == ids["edge_set"]
+    sound_bounds = np.searchsorted(owner[edge_sound], np.concatenate([sliders, [count]]))
+    set_bounds = np.searchsorted(owner[edge_set], np.concatenate([sliders, [count]]))
+    sounds = value[edge_sound].tolist()
+    sets = [f"{v // 4}:{v % 4}" for v in value[edge_set].tolist()]
+    for j, i in enumerate(sliders.tolist()):
+      curve = "|".join(item_text[bounds[j]:bounds[j + 1]])
+      if not curve or curve[0] not in CURVE_TYPES:
+        raise ValueError("slider without a curve")
+      edges = int(slides[i]) + 1
+      edge_sounds = sounds[sound_bounds[j]:sound_bounds[j + 1]] or [0] * edges
+      edge_sets = sets[set_bounds[j]:set_bounds[j + 1]] or ["0:0"] * edges
+      params[i] = (
+        f"{curve},{slides[i]},{format_number(length[i] / LENGTH_SCALE)},"
+        f"{'|'.join(map(str, edge_sounds))},{'|'.join(edge_sets)}"
+      )
+
+  return HitObjectColumns(
+    x=x, y=y, time=times, type=types, hit_sound=hit_sound, params=params, hit_sample=hit_sample,
+  )
+
+
+def encode_file(path: str, *, vocabulary: Vocabulary = VOCABULARY) -> np.ndarray:
+  with open(path, "rb") as f:
+    _, hit_objects = split_header(f.read().decode("utf-8-sig", errors="replace"))
+  return encode(HitObjectColumns.from_raw(hit_objects), vocabulary=vocabulary)
+
+
+class TokenCorpus:
+  # tokens.bin (flat token ids), offsets.npy (maps + 1 int64) and meta.json (paths, dtype and
+  # vocabulary signature) in one directory. meta.json is written last, so a directory without
+  # it is an unfinished build.
+  def __init__(self, directory: str, *, vocabulary: Vocabulary = VOCABULARY):
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+      meta = json.load(f)
+    if meta["vocabulary"] != vocabulary.signature:
+      raise ValueError(f"{directory} was built with another vocabulary; rebuild it")
+    self.directory = directory
+    self.paths: List[str] = meta["paths"]
+    self.failed: Dict[str, str] = meta.get("failed", {})
+    self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+    size = int(self.offsets[-1])
+    dtype = np.dtype(meta["dtype"])
+    self.tokens = (
+      np.memmap(os.path.join(directory, "tokens.bin"), dtype=dtype, mode="r", shape=(size,))
+      if size else np.zeros(0, dtype=dtype)
+    )
+
+  def __len__(self) -> int:
+    return len(self.paths)
+
+  def __getitem__(self, index: int) -> np.ndarray:
+    return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+  @property
+  def lengths(self) -> np.ndarray:
+    return np.diff(self.offsets)
+
+  @staticmethod
+  def is_current(directory: str, *, vocabulary: Vocabulary = VOCABULARY) -> bool:
+    try:
+      with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        return json.load(f).get("vocabulary") == vocabulary.signature
+    except (OSError, ValueError):
+      return False
+
+  @classmethod
+  def build(cls, paths: Iterable[str], directory: str, *, vocabulary: Vocabulary = VOCABULARY) -> "TokenCorpus":
+    # Maps that cannot be tokenised are listed in `failed` with the error and left out.
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+      os.remove(meta_path)
+    kept: List[str] = []
+    failed: Dict[str, str] = {}
+    offsets = [0]
+    with open(os.path.join(directory, "tokens.bin"), "wb") as out:
+      for path in paths:
+        try:
+          stream = encode_file(path, vocabulary=vocabulary)
+        except (ValueError, IndexError) as error:
+          failed[path] = str(error)
+          continue
+        out.write(stream.astype(vocabulary.dtype, copy=False).tobytes())
+        kept.append(path)
+        offsets.append(offsets[-1] + len(stream))
+    np.save(os.path.join(directory, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    meta = {"vocabulary": vocabulary.signature, "dtype": vocabulary.dtype.name, "paths": kept, "failed": failed}
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+      json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return cls(directory, vocabulary=vocabulary)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(prog="python -m src.osu.tokenizer", description="Tokenise .osu files into a memmapped corpus.")
+  parser.add_argument("paths", nargs="+", help=".osu files or directories (searched recursively)")
+  parser.add_argument("--out", required=True, help="corpus directory")
+  parser.add_argument("--if-stale", action="store_true", help="only rebuild when the corpus was built with another vocabulary")
+  args = parser.parse_args(argv)
+
+  if args.if_stale and TokenCorpus.is_current(args.out):
+    corpus = TokenCorpus(args.out)
+    sys.stdout.write(json.dumps({"maps": len(corpus), "tokens": int(corpus.offsets[-1]), "rebuilt": False}) + "\n")
+    return 0
+  started = time.perf_counter()
+  corpus = TokenCorpus.build((path for root in args.paths for path in iter_beatmap_files(root)), args.out)
+  for path, error in corpus.failed.items():
+    sys.stderr.write(f"{path}: {error}\n")
+  sys.stdout.write(json.dumps({
+    "maps": len(corpus), "tokens": int(corpus.offsets[-1]), "failed": len(corpus.failed),
+    "seconds": round(time.perf_counter() - started, 3), "rebuilt": True,
+  }) + "\n")
+  return 1 if corpus.failed else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from typing import IO, Iterable, Iterator, List, Sequence, TYPE_CHECKING, Union
+from .columns import HitObjectColumns, format_object_params
+from .formatting import format_float, format_number
+from .hit_object import Circle, Slider, Spinner
+from .timing_point import TimingPoint
+
+if TYPE_CHECKING:
+  from .beatmap import Beatmap
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def format_timing_point(tp: TimingPoint) -> str:
+  return (
+    f"{format_number(tp.time)},{format_float(tp.beat_length)},{tp.meter},{tp.sample_set},"
+    f"{tp.sample_index},{tp.volume},{tp.uninherited},{tp.effects}"
+  )
+
+
+def format_hit_object(ho: Union[Circle, Slider, Spinner]) -> str:
+  fmt = format_number
+  params = format_object_params(ho)
+  if params:
+    return f"{fmt(ho.x)},{fmt(ho.y)},{fmt(ho.time)},{ho.type},{ho.hit_sound},{params},{ho.hit_sample}"
+  return f"{fmt(ho.x)},{fmt(ho.y)},{fmt(ho.time)},{ho.type},{ho.hit_sound},{ho.hit_sample}"
+
+
+def iter_chunks(lines: Iterable[str], newline: str = "\n", chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+  chunk: List[str] = []
+  for line in lines:
+    chunk.append(line)
+    if len(chunk) >= chunk_size:
+      yield newline.join(chunk) + newline
+      chunk = []
+  if chunk:
+    yield newline.join(chunk) + newline
+
+
+def iter_timing_point_lines(timing_points: Sequence[TimingPoint]) -> Iterator[str]:
+  return map(format_timing_point, timing_points)
+
+
+def iter_hit_object_lines(hit_objects: Union[HitObjectColumns, Sequence[Union[Circle, Slider, Spinner]]]) -> Iterator[str]:
+  if isinstance(hit_objects, HitObjectColumns):
+    return hit_objects.iter_lines()
+  return map(format_hit_object, hit_objects)
+
+
+def write_beatmap(beatmap: "Beatmap", file: Union[str, IO[str]], *, chunk_size: int = DEFAULT_CHUNK_SIZE):
+  if isinstance(file, str):
+    with open(file, "w", encoding="utf-8", newline="") as f:
+      f.writelines(beatmap.iter_text(chunk_size=chunk_size))
+  else:
+    file.writelines(beatmap.iter_text(chunk_size=chunk_size))
@@ -0,0 +1,31 @@
+import glob
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+from src.osu.difficulty.calculator import prepare_beatmap
+from src.osu.difficulty.skills import Aim, Speed
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+
+for path in paths:
+  beatmap = Beatmap(file_path=path)
+  exact = calculate_difficulty(beatmap)
+  approx = calculate_difficulty(beatmap, approximate=True)
+  assert abs(exact.star_rating - approx.star_rating) <= 0.03 * exact.star_rating, (path, exact.star_rating, approx.star_rating)
+  assert approx.speed_note_count == 0 and approx.aim_difficult_strain_count == 0 and approx.strains == []
+  assert approx.slider_factor == 1.0 and approx.max_combo == exact.max_combo
+
+  # The documented peak-truncation bound: 0 <= exact - approximate <= peak_error_bound().
+  objects = prepare_beatmap(beatmap).hit_objects
+  for make in (lambda: Aim([], include_sliders=True), lambda: Speed([])):
+    full, truncated = make(), make()
+    truncated.max_peaks = 20
+    truncated.record_object_strains = False
+    for obj in objects:
+      full.process(obj)
+      truncated.process(obj)
+    error = full.difficulty_value() - truncated.difficulty_value()
+    assert -1e-9 <= error <= truncated.peak_error_bound() + 1e-9, (path, error, truncated.peak_error_bound())
+    assert truncated.dropped_peaks or error == 0
+
+print(f"approximate ok: {len(paths)} maps")
@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+import tempfile
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+
+paths = ["dataset/test.osu", "dataset/new beginnings.osu"]
+combos = [[], ["DoubleTime", "HardRock"]]
+expected = {(path, tuple(mods)): calculate_difficulty(Beatmap(file_path=path), mods).star_rating for path in paths for mods in combos}
+
+
+def run(*args: str, stdin: str = "") -> subprocess.CompletedProcess:
+  return subprocess.run([sys.executable, "-m", "src.osu", *args], input=stdin, capture_output=True, text=True)
+
+
+with tempfile.TemporaryDirectory() as cache_dir:
+  for attempt in range(2):
+    # The second run is answered from the on-disk cache.
+    result = run(*paths, "--mods", "NoMod", "--mods", "DoubleTime,HardRock", "--workers", "2", "--order", "input", "--cache-dir", cache_dir, "--pp")
+    assert result.returncode == 0, result.stderr
+    rows = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(row["path"], row["mods"]) for row in rows] == [(path, mods) for path in paths for mods in combos]
+    for row in rows:
+      assert abs(row["star_rating"] - expected[(row["path"], tuple(row["mods"]))]) < 1e-9
+      assert row["pp"] > 0 and "strains" not in row
+
+result = run("--file-list", "-", "--format", "csv", "--threads", "--profile", stdin="dataset/test.osu\ndataset/missing.osu\n")
+assert result.returncode == 1
+rows = list(csv.DictReader(io.StringIO(result.stdout)))
+assert sorted(row["path"] for row in rows) == ["dataset/missing.osu", "dataset/test.osu"]
+assert next(row for row in rows if row["path"] == "dataset/missing.osu")["error"].startswith("FileNotFoundError")
+assert "skill.speed" in result.stderr
+
+result = run(*paths, "--stream", "--mods", "DoubleTime,HardRock", "--order", "input", "--workers", "1")
+assert result.returncode == 0, result.stderr
+for path, line in zip(paths, result.stdout.splitlines()):
+  assert abs(json.loads(line)["star_rating"] - expected[(path, ("DoubleTime", "HardRock"))]) < 1e-9
+assert run("dataset/test.osu", "--stream", "--strains").returncode == 2
+
+assert run("dataset/test.osu", "--mods", "DT").returncode == 2
+
+print("cli ok")
@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+import numpy as np
+
+from src.audio import load_features, save_features
+from src.audio.codec import FeatureCodec, reconstruction_error
+
+rng = np.random.default_rng(0)
+# Mel-like data: 64 bands of dB values with different ranges per band.
+data = (np.cumsum(rng.normal(size=(64, 5000)), axis=1) * np.linspace(0.2, 2.0, 64)[:, None] - 40).astype(np.float32)
+data = np.clip(data, -80, 0)
+
+with tempfile.TemporaryDirectory() as tmp:
+  for dtype in ("uint8", "float16"):
+    for per in ("map", "band"):
+      path = os.path.join(tmp, f"mel.{dtype}.{per}.npy")
+      codec = save_features(path, data, dtype=dtype, per=per, meta={"hop_length": 22})
+      features = load_features(path)
+      assert isinstance(features.codes, np.memmap) and features.codes.dtype == dtype
+      assert features.meta == {"hop_length": 22} and features.shape == data.shape
+
+      # Every value is within the codec's stated bound (plus float32 rounding).
+      decoded = features.to_array()
+      assert decoded.dtype == np.float32
+      bound = codec.max_error.reshape(-1, 1) if per == "band" else codec.max_error
+      assert np.all(np.abs(decoded - data) <= bound + 1e-4), (dtype, per)
+
+      # Slices decode lazily to the same values as the full array.
+      for key in [(slice(None), slice(1000, 1500)), (3,), (slice(10, 20), 7), (np.array([1, 5, 9]), slice(None, None, 7))]:
+        assert np.array_equal(features[key], decoded[key]), (dtype, per, key)
+      assert np.array_equal(features.frames(10, 20), decoded[:, 10:20])
+
+  # Per-band parameters are never worse than a single scale for the whole map.
+  errors = {}
+  for per in ("map", "band"):
+    codec = FeatureCodec.fit(data, per=per)
+    errors[per] = reconstruction_error(data, codec.decode(codec.encode(data)))
+  assert errors["band"]["rmse"] <= errors["map"]["rmse"]
+
+  # Constant bands survive.
+  flat = np.full((2, 10), -3.0, dtype=np.float32)
+  codec = FeatureCodec.fit(flat)
+  assert np.allclose(codec.decode(codec.encode(flat)), flat)
+
+print("codec ok")
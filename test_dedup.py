@@ -0,0 +1,83 @@
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.osu import HitObjectColumns
+from src.osu.dedup import MinHasher, main, assign_splits, find_clusters, fingerprint, normalised_hash, shingles, similarity
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+with open(paths[0], "r", encoding="utf-8") as f:
+  raw = f.read()
+
+# Line endings, whitespace, comments, [Editor] and IDs do not change the normalised hash.
+variant = raw.replace("\n", "\r\n").replace("BeatmapID:", "BeatmapID:1").replace("[Editor]", "[Editor]\r\nBookmarks: 1,2,3")
+assert normalised_hash("﻿// saved by hand\n" + variant) == normalised_hash(raw)
+head, objects = raw.split("[HitObjects]")
+edited = head + "[HitObjects]" + objects.replace("\n", "\n256,192,1,1,0,0:0:0:0:\n", 1)
+assert normalised_hash(edited) != normalised_hash(raw)
+
+# Shingles ignore the map's offset, so a shifted copy has the same signature.
+hasher = MinHasher()
+columns = HitObjectColumns.from_raw(objects)
+shifted = HitObjectColumns(x=columns.x, y=columns.y, time=[t + 37 for t in columns.time], type=columns.type)
+assert np.array_equal(hasher.signature(shingles(columns)), hasher.signature(shingles(shifted)))
+
+with tempfile.TemporaryDirectory() as tmp:
+  # The same map under another folder name, and a lightly edited copy (every 20th object dropped).
+  copy_dir = os.path.join(tmp, "renamed set")
+  os.makedirs(copy_dir)
+  exact = shutil.copy(paths[0], os.path.join(copy_dir, "copy.osu"))
+  lines = objects.strip().splitlines()
+  near = os.path.join(tmp, "near.osu")
+  with open(near, "w", encoding="utf-8") as f:
+    f.write(head.replace("Version:", "Version:edit ") + "[HitObjects]\n" + "\n".join(l for i, l in enumerate(lines) if i % 20 != 7) + "\n")
+
+  corpus = paths + [exact, near]
+  fingerprints = [fingerprint(path, hasher) for path in corpus]
+  by_path = {fp.path: fp for fp in fingerprints}
+  assert by_path[exact].normalised_hash == by_path[paths[0]].normalised_hash
+  assert similarity(by_path[near].signature, by_path[paths[0]].signature) > 0.6
+
+  clusters = find_clusters(fingerprints)
+  cluster_of = {path: c for c in clusters for path in c.paths}
+  assert sorted(p for c in clusters for p in c.paths) == sorted(corpus)
+  group = cluster_of[paths[0]]
+  assert exact in group.paths and near in group.paths and {"content", "near"} <= set(group.reasons)
+  # Difficulties of one set share the audio file; without audio grouping unrelated maps stay apart.
+  assert all(len(c.paths) == 1 or c.reasons for c in clusters)
+  apart = find_clusters(fingerprints, group_audio=False)
+  assert len(apart) >= len(clusters)
+  distinct = [fp for fp in fingerprints if fp.path in (paths[5], paths[13], paths[-1])]
+  assert all(similarity(a.signature, b.signature) < 0.2 for a in distinct for b in distinct if a is not b)
+
+  # Every cluster lands in one split, and the assignment is deterministic.
+  splits = assign_splits(clusters, {"train": 0.5, "val": 0.5})
+  assert all(len({splits[p] for p in c.paths}) == 1 for c in clusters)
+  assert splits == assign_splits(clusters, {"train": 0.5, "val": 0.5})
+  assert set(splits.values()) == {"train", "val"}
+
+# A map that cannot be parsed is listed under "failed"; the others still get a report and splits.
+with tempfile.TemporaryDirectory() as tmp:
+  healthy = shutil.copy(paths[0], os.path.join(tmp, "healthy.osu"))
+  first_object = objects.strip().splitlines()[0].split(",")
+  broken = os.path.join(tmp, "broken.osu")
+  with open(broken, "w", encoding="utf-8") as f:
+    f.write(head + "[HitObjects]" + objects.replace(",".join(first_object), ",".join(first_object[:2] + [first_object[2] + "x"] + first_object[3:]), 1))
+  report_path, splits_path = os.path.join(tmp, "report.json"), os.path.join(tmp, "splits.csv")
+  with contextlib.redirect_stderr(io.StringIO()) as stderr:
+    assert main([tmp, "--report", report_path, "--splits", splits_path, "--no-audio"]) == 0
+  assert broken in stderr.getvalue()
+  with open(report_path, "r", encoding="utf-8") as f:
+    report = json.load(f)
+  assert report["maps"] == 1 and report["failed"] == [broken]
+  with open(splits_path, "r", encoding="utf-8", newline="") as f:
+    assert [row["path"] for row in csv.DictReader(f)] == [healthy]
+
+print("dedup ok")
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.osu import Beatmap
+from src.osu.descriptors import (
+  FEATURES,
+  DescriptorStore,
+  NeighbourIndex,
+  balance_weights,
+  class_labels,
+  describe,
+  knn_labels,
+)
+from src.osu.difficulty import calculate_difficulty
+
+beatmap = Beatmap(file_path="dataset/test.osu")
+vector = describe(beatmap)
+assert vector.shape == (len(FEATURES),) and vector.dtype == np.float32
+for prefix in ("spacing_", "angle_", "rhythm_"):
+  assert abs(sum(v for name, v in zip(FEATURES, vector) if name.startswith(prefix)) - 1.0) < 1e-5, prefix
+# The attributes come from the same skills as calculate_difficulty.
+assert vector[FEATURES.index("star_rating")] == np.float32(calculate_difficulty(beatmap).star_rating)
+assert vector[FEATURES.index("star_rating")] != describe(beatmap, ["DoubleTime"])[FEATURES.index("star_rating")]
+
+with tempfile.TemporaryDirectory() as tmp:
+  corpus = os.path.join(tmp, "corpus")
+  shutil.copytree("dataset", corpus)
+  db = os.path.join(tmp, "descriptors.db")
+  with DescriptorStore(db) as store:
+    stats = store.update(corpus, max_workers=2)
+    assert stats["added"] == 21 and stats["failed"] == 0
+    paths, vectors = store.load()
+    assert vectors.shape == (21, len(FEATURES))
+    assert np.array_equal(vectors[paths.index(os.path.join(corpus, "test.osu"))], vector)
+
+    # Copies reuse the stored vector, edits are described again and removals pruned.
+    shutil.copy(os.path.join(corpus, "test.osu"), os.path.join(corpus, "copy.osu"))
+    with open(os.path.join(corpus, "new beginnings.osu"), "a", encoding="utf-8") as f:
+      f.write("\n256,192,999999,1,0,0:0:0:0:\n")
+    os.remove(os.path.join(corpus, "test.osu"))
+    assert store.update(corpus) == {"added": 1, "updated": 1, "unchanged": 19, "removed": 1, "failed": 0}
+    paths, vectors = store.load()
+    assert np.array_equal(vectors[paths.index(os.path.join(corpus, "copy.osu"))], vector)
+
+  # Another mod combination is stored alongside, without reusing NoMod descriptors.
+  with DescriptorStore(db, mods=["DoubleTime"]) as store:
+    assert len(store) == 0
+    assert store.update(os.path.join(corpus, "copy.osu"))["added"] == 1
+    assert not np.array_equal(store.load()[1][0], vector)
+
+  # Leave-one-out labels from the hand-labelled classes.
+  with DescriptorStore(db) as store:
+    paths, vectors = store.load()
+  index = NeighbourIndex(vectors, paths)
+  labels = class_labels(paths, os.path.join(corpus, "classes"))
+  assert sorted(set(labels), key=str) == [None, "jumps", "stream"]
+  predicted = knn_labels(index, labels, k=3)
+  assert all(p == l for (p, _), l in zip(predicted, labels) if l is not None)
+  assert all(p is not None for p, _ in predicted)
+  weights = balance_weights(labels)
+  assert abs(weights[[l == "jumps" for l in labels]].sum() - weights[[l == "stream" for l in labels]].sum()) < 1e-9
+
+# Exact search against brute force, and the inverted file against exact search.
+rng = np.random.default_rng(0)
+centres = rng.normal(size=(40, len(FEATURES))) * 4
+points = (centres[rng.integers(0, 40, 5000)] + rng.normal(size=(5000, len(FEATURES)))).astype(np.float32)
+queries = points[:50] + rng.normal(size=(50, len(FEATURES))).astype(np.float32) * 0.1
+exact = NeighbourIndex(points)
+distances, indices = exact.search(queries, 5)
+standard = exact.transform(points)
+brute = np.linalg.norm(exact.transform(queries)[:, None, :] - standard[None, :, :], axis=2)
+assert np.array_equal(indices[:, 0], brute.argmin(axis=1))
+assert np.allclose(distances, np.sort(brute, axis=1)[:, :5], rtol=1e-3, atol=1e-3)
+
+approximate = NeighbourIndex(points, lists=64)
+_, all_lists = approximate.search(queries, 5, probes=64)
+assert np.array_equal(all_lists, indices)
+_, probed = approximate.search(queries, 5, probes=8)
+assert np.mean([len(set(a) & set(b)) / 5 for a, b in zip(probed, indices)]) > 0.9
+assert all(i != 7 for i, _ in approximate.neighbours(7, 5))
+
+print("descriptors ok")
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+import numpy as np
+import soundfile
+
+from src.audio import FeatureBank, FeatureBundle, audio_to_mel_spectrogram
+
+sr = 22050
+t = np.arange(sr * 2) / sr
+# Quiet until 1 s, then a loud chord, so every envelope should jump there.
+y = np.where(t >= 1.0, 0.4 * (np.sin(2 * np.pi * 440 * t) + np.sin(2 * np.pi * 660 * t)), 0.001 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+bank = FeatureBank(hop_ms=5, mel_bands=(32, 80, 128), chroma=True)
+bundle = bank.compute(y, sr)
+
+frames = bundle.frame_count
+assert sorted(bundle.mels) == [32, 80, 128]
+assert all(S.shape == (n, frames) for n, S in bundle.mels.items())
+assert bundle.onset_strength.shape == bundle.spectral_flux.shape == bundle.rms.shape == (frames,)
+assert bundle.chroma.shape == (12, frames)
+
+onset_frame = int(round(1.0 * sr / bundle.hop_length))
+for envelope in (bundle.onset_strength, bundle.spectral_flux):
+  assert abs(int(np.argmax(envelope)) - onset_frame) <= 3
+assert bundle.rms[onset_frame + 10] > 100 * bundle.rms[onset_frame - 10]
+assert int(np.argmax(bundle.chroma[:, onset_frame + 10])) in (4, 9)  # E or A
+
+# The mel views are what audio_to_mel_spectrogram gives for the same settings.
+with tempfile.TemporaryDirectory() as tmp:
+  audio = os.path.join(tmp, "audio.wav")
+  soundfile.write(audio, y, sr, subtype="FLOAT")
+  for n_mels in (32, 128):
+    expected = audio_to_mel_spectrogram(audio, sr=sr, hop_ms=5, n_mels=n_mels)
+    assert np.allclose(bundle.mel_spec(n_mels).S_db, expected.S_db, atol=1e-3)
+    assert np.allclose(bundle.times, expected.times)
+
+  # One file per bundle, loaded back unchanged.
+  path = os.path.join(tmp, "bundle.npz")
+  bank.from_file(audio, sr=sr).save(path)
+  loaded = FeatureBundle.load(path)
+  assert loaded.meta["audio_path"] == audio and loaded.hop_length == bundle.hop_length
+  for n_mels in (32, 80, 128):
+    assert np.allclose(loaded.mels[n_mels], bundle.mels[n_mels], atol=1e-3)
+  assert np.allclose(loaded.chroma, bundle.chroma, atol=1e-4)
+
+print("features ok")
@@ -0,0 +1,40 @@
+import glob
+import math
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+from src.osu.difficulty.calculator import prepare_beatmap
+from src.osu.difficulty.evaluators import FlashlightEvaluator
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+
+for path in paths:
+  beatmap = Beatmap(file_path=path)
+  nomod = calculate_difficulty(beatmap)
+  flashlight = calculate_difficulty(beatmap, ["Flashlight"])
+  assert nomod.flashlight_difficulty == 0.0
+  assert flashlight.flashlight_difficulty > 0.0, path
+  assert flashlight.star_rating >= nomod.star_rating, path
+
+  objects = prepare_beatmap(beatmap, ["Flashlight"]).hit_objects
+  for obj in objects:
+    # Prefix sums give the same strain time spans as summing object by object.
+    running = 0.0
+    last = obj
+    for i in range(min(obj.index, FlashlightEvaluator.HISTORY_OBJECTS_MAX)):
+      running += last.strain_time
+      last = obj.previous(i)
+      assert math.isclose(obj.cumulative_strain_time - last.cumulative_strain_time, running, rel_tol=1e-12)
+
+    # Without any lookback only the slider bonus is left.
+    if obj.base_object.object_type != "Slider":
+      assert FlashlightEvaluator.evaluate(obj, False, history_objects=0) == 0.0
+
+  # Opacity is 0 once the object's start time has passed, and full between fade-in and hit.
+  base = objects[-1].base_object
+  assert FlashlightEvaluator.opacity_at(base, base.start_time + 1, False) == 0.0
+  assert FlashlightEvaluator.opacity_at(base, base.start_time - base.time_preempt, False) == 0.0
+  assert FlashlightEvaluator.opacity_at(base, base.start_time - base.time_preempt + base.time_fade_in, False) == 1.0
+  assert FlashlightEvaluator.opacity_at(base, base.start_time, True) == 0.0
+
+print(f"flashlight ok: {len(paths)} maps")
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+
+from src.osu import Beatmap, Circle, Slider, Spinner
+from src.osu.index import BeatmapIndex, bpm_stats, class_name_for, iter_beatmap_files, scan_header, split_header
+
+
+def end_time(obj) -> float:
+  return float(obj.object_params.end_time) if isinstance(obj, Spinner) else float(obj.time)
+
+
+with tempfile.TemporaryDirectory() as tmp:
+  corpus = os.path.join(tmp, "corpus")
+  shutil.copytree("dataset", corpus)
+  paths = [os.path.abspath(path) for path in iter_beatmap_files(corpus)]
+  beatmaps = {path: Beatmap(file_path=path) for path in paths}
+
+  for path, beatmap in beatmaps.items():
+    with open(path, "r", encoding="utf-8", newline="") as f:
+      sections, hit_objects = split_header(f.read())
+    assert hit_objects.strip() == beatmap.raw_section("HitObjects").strip(), path
+    assert len(sections["TimingPoints"].splitlines()) == len(beatmap.timing_points), path
+    header = scan_header(path)
+    objects = beatmap.hit_objects
+    assert (header.circle_count, header.slider_count, header.spinner_count) == (
+      sum(isinstance(obj, Circle) for obj in objects),
+      sum(isinstance(obj, Slider) for obj in objects),
+      sum(isinstance(obj, Spinner) for obj in objects),
+    ), path
+    assert header.ar == beatmap.difficulty.approach_rate and header.title == beatmap.metadata.title
+    assert header.first_object_time == objects[0].time and header.last_object_time == max(map(end_time, objects))
+
+  db = os.path.join(tmp, "index.sqlite")
+  with BeatmapIndex(db) as index:
+    assert index.update(corpus) == {"added": len(paths), "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    assert len(index) == len(paths) and index.query() == sorted(paths)
+
+    # Filters match the same maps as filtering the parsed beatmaps.
+    def main_bpm(beatmap: Beatmap) -> float:
+      return bpm_stats(beatmap.timing_points, max(map(end_time, beatmap.hit_objects)))[2]
+
+    expected = sorted(path for path, beatmap in beatmaps.items() if 9 <= float(beatmap.difficulty.approach_rate) <= 9.5)
+    assert index.query(ar=(9, 9.5)) == expected and expected
+    expected = sorted(path for path, beatmap in beatmaps.items() if main_bpm(beatmap) >= 180)
+    assert index.query(bpm=(180, None)) == expected
+    expected = sorted(path for path in paths if class_name_for(path) == "stream")
+    assert index.query(class_name="stream") == expected and expected
+    expected = sorted(
+      path for path, beatmap in beatmaps.items()
+      if class_name_for(path) in ("jumps", "stream") and float(beatmap.difficulty.approach_rate) >= 9
+    )
+    assert index.query(class_name=["jumps", "stream"], ar=(9, None)) == expected
+    assert index.query(class_name=None) == sorted(path for path in paths if class_name_for(path) is None)
+
+    touched, edited, deleted = paths[0], paths[1], paths[2]
+    stat = os.stat(touched)
+    os.utime(touched, (stat.st_atime + 10, stat.st_mtime + 10))
+    with open(edited, "r", encoding="utf-8", newline="") as f:
+      text = f.read()
+    ar_line = next(line for line in text.splitlines() if line.startswith("ApproachRate"))
+    with open(edited, "w", encoding="utf-8", newline="") as f:
+      f.write(text.replace(ar_line, "ApproachRate:3.5", 1))
+    os.remove(deleted)
+    added = os.path.join(corpus, "copy.osu")
+    shutil.copy(paths[3], added)
+
+    stats = index.update(corpus)
+    assert stats == {"added": 1, "updated": 1, "unchanged": len(paths) - 2, "removed": 1, "failed": 0}, stats
+    assert index.get(touched).mtime == os.stat(touched).st_mtime
+    assert index.get(edited).ar == 3.5 and index.query(ar=(3.5, 3.5)) == [edited]
+    assert index.get(deleted) is None and index.get(added).content_hash == index.get(paths[3]).content_hash
+
+  # A second run over the unchanged corpus reads nothing.
+  with BeatmapIndex(db) as index:
+    assert index.update(corpus) == {"added": 0, "updated": 0, "unchanged": len(paths), "removed": 0, "failed": 0}
+
+# A malformed hit object line is skipped; a map that cannot be parsed is counted as failed and
+# the rest of the run is still committed.
+with tempfile.TemporaryDirectory() as tmp:
+  source = sorted(iter_beatmap_files("dataset"))[0]
+  with open(source, "r", encoding="utf-8", newline="") as f:
+    text = f.read()
+  object_line = next(line for line in text.split("[HitObjects]", 1)[1].splitlines() if line.count(",") >= 4)
+  timing_line = next(line for line in text.split("[TimingPoints]", 1)[1].splitlines() if "," in line)
+  parts = object_line.split(",")
+  broken_objects = text.replace(object_line, ",".join(parts[:2] + [parts[2] + "x"] + parts[3:]), 1)
+  broken_timing = text.replace(timing_line, "x" + timing_line, 1)
+
+  healthy, broken_object, broken = (os.path.join(tmp, name) for name in ("healthy.osu", "object.osu", "timing.osu"))
+  for path, content in ((healthy, text), (broken_object, broken_objects), (broken, broken_timing)):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+      f.write(content)
+  assert scan_header(broken_object).object_count == scan_header(healthy).object_count - 1
+
+  with BeatmapIndex(os.path.join(tmp, "index.sqlite")) as index:
+    assert index.update(tmp) == {"added": 2, "updated": 0, "unchanged": 0, "removed": 0, "failed": 1}
+    assert index.query() == sorted(os.path.abspath(path) for path in (healthy, broken_object))
+
+    # A map that stops parsing is dropped instead of keeping its stale row.
+    with open(healthy, "w", encoding="utf-8", newline="") as f:
+      f.write(broken_timing + "\n")
+    assert index.update(tmp) == {"added": 0, "updated": 0, "unchanged": 1, "removed": 0, "failed": 2}
+    assert index.query() == [os.path.abspath(broken_object)]
+
+print("index ok:", len(paths), "maps")
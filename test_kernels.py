@@ -0,0 +1,51 @@
+import glob
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+from src.osu.difficulty.arrays import DifficultyArrays
+from src.osu.difficulty.backend import numba_available
+from src.osu.difficulty.calculator import prepare_beatmap
+from src.osu.difficulty.evaluators import AimEvaluator, FlashlightEvaluator, RhythmEvaluator, SpeedEvaluator
+from src.osu.difficulty.kernels import evaluate_aim, evaluate_flashlight, evaluate_rhythm, evaluate_speed
+
+TOLERANCE = 1e-9
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+mod_combos = [[], ["DoubleTime"], ["HardRock"], ["Easy", "HalfTime"], ["AutoPilot"], ["Flashlight", "Hidden"]]
+
+
+def close(a: float, b: float) -> bool:
+  return abs(a - b) <= TOLERANCE * max(1.0, abs(a))
+
+
+checked = 0
+for path in paths:
+  beatmap = Beatmap(file_path=path)
+  for mods in mod_combos:
+    prepared = prepare_beatmap(beatmap, mods)
+    objects = prepared.hit_objects
+    if not objects:
+      continue
+    arrays = DifficultyArrays.from_objects(objects)
+    # Per-object parity against the reference evaluators.
+    for name, kernel, reference in [
+      ("aim", evaluate_aim(arrays, True), lambda o: AimEvaluator.evaluate(o, True)),
+      ("aim_no_sliders", evaluate_aim(arrays, False), lambda o: AimEvaluator.evaluate(o, False)),
+      ("speed", evaluate_speed(arrays, prepared.mods), lambda o: SpeedEvaluator.evaluate(o, prepared.mods)),
+      ("rhythm", evaluate_rhythm(arrays), RhythmEvaluator.evaluate),
+      ("flashlight", evaluate_flashlight(arrays, False), lambda o: FlashlightEvaluator.evaluate(o, False)),
+      ("flashlight_hidden", evaluate_flashlight(arrays, True), lambda o: FlashlightEvaluator.evaluate(o, True)),
+    ]:
+      for obj in objects:
+        expected = reference(obj)
+        assert close(expected, kernel[obj.index]), (path, mods, name, obj.index, expected, kernel[obj.index])
+      checked += len(objects)
+
+    # And end to end, through the skills and aggregation.
+    python = calculate_difficulty(beatmap, mods, backend="python")
+    accelerated = calculate_difficulty(beatmap, mods, backend="numba" if numba_available() else "python")
+    for field in ("star_rating", "aim_difficulty", "speed_difficulty", "flashlight_difficulty", "slider_factor", "speed_note_count",
+                  "aim_difficult_strain_count", "speed_difficult_strain_count", "aim_difficult_slider_count"):
+      assert close(getattr(python, field), getattr(accelerated, field)), (path, mods, field)
+    assert all(close(a, b) for a, b in zip(python.strains, accelerated.strains))
+
+print(f"kernels ok ({'numba' if numba_available() else 'pure python'}): {checked} evaluations on {len(paths)} maps")
@@ -0,0 +1,79 @@
+import os
+import re
+import tempfile
+
+import numpy as np
+import soundfile
+
+from src.audio import FeatureBank, OffsetChecker, PCMStore
+from src.osu import Beatmap
+
+sr = 22050
+source = "dataset/lexycat - glitter  (thenoname) [Extra Glitter].osu"
+with open(source, "r", encoding="utf-8") as f:
+  raw = f.read()
+times = np.asarray(Beatmap(raw=raw).hit_object_columns().time, dtype=np.float64)
+times = times[times < 40000]
+
+# Audio with a noise burst at every hit object of the first 40 s, over a quiet tone.
+rng = np.random.default_rng(0)
+t = np.arange(sr * 41) / sr
+y = (0.05 * np.sin(2 * np.pi * 220.0 * t) + 0.02 * rng.normal(size=t.size)).astype(np.float32)
+burst = 2000
+for time in times:
+  i = int(time * sr / 1000)
+  y[i:i + burst] += (np.exp(-np.arange(burst) / 300) * rng.normal(size=burst))[:len(y) - i]
+
+
+def shifted(text, ms, audio="audio.wav"):
+  # Moves every hit object by `ms` and points the map at `audio`.
+  head, objects = text.split("[HitObjects]")
+  lines = [re.sub(r"^(\d+),(\d+),(\d+)", lambda m: f"{m[1]},{m[2]},{int(m[3]) + ms}", line) for line in objects.splitlines()]
+  head = re.sub(r"AudioFilename:.*", f"AudioFilename: {audio}", head)
+  return head + "[HitObjects]" + "\n".join(lines)
+
+
+with tempfile.TemporaryDirectory() as tmp:
+  soundfile.write(os.path.join(tmp, "audio.wav"), y, sr, subtype="FLOAT")
+  maps = {"a.osu": shifted(raw, 0), "b.osu": shifted(raw, 0), "c.osu": shifted(raw, 3), "late.osu": shifted(raw, -90), "lost.osu": shifted(raw, 0, "missing.mp3")}
+  for name, text in maps.items():
+    with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+      f.write(text)
+  paths = [os.path.join(tmp, name) for name in sorted(maps)]
+
+  store = PCMStore(os.path.join(tmp, "pcm"))
+  checker = OffsetChecker(os.path.join(tmp, "features"), bank=FeatureBank(hop_ms=5, mel_bands=(40,)), pcm_store=store)
+  results = {os.path.basename(r.path): r for r in checker.check_corpus(paths)}
+  assert store.stats()["decodes"] == 1
+
+  # The onset detector has a constant lag; it cancels in the comparison with the corpus median.
+  base = results["a.osu"].offset_ms
+  assert abs(base) < 30 and results["b.osu"].offset_ms == base
+  assert abs(results["c.osu"].offset_ms - (base - 3)) < 2.0
+  assert abs(results["late.osu"].offset_ms - (base + 90)) < 2.0
+  assert all(r.confidence > 0.3 for name, r in results.items() if name != "lost.osu")
+  assert [name for name, r in results.items() if r.flagged] == ["late.osu", "lost.osu"]
+  assert results["late.osu"].flags == ["offset"] and results["lost.osu"].flags == ["missing_audio"]
+
+  # Unrelated object times do not line up with the onsets.
+  envelope, frame_ms = checker.envelope(os.path.join(tmp, "audio.wav"))
+  from src.audio.offset import estimate_offset
+  _, confidence = estimate_offset(envelope, frame_ms, np.sort(rng.uniform(0, 40000, len(times))))
+  assert confidence < 0.1
+
+  # A second scan reads the cached features instead of decoding the audio again.
+  again = OffsetChecker(os.path.join(tmp, "features"), bank=FeatureBank(hop_ms=5, mel_bands=(40,)), pcm_store=PCMStore(os.path.join(tmp, "pcm")))
+  assert [r.offset_ms for r in again.check_corpus(paths)][:4] == [r.offset_ms for r in results.values()][:4]
+  assert again.pcm_store.stats() == {"decodes": 0, "hits": 0}
+
+  # A map that cannot be parsed is flagged on its own and the others are still checked.
+  broken = os.path.join(tmp, "broken.osu")
+  with open(broken, "w", encoding="utf-8") as f:
+    head, objects = maps["a.osu"].split("[HitObjects]")
+    f.write(head + "[HitObjects]" + re.sub(r"\n(\d+,\d+,\d+)", r"\n\1x", objects, count=1))
+  with_broken = again.check_corpus([broken] + paths)
+  assert with_broken[0].path == broken and with_broken[0].flags == ["parse_error"]
+  assert [r.offset_ms for r in with_broken[1:5]] == [r.offset_ms for r in results.values()][:4]
+  assert [os.path.basename(r.path) for r in with_broken if r.flagged] == ["broken.osu", "late.osu", "lost.osu"]
+
+print("offset ok")
@@ -0,0 +1,82 @@
+import glob
+import os
+import shutil
+import tempfile
+
+from src.osu.patterns import PatternIndex, Symbol, _read_map, parse_pattern, tokenize
+
+
+def brute_force(paths, pattern):
+  # Reference: scan every tokenised map.
+  elements = parse_pattern(pattern)
+  found = set()
+  for path in paths:
+    with open(path, "rb") as f:
+      symbols = tokenize(*_read_map(path, f.read()))
+    for start in range(len(symbols) - len(elements) + 1):
+      if all(element.matches(symbols[start + j:start + j + 1])[0] for j, element in enumerate(elements)):
+        found.add((path, start))
+  return found
+
+
+with tempfile.TemporaryDirectory() as tmp:
+  corpus = os.path.join(tmp, "corpus")
+  shutil.copytree("dataset", corpus)
+  paths = sorted(os.path.abspath(p) for p in glob.glob(os.path.join(corpus, "**", "*.osu"), recursive=True))
+
+  with PatternIndex(os.path.join(tmp, "patterns.db")) as index:
+    assert index.update(corpus) == {"added": len(paths), "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+
+    # Index queries (shorter, equal to and longer than n, with wildcards and alternatives) match a full scan.
+    for pattern in (
+      "* 1/4 1/4 *:jump|far 1/2:*:*:s",
+      "1/4 1/4 1/4 1/4 1/4 1/4 1/4",
+      "*:far",
+      "1/2:jump:back 1/2:jump:back",
+      "*:*:*:p",
+      "1/8:stack 1/8:stack 1/8:stack 1/8:stack 1/4:*:*:c",
+    ):
+      assert {(m.path, m.index) for m in index.query(pattern)} == brute_force(paths, pattern), pattern
+
+    # Every hit carries the start time of its first object.
+    match = index.query("1/4 1/4 1/4 1/4")[0]
+    with open(match.path, "rb") as f:
+      columns, red_lines = _read_map(match.path, f.read())
+    assert match.time == columns.time[match.index]
+    assert str(Symbol.decode(int(tokenize(columns, red_lines)[0]))).startswith("-:-:-:")
+
+    # A passage from the corpus finds itself first, at full score.
+    symbols = tokenize(columns, red_lines)[40:72]
+    best = index.similar(symbols, top_k=3)[0]
+    assert (best.path, best.index, best.score) == (match.path, 40, 1.0)
+
+    # Incremental updates: unchanged files are skipped, edits and removals replace postings.
+    assert index.update(corpus)["unchanged"] == len(paths)
+    os.remove(paths[0])
+    with open(paths[1], "a", encoding="utf-8") as f:
+      f.write("256,192,999999,1,0,0:0:0:0:\n")
+    assert index.update(corpus) == {"added": 0, "updated": 1, "unchanged": len(paths) - 2, "removed": 1, "failed": 0}
+    assert len(index) == len(paths) - 1
+    pattern = "* 1/4 1/4 *:jump|far 1/2:*:*:s"
+    assert {(m.path, m.index) for m in index.query(pattern)} == brute_force(paths[1:], pattern)
+
+  # The index persists on disk.
+  with PatternIndex(os.path.join(tmp, "patterns.db")) as index:
+    assert len(index) == len(paths) - 1 and index.query("*:far")
+
+    # A map without red lines is counted as failed and the rest of the update still lands.
+    with open(paths[1], "r", encoding="utf-8", newline="") as f:
+      text = f.read()
+    head, rest = text.split("[TimingPoints]", 1)
+    lines, tail = rest.split("[", 1)
+    inherited = [line.split(",") for line in lines.split() if "," in line]
+    for values in inherited:
+      values[1], values[6] = "-100", "0"
+    broken = os.path.join(corpus, "no red lines.osu")
+    with open(broken, "w", encoding="utf-8") as f:
+      f.write(head + "[TimingPoints]\n" + "\n".join(",".join(values) for values in inherited) + "\n\n[" + tail)
+    shutil.copy(paths[2], os.path.join(corpus, "copy.osu"))
+    assert index.update(corpus) == {"added": 1, "updated": 0, "unchanged": len(paths) - 1, "removed": 0, "failed": 1}
+    assert len(index) == len(paths) and os.path.abspath(broken) not in {m.path for m in index.query("*:far")}
+
+print("patterns ok")
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+import librosa
+import numpy as np
+import soundfile
+
+from src.audio import PCMStore, audio_to_mel_spectrogram
+
+sr = 22050
+rng = np.random.default_rng(0)
+t = np.arange(sr * 3) / 44100
+y = (0.3 * np.sin(2 * np.pi * 330.0 * t) + 0.05 * rng.normal(size=t.size)).astype(np.float32)
+
+with tempfile.TemporaryDirectory() as tmp:
+  audio = os.path.join(tmp, "audio.wav")
+  soundfile.write(audio, y, 44100, subtype="FLOAT")
+  # A second difficulty of the same set pointing at a copy of the same bytes.
+  copy = os.path.join(tmp, "copy.wav")
+  with open(audio, "rb") as src, open(copy, "wb") as dst:
+    dst.write(src.read())
+
+  store = PCMStore(os.path.join(tmp, "pcm"))
+  expected, _ = librosa.load(audio, sr=sr)
+  loaded, loaded_sr = store.load(audio, sr=sr)
+  assert loaded_sr == sr and isinstance(loaded, np.memmap) and np.array_equal(loaded, expected)
+  assert store.stats() == {"decodes": 1, "hits": 0}
+
+  # Offset/duration are slices of the cached decode, and identical content is not decoded again.
+  part, _ = store.load(copy, sr=sr, offset=0.5, duration=1.0)
+  assert isinstance(part, np.memmap) and np.array_equal(part, expected[int(0.5 * sr):int(1.5 * sr)])
+  assert store.stats() == {"decodes": 1, "hits": 1}
+
+  # Another sample rate is its own entry.
+  store.load(audio, sr=16000)
+  assert store.stats()["decodes"] == 2
+
+  # sr=None is the native rate, resolved before decoding and sharing the explicit rate's entry.
+  native, native_sr = store.load(audio, sr=None, offset=1.0)
+  reference, _ = librosa.load(audio, sr=None, offset=1.0)
+  assert native_sr == 44100 and np.array_equal(native, reference)
+  assert os.path.exists(store.path_for(store._hash(audio), 44100, True))
+  decodes = store.stats()["decodes"]
+  store.load(copy, sr=44100)
+  assert store.stats()["decodes"] == decodes
+
+  # int16 halves the size and stays within one quantisation step.
+  compact = PCMStore(os.path.join(tmp, "pcm16"), dtype="int16")
+  y16, _ = compact.load(audio, sr=sr)
+  assert y16.dtype == np.float32 and np.max(np.abs(y16 - expected)) <= 1.0 / 32767
+
+  spec = audio_to_mel_spectrogram(audio, sr=sr, hop_ms=5, pcm_store=store)
+  direct = audio_to_mel_spectrogram(audio, sr=sr, hop_ms=5)
+  assert np.array_equal(spec.S_db, direct.S_db)
+
+print("pcm ok")
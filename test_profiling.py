@@ -0,0 +1,64 @@
+import glob
+
+import numpy as np
+
+from src.osu import Beatmap
+from src.osu.difficulty import DifficultyProfiler, calculate_difficulty
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))[:6]
+beatmaps = [Beatmap(file_path=path) for path in paths]
+mods = ["DoubleTime", "HardRock"]
+
+
+def profile(maps) -> DifficultyProfiler:
+  profiler = DifficultyProfiler()
+  for beatmap in maps:
+    attributes = calculate_difficulty(beatmap, mods, profiler=profiler, backend="python")
+    # Profiling only observes: the attributes are those of an unprofiled run.
+    assert attributes == calculate_difficulty(beatmap, mods, backend="python"), beatmap.file_path
+  return profiler
+
+
+first, second = profile(beatmaps[:3]), profile(beatmaps[3:])
+both = profile(beatmaps)
+assert [record.label for record in both.records] == paths
+
+# Per-stage counts: objects per stage and one call per map.
+summary = both.summary()
+objects = [len(beatmap.hit_objects) for beatmap in beatmaps]
+assert summary["mods"]["objects"] == len(mods) * len(paths)
+assert summary["stacking"]["objects"] == summary["difficulty_objects"]["objects"] == sum(objects)
+for name in ("preprocessing", "skill.aim", "skill.aim_no_sliders", "skill.speed"):
+  assert summary[name]["calls"] == len(paths) and summary[name]["objects"] == sum(n - 1 for n in objects), name
+assert "skill.flashlight" not in summary and summary["total"]["calls"] == len(paths)
+
+# Percentiles agree with numpy's linear interpolation.
+for name, stats in summary.items():
+  samples = [record.total_seconds for record in both.records] if name == "total" else both.stage_seconds(name)
+  for q in (50, 90, 99):
+    assert np.isclose(stats[f"p{q}"], np.percentile(samples, q), rtol=0, atol=1e-12), (name, q)
+  assert np.isclose(stats["mean"], np.mean(samples)) and stats["max"] == max(samples)
+
+# Merging two profilers gives the same aggregates as one profiler over both batches.
+merged = DifficultyProfiler()
+merged.merge(first.records)
+merged.merge(second.records)
+assert merged.stage_names() == both.stage_names()
+merged_summary = merged.summary()
+for name, stats in summary.items():
+  assert {key: merged_summary[name][key] for key in ("calls", "objects")} == {key: stats[key] for key in ("calls", "objects")}, name
+  samples = [*first.stage_seconds(name), *second.stage_seconds(name)] if name != "total" else [
+    record.total_seconds for record in [*first.records, *second.records]
+  ]
+  assert np.isclose(merged_summary[name]["p90"], np.percentile(samples, 90), rtol=0, atol=1e-12), name
+for name in ("total", "skill.speed"):
+  counts = [a + b for (_, a), (_, b) in zip(first.histogram(name), second.histogram(name))]
+  assert [count for _, count in merged.histogram(name)] == counts
+  assert sum(counts) == len(paths)
+
+slowest = merged.slowest(3, "skill.aim")
+assert len(slowest) == 3 and slowest[0].seconds("skill.aim") == max(merged.stage_seconds("skill.aim"))
+assert [r.total_seconds for r in merged.slowest(len(paths))] == sorted((r.total_seconds for r in merged.records), reverse=True)
+assert merged.format_summary().splitlines()[0].startswith("stage")
+
+print("profiling ok:", len(paths), "maps")
@@ -0,0 +1,70 @@
+import glob
+import os
+import tempfile
+
+import numpy as np
+import soundfile
+
+from src.audio import audio_to_mel_spectrogram
+from src.audio.rate import RateFeatures, resample_frames
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+
+# Rate-modded audio features from a single STFT.
+sr = 22050
+t = np.arange(int(sr * 2.0)) / sr
+y = (0.5 * np.sin(2 * np.pi * 440.0 * t) * (t < 1.0)).astype(np.float32)  # 1 s of A4, then silence
+
+features = RateFeatures(y, sr, hop_ms=5, n_mels=64)
+with tempfile.TemporaryDirectory() as tmp:
+  path = os.path.join(tmp, "tone.wav")
+  soundfile.write(path, y, sr, subtype="FLOAT")
+  decoded = audio_to_mel_spectrogram(path, sr=sr, hop_ms=5, n_mels=64)
+assert np.allclose(features.spectrogram().S_db, decoded.S_db, atol=1e-3)
+
+nomod = features.spectrogram()
+doubletime = features.spectrogram(["DoubleTime"])
+halftime = features.spectrogram(["HalfTime"])
+nightcore = features.spectrogram(["NightCore"])
+assert features.spectrogram(["DoubleTime"]) is doubletime
+
+frames = nomod.S_db.shape[1]
+assert doubletime.S_db.shape[1] == int(np.ceil(frames / 1.5)) == nightcore.S_db.shape[1]
+assert halftime.S_db.shape[1] == int(np.ceil(frames / 0.75))
+
+
+def peak_hz(spec, time_s):
+  frame = int(time_s * 1000 / spec.frame_duration_ms)
+  return spec.freqs[np.argmax(spec.S_db[:, frame])]
+
+
+def tone_end_s(spec):
+  loud = spec.S_db.max(axis=0) > spec.S_db.max() - 20
+  return np.nonzero(loud)[0][-1] * spec.frame_duration_ms / 1000
+
+
+# DT/HT keep the pitch and scale time; NC scales both.
+assert abs(peak_hz(doubletime, 0.3) - peak_hz(nomod, 0.3)) < 1e-6
+assert abs(peak_hz(halftime, 0.3) - peak_hz(nomod, 0.3)) < 1e-6
+assert 1.35 < peak_hz(nightcore, 0.3) / peak_hz(nomod, 0.3) < 1.65
+assert abs(tone_end_s(doubletime) - tone_end_s(nomod) / 1.5) < 0.02
+assert abs(tone_end_s(halftime) - tone_end_s(nomod) / 0.75) < 0.02
+
+features.release_stft()
+assert features.spectrogram(["NightCore"]) is nightcore
+assert np.array_equal(resample_frames(nomod.S_db, 1.0), nomod.S_db)
+
+# The beatmap baked at the same rate rates like the map played with the mod.
+for path in sorted(glob.glob("dataset/classes/**/*.osu", recursive=True))[:4]:
+  beatmap = Beatmap(file_path=path)
+  for rate, mods in ((1.5, ["DoubleTime"]), (0.75, ["HalfTime"])):
+    modded = calculate_difficulty(beatmap, mods)
+    baked = calculate_difficulty(Beatmap(raw=str(beatmap.with_clock_rate(rate))))
+    for field in ("star_rating", "aim_difficulty", "speed_difficulty", "approach_rate", "overall_difficulty"):
+      assert abs(getattr(modded, field) - getattr(baked, field)) <= 1e-9 * max(1.0, getattr(modded, field)), (path, mods, field)
+    assert beatmap.with_clock_rate(rate).hit_objects[-1].time == beatmap.hit_objects[-1].time / rate
+
+beatmap = Beatmap(file_path="dataset/test.osu")
+assert calculate_difficulty(beatmap).approach_rate == beatmap.difficulty.approach_rate
+
+print("rate ok")
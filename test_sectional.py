@@ -0,0 +1,42 @@
+import glob
+import math
+import random
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty, calculate_sectional_difficulty
+from src.osu.difficulty.sectional import PeakRangeIndex, kiai_ranges
+from src.osu.timing_point import TimingPoint
+
+random.seed(7)
+
+# The tree's top-k per range matches sorting the slice.
+peaks = [random.choice([0.0, random.random() * 100]) for _ in range(517)]
+index = PeakRangeIndex(peaks, k=40)
+for _ in range(200):
+  start, stop = sorted(random.sample(range(len(peaks) + 1), 2))
+  expected = sorted((p for p in peaks[start:stop] if p > 0), reverse=True)[:40]
+  assert index.top(start, stop) == expected
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+for path in paths:
+  beatmap = Beatmap(file_path=path)
+  for mods in ([], ["DoubleTime", "Flashlight"]):
+    full = calculate_difficulty(beatmap, mods)
+    sectional = calculate_sectional_difficulty(beatmap, mods)
+    exact = calculate_sectional_difficulty(beatmap, mods, top_k=10 ** 9)
+
+    # The whole map reproduces calculate_difficulty.
+    whole = sectional.rating(-math.inf, math.inf)
+    assert abs(whole.star_rating - full.star_rating) <= 1e-9 * max(1.0, full.star_rating), (path, mods)
+    assert abs(whole.aim_difficulty - full.aim_difficulty) <= 1e-9 * max(1.0, full.aim_difficulty)
+
+    # Windows tile the sections exactly and agree with the untruncated peaks.
+    windows = sectional.sliding(30000)
+    assert sum(w.section_count for w in windows) == sectional.section_count
+    for window, reference in zip(sectional.sliding(30000, 5000), exact.sliding(30000, 5000)):
+      assert abs(window.star_rating - reference.star_rating) <= 1e-9 * max(1.0, reference.star_rating)
+    assert all(w.star_rating <= whole.star_rating + 1e-9 for w in windows)
+
+assert kiai_ranges([TimingPoint(time=0, effects=0), TimingPoint(time=1000, effects=1), TimingPoint(time=5000, effects=0), TimingPoint(time=9000, effects=1)], 12000) == [(1000, 5000), (9000, 12000)]
+
+print(f"sectional ok: {len(paths)} maps")
@@ -0,0 +1,68 @@
+import glob
+import os
+import pickle
+import tempfile
+
+from src.osu import Beatmap
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+
+
+def read(path: str) -> str:
+  with open(path, "r", encoding="utf-8", newline="") as f:
+    return f.read()
+
+
+for path in paths:
+  raw = read(path)
+  beatmap = Beatmap(file_path=path)
+  # Untouched maps are written back byte for byte, without parsing any section.
+  assert str(beatmap) == raw, path
+  assert not any(beatmap.is_parsed(name) for name in beatmap.sections), path
+
+path = "dataset/test.osu"
+raw = read(path)
+beatmap = Beatmap(file_path=path)
+assert {"Editor", "Metadata", "Events", "Colours"} <= set(beatmap.sections)
+assert str(beatmap) == raw
+
+# Editing one lazily parsed section rewrites only that section.
+start, _, end = beatmap._section_spans["Metadata"]
+original_title = beatmap.metadata.title
+beatmap.metadata.title = "Edited title"
+assert beatmap.is_parsed("Metadata") and not beatmap.is_parsed("HitObjects")
+edited = str(beatmap)
+assert edited.startswith(raw[:start]) and edited.endswith(raw[end:])
+assert "Edited title" in edited and edited != raw
+for name in ("General", "Editor", "Events", "Colours", "TimingPoints", "HitObjects"):
+  assert beatmap.raw_section(name) in edited, name
+reloaded = Beatmap(raw=edited)
+assert reloaded.metadata.title == "Edited title"
+assert len(reloaded.hit_objects) == len(Beatmap(file_path=path).hit_objects)
+
+# reset_section drops the edit and the original text comes back.
+beatmap.reset_section("Metadata")
+assert not beatmap.is_parsed("Metadata")
+assert str(beatmap) == raw and beatmap.metadata.title == original_title
+
+with tempfile.TemporaryDirectory() as tmp:
+  target = os.path.join(tmp, "saved.osu")
+  Beatmap(file_path=path).save(target)
+  assert read(target) == raw
+  beatmap = Beatmap(file_path=path)
+  beatmap.metadata.title = "Edited title"
+  beatmap.save(target, chunk_size=7)
+  assert read(target) == edited
+
+# A partly parsed map survives pickling: parsed sections keep their edits, the rest stays lazy.
+beatmap = Beatmap(file_path=path)
+beatmap.general
+beatmap.metadata.title = "Edited title"
+clone = pickle.loads(pickle.dumps(beatmap))
+assert clone.is_parsed("General") and clone.is_parsed("Metadata") and not clone.is_parsed("HitObjects")
+assert str(clone) == str(beatmap)
+assert len(clone.hit_objects) == len(Beatmap(file_path=path).hit_objects)
+with clone._lock:
+  pass
+
+print("sections ok:", len(paths), "maps")
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty, calculate_performance
+from src.osu.difficulty.cache import AttributeCache
+from src.osu import server as server_module
+from src.osu.server import DifficultyHTTPServer, DifficultyService
+
+PATH = "dataset/test.osu"
+with open(PATH, "r", encoding="utf-8", newline="") as f:
+  content = f.read()
+
+combos = [[], ["DoubleTime"], ["HardRock"], ["HardRock", "DoubleTime"]]
+expected = {tuple(mods): calculate_difficulty(Beatmap(file_path=PATH), mods) for mods in combos}
+
+
+def post(url: str, payload: dict):
+  request = urllib.request.Request(url + "/difficulty", json.dumps(payload).encode(), {"Content-Type": "application/json"})
+  try:
+    with urllib.request.urlopen(request) as response:
+      return response.status, json.loads(response.read())
+  except urllib.error.HTTPError as e:
+    return e.code, json.loads(e.read())
+
+
+def get(url: str, path: str):
+  with urllib.request.urlopen(url + path) as response:
+    return json.loads(response.read())
+
+
+def start(service: DifficultyService):
+  server = DifficultyHTTPServer(("127.0.0.1", 0), service)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# Worker processes, concurrent requests for the same map coalesced into one worker call.
+service = DifficultyService(workers=2, batch_window=0.2)
+server, url = start(service)
+try:
+  with ThreadPoolExecutor(len(combos)) as pool:
+    responses = list(pool.map(lambda mods: post(url, {"content": content, "mods": mods}), combos))
+  for mods, (status, body) in zip(combos, responses):
+    assert status == 200, body
+    result = body["results"][0]["difficulty"]
+    assert abs(result["star_rating"] - expected[tuple(mods)].star_rating) < 1e-9, (mods, result["star_rating"])
+    assert "strains" not in result
+
+  metrics = get(url, "/metrics")
+  assert metrics["worker_calls"] == 1, metrics
+  assert metrics["computed"] == len(combos), metrics
+
+  # Cached now, regardless of mod order; paths and performance work too.
+  status, body = post(url, {"path": PATH, "mod_combos": [["DoubleTime", "HardRock"]], "performance": {"accuracy": 0.98}, "strains": True})
+  assert status == 200, body
+  entry = body["results"][0]
+  assert entry["difficulty"]["strains"] == list(expected[("HardRock", "DoubleTime")].strains)
+  expected_pp = calculate_performance(expected[("HardRock", "DoubleTime")], accuracy=0.98).pp
+  assert abs(entry["performance"]["pp"] - expected_pp) < 1e-9
+
+  metrics = get(url, "/metrics")
+  assert metrics["worker_calls"] == 1 and metrics["cache"]["hits"] >= 1, metrics
+  assert metrics["latency_ms"]["samples"] == len(combos) + 1
+
+  status, body = post(url, {"mods": ["DoubleTime"]})
+  assert status == 400, body
+  status, body = post(url, {"content": content, "mods": ["DT"]})
+  assert status == 400, body
+finally:
+  server.shutdown()
+  server.server_close()
+  service.close()
+
+# No batch window by default: a cold request is dispatched without waiting, and metrics can be
+# read while requests land.
+service = DifficultyService(executor=ThreadPoolExecutor(2), cache=AttributeCache())
+sleeps = []
+real_sleep = server_module.time.sleep
+server_module.time.sleep = lambda seconds: (sleeps.append(seconds), real_sleep(seconds))
+try:
+  with ThreadPoolExecutor(4) as pool:
+    requests = [pool.submit(service.difficulty, content, [mods]) for mods in combos]
+    while not all(request.done() for request in requests):
+      service.metrics()
+    for mods, request in zip(combos, requests):
+      assert request.result()[1][0].star_rating == expected[tuple(mods)].star_rating
+  assert service.batch_window == 0 and sleeps == []
+  assert service.metrics()["latency_ms"]["samples"] == len(combos)
+finally:
+  server_module.time.sleep = real_sleep
+  service.close()
+  service.executor.shutdown()
+
+# A cache that cannot be written still serves the result, and a worker result that cannot be
+# turned into attributes fails every request in the group instead of leaving them waiting.
+class ReadOnlyCache(AttributeCache):
+  def put(self, digest, mods, attributes, **kwargs):
+    raise OSError("read-only file system")
+
+
+service = DifficultyService(executor=ThreadPoolExecutor(1), cache=ReadOnlyCache(), timeout=5.0)
+real_compute = server_module._compute
+try:
+  _, (attributes,) = service.difficulty(content, [["HardRock"]])
+  assert attributes.star_rating == expected[("HardRock",)].star_rating
+  server_module._compute = lambda raw, mod_combos: [{"unknown": 0} for _ in mod_combos]
+  started = time.monotonic()
+  try:
+    service.difficulty(content, [[], ["DoubleTime"]])
+  except TypeError:
+    pass
+  else:
+    raise AssertionError("a malformed worker result should fail the request")
+  assert time.monotonic() - started < service.timeout
+  assert service.metrics()["errors"] == 1 and not service._inflight
+finally:
+  server_module._compute = real_compute
+  service.close()
+  service.executor.shutdown()
+
+# Backpressure: with one slot taken, the next request is rejected with 503.
+service = DifficultyService(executor=ThreadPoolExecutor(1), cache=AttributeCache(), max_pending=1, batch_window=0.5)
+server, url = start(service)
+try:
+  slow = threading.Thread(target=post, args=(url, {"content": content}))
+  slow.start()
+  while service.counters["pending"] == 0:
+    pass
+  status, body = post(url, {"content": content, "mods": ["HardRock"]})
+  assert status == 503, (status, body)
+  slow.join()
+  assert get(url, "/metrics")["rejected"] == 1
+finally:
+  server.shutdown()
+  server.server_close()
+  service.close()
+  service.executor.shutdown()
+
+print("server ok")
@@ -0,0 +1,51 @@
+import glob
+
+import numpy as np
+
+from src.osu import Beatmap, TimingPoint
+from src.osu.snapping import DIVISORS, RedLines, analyse_snaps, beatmap_snaps, snap_histograms, snap_times
+
+# 120 BPM from 1000 ms, 150 BPM from 9000 ms (an inherited point in between must be ignored).
+red_lines = RedLines.from_timing_points([
+  TimingPoint(time=1000, beat_length=500, uninherited=1),
+  TimingPoint(time=5000, beat_length=-50, uninherited=0),
+  TimingPoint(time=9000, beat_length=400, uninherited=1),
+])
+assert list(red_lines.time) == [1000.0, 9000.0]
+
+times = np.array([1000, 1250, 1500 + 500 / 3, 1125, 1000 + 500 / 12, 9100, 9000 + 400 / 16, 1007, 500])
+result = analyse_snaps(times, red_lines)
+assert list(result.divisor[:7]) == [1, 2, 3, 4, 12, 4, 16]
+assert list(result.red_line) == [0, 0, 0, 0, 0, 1, 1, 0, 0]
+assert result.snapped[:7].all() and not result.snapped[7]
+assert np.allclose(result.error[:7], 0.0)
+# 7 ms past the red line is off every grid; its nearest tick is the downbeat itself.
+assert result.divisor[7] == 1 and abs(result.error[7] - 7.0) < 1e-9 and result.snapped_time[7] == 1000.0
+# Before the first red line the first one extends backwards.
+assert result.snapped[8] and result.divisor[8] == 1 and result.beat[8] == -1.0
+
+# Whole milliseconds (as stored in .osu files) still snap within the default tolerance.
+rounded = analyse_snaps(np.rint(times[:7]), red_lines)
+assert rounded.snapped.all() and list(rounded.divisor) == list(result.divisor[:7])
+
+# In-place snapping onto a fixed grid, and onto the simplest divisor.
+generated = np.array([1010.0, 1260.0, 1390.0, 9095.0])
+snap_times(generated, red_lines, divisors=(4,), out=generated)
+assert np.allclose(generated, [1000.0, 1250.0, 1375.0, 9100.0])
+assert np.allclose(snap_times(np.array([1130.0, 1000 + 500 / 3 + 0.4]), red_lines, round_ms=True), [1125.0, 1167.0])
+kept = snap_times(np.array([1007.0, 1126.0]), red_lines, tolerance_ms=2.0)
+assert np.allclose(kept, [1007.0, 1125.0])
+
+histogram = result.histogram()
+assert histogram.sum() == len(times) and histogram[-1] == (~result.snapped).sum()
+
+# Dataset maps are snapped almost everywhere; bulk histograms match per-map ones.
+maps = [Beatmap(file_path=path) for path in sorted(glob.glob("dataset/**/*.osu", recursive=True))]
+per_map = [beatmap_snaps(beatmap) for beatmap in maps]
+bulk = snap_histograms((beatmap.hit_object_columns().time, RedLines.from_beatmap(beatmap)) for beatmap in maps)
+assert bulk.shape == (len(maps), len(DIVISORS) + 1)
+for row, snaps in zip(bulk, per_map):
+  assert np.array_equal(row, snaps.histogram())
+  assert snaps.snapped.mean() > 0.98
+
+print("snapping ok")
@@ -0,0 +1,87 @@
+import glob
+import os
+import tempfile
+import tracemalloc
+from dataclasses import asdict
+
+from src.osu import Beatmap, BeatmapStream
+from src.osu.difficulty import calculate_difficulty, calculate_difficulty_streaming
+from src.osu.difficulty.streaming import WINDOW, RollingObjects
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+for path in paths:
+  beatmap = Beatmap(file_path=path)
+  stream = BeatmapStream(path)
+  assert [str(tp) for tp in stream.iter_timing_points()] == [str(tp) for tp in beatmap.timing_points], path
+  for mods in ([], ["DoubleTime", "HardRock"], ["Easy", "Flashlight"]):
+    expected = asdict(calculate_difficulty(beatmap, mods, backend="python"))
+    streamed = asdict(calculate_difficulty_streaming(stream, mods))
+    assert streamed.pop("strains") == [] and expected.pop("strains")
+    assert streamed == expected, (path, mods)
+
+window = RollingObjects(3)
+for i in range(5):
+  window.append(i)
+assert len(window) == 5 and window[4] == 4 and window[2] == 2
+try:
+  window[1]
+except IndexError:
+  pass
+else:
+  raise AssertionError("evicted objects should not be readable")
+assert WINDOW >= 34
+
+
+def marathon(source: str, target: str, copies: int):
+  # The same map played back to back: every copy shifted by the map's length.
+  beatmap = Beatmap(file_path=source)
+  span = max(obj.time for obj in beatmap.hit_objects) + 2000
+  with open(source, encoding="utf-8") as f:
+    head = f.read().partition("[TimingPoints]")[0]
+  with open(target, "w", encoding="utf-8") as f:
+    f.write(head + "[TimingPoints]\n")
+    for k in range(copies):
+      for line in beatmap.raw_section("TimingPoints").split():
+        values = line.split(",")
+        f.write(",".join([str(float(values[0]) + k * span), *values[1:]]) + "\n")
+    f.write("\n[HitObjects]\n")
+    for k in range(copies):
+      for line in beatmap.raw_section("HitObjects").split():
+        values = line.split(",")
+        values[2] = str(int(values[2]) + k * span)
+        if int(values[3]) & 8:
+          values[5] = str(int(values[5]) + k * span)
+        f.write(",".join(values) + "\n")
+
+
+def peak_memory(fn):
+  tracemalloc.start()
+  try:
+    return fn(), tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+with tempfile.TemporaryDirectory() as tmp:
+  path = os.path.join(tmp, "marathon.osu")
+  marathon("dataset/test.osu", path, 12)
+  streamed, streamed_peak = peak_memory(lambda: calculate_difficulty_streaming(path))
+  expected, full_peak = peak_memory(lambda: calculate_difficulty(Beatmap(file_path=path), backend="python"))
+  assert streamed.max_combo == expected.max_combo == 12 * len(Beatmap(file_path="dataset/test.osu").hit_objects)
+  assert streamed.star_rating == expected.star_rating
+  assert streamed_peak * 5 < full_peak, (streamed_peak, full_peak)
+
+  shuffled = os.path.join(tmp, "shuffled.osu")
+  with open("dataset/test.osu", encoding="utf-8") as f:
+    head, _, objects = f.read().partition("[HitObjects]")
+  lines = objects.split()
+  with open(shuffled, "w", encoding="utf-8") as f:
+    f.write(head + "[HitObjects]\n" + "\n".join([lines[1], lines[0], *lines[2:]]) + "\n")
+  try:
+    calculate_difficulty_streaming(shuffled)
+  except ValueError:
+    pass
+  else:
+    raise AssertionError("out-of-order hit objects should be rejected")
+
+print("streaming ok:", len(paths), "maps")
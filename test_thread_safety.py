@@ -0,0 +1,64 @@
+import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.osu import Beatmap, Circle, Slider, Spinner, SliderCurve, SliderObjectParams
+from src.osu.difficulty import calculate_difficulty, calculate_difficulty_batch, iter_difficulty_batch
+
+# Constructors must not share mutable defaults between instances.
+a, b = Circle(), Circle()
+assert a.hit_sample is not b.hit_sample
+assert Slider().object_params is not Slider().object_params
+assert Spinner().object_params is not Spinner().object_params
+assert SliderCurve().curve_points is not SliderCurve().curve_points
+p1, p2 = SliderObjectParams(), SliderObjectParams()
+assert p1.curves is not p2.curves and p1.edge_sounds is not p2.edge_sounds and p1.edge_sets is not p2.edge_sets
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+mod_combos = [None, ["DoubleTime", "HardRock"]]
+THREADS = 4
+
+expected = {
+  (path, idx): calculate_difficulty(Beatmap(file_path=path), mods)
+  for path in paths for idx, mods in enumerate(mod_combos)
+}
+
+# Shared, not-yet-parsed beatmaps hammered from many threads at once, so lazy section
+# parsing races with the difficulty calculation.
+def parsed_text(path: str) -> str:
+  beatmap = Beatmap(file_path=path)
+  beatmap.general, beatmap.difficulty, beatmap.timing_points, beatmap.hit_objects
+  return str(beatmap)
+
+parsed = {path: parsed_text(path) for path in paths}
+
+shared = {path: Beatmap(file_path=path) for path in paths}
+barrier = threading.Barrier(THREADS)
+
+def work(worker: int):
+  barrier.wait()
+  results = []
+  for i in range(len(paths) * len(mod_combos)):
+    path = paths[(i + worker) % len(paths)]
+    idx = (i // len(paths) + worker) % len(mod_combos)
+    results.append(((path, idx), calculate_difficulty(shared[path], mod_combos[idx])))
+  return results
+
+with ThreadPoolExecutor(max_workers=THREADS) as pool:
+  for results in pool.map(work, range(THREADS)):
+    for key, attributes in results:
+      assert attributes == expected[key], key
+
+for path, beatmap in shared.items():
+  assert str(beatmap) == parsed[path], f"calculate_difficulty mutated {path}"
+
+batch = calculate_difficulty_batch(paths, mod_combos[1], max_workers=4)
+assert [attributes.star_rating for attributes in batch] == [expected[(path, 1)].star_rating for path in paths]
+
+seen = set()
+for idx, per_combo in iter_difficulty_batch(paths, mod_combos, max_workers=4):
+  seen.add(idx)
+  assert per_combo == [expected[(paths[idx], i)] for i in range(len(mod_combos))]
+assert seen == set(range(len(paths)))
+
+print(f"thread safety ok: {len(paths)} maps x {len(mod_combos)} mod combos x {THREADS} threads")
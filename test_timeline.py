@@ -0,0 +1,80 @@
+import json
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.osu import Beatmap
+from src.osu.difficulty import calculate_difficulty
+from src.osu.difficulty.cache import AttributeCache, content_hash
+from src.osu.server import DifficultyService
+
+beatmap = Beatmap(file_path="dataset/test.osu")
+plain = calculate_difficulty(beatmap)
+assert plain.strain_timeline is None and isinstance(plain.strains, list)
+
+attributes = calculate_difficulty(beatmap, strain_timeline=True)
+timeline = attributes.strain_timeline
+assert attributes.star_rating == plain.star_rating
+assert set(timeline.strains) == {"aim", "aim_no_sliders", "speed", "rhythm"}
+assert set(timeline.peaks) == {"aim", "aim_no_sliders", "speed"}
+for values in (timeline.times, timeline.section_times, *timeline.strains.values(), *timeline.peaks.values()):
+  assert values.dtype == np.float32
+for name, values in timeline.strains.items():
+  assert len(values) == len(timeline), name
+for name, values in timeline.peaks.items():
+  assert len(values) == len(timeline.section_times), name
+assert np.all(np.diff(timeline.times) >= 0) and np.all(np.diff(timeline.section_times) == 400)
+assert attributes.strains is timeline.strains["aim"]
+assert np.allclose(attributes.strains, plain.strains, rtol=1e-6)
+assert "flashlight" in calculate_difficulty(beatmap, ["Flashlight"], strain_timeline=True).strain_timeline.strains
+
+small = calculate_difficulty(beatmap, strain_timeline=True, timeline_points=64)
+assert len(small.strains) == len(timeline)
+for name, values in small.strain_timeline.strains.items():
+  assert values.shape == (64,) and values.max() == timeline.strains[name].max(), name
+for name, values in small.strain_timeline.peaks.items():
+  assert values.shape == (64,) and values.max() == timeline.peaks[name].max(), name
+
+try:
+  calculate_difficulty(beatmap, strain_timeline=True, approximate=True)
+except ValueError:
+  pass
+else:
+  raise AssertionError("approximate timelines should be rejected")
+
+with tempfile.TemporaryDirectory() as tmp:
+  digest = content_hash(open("dataset/test.osu", encoding="utf-8", newline="").read())
+  AttributeCache(directory=tmp).put(digest, [], attributes)
+  AttributeCache(directory=tmp).put(digest, [], small, timeline_points=64)
+  AttributeCache(directory=tmp).put(digest, ["HardRock"], plain)
+  loaded = AttributeCache(directory=tmp).get(digest, [], timeline=True)
+  assert loaded.star_rating == attributes.star_rating and np.array_equal(loaded.strains, attributes.strains)
+  for name, values in timeline.to_arrays().items():
+    assert np.array_equal(loaded.strain_timeline.to_arrays()[name], values), name
+  loaded = AttributeCache(directory=tmp).get(digest, [], timeline=True, timeline_points=64)
+  assert loaded.strain_timeline.strains["aim"].shape == (64,)
+  loaded = AttributeCache(directory=tmp).get(digest, ["HardRock"])
+  assert loaded.strains == plain.strains and loaded.strain_timeline is None
+
+  # Timeline entries live under their own key, so the CLI and the server sharing the directory
+  # compute and cache plain results next to them.
+  assert AttributeCache(directory=tmp).get(digest, []) is None
+  result = subprocess.run(
+    [sys.executable, "-m", "src.osu", "dataset/test.osu", "--cache-dir", tmp, "--strains"], capture_output=True, text=True
+  )
+  assert result.returncode == 0, result.stderr
+  row = json.loads(result.stdout)
+  assert row["strains"] == plain.strains and row["star_rating"] == plain.star_rating
+  service = DifficultyService(executor=ThreadPoolExecutor(1), cache=AttributeCache(directory=tmp))
+  try:
+    _, (served,) = service.difficulty(open("dataset/test.osu", encoding="utf-8", newline="").read(), [[]])
+  finally:
+    service.close()
+  assert isinstance(served.strains, list) and served.strains == plain.strains
+  assert service.metrics()["cache"]["hits"] == 1
+  assert AttributeCache(directory=tmp).get(digest, [], timeline=True).strain_timeline is not None
+
+print("strain timeline ok")
@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+
+from src.audio import FeatureBank
+from src.audio.timing import infer_segments, infer_timing_from_bundle, tempogram
+from src.osu import TimingPoint
+
+sr = 22050
+
+
+def track(red_lines, end_ms, seed=0):
+  # Kicks on beats, softer hits on half beats, over noise and a tone.
+  rng = np.random.default_rng(seed)
+  y = (0.02 * rng.normal(size=int(sr * end_ms / 1000)) + 0.05 * np.sin(2 * np.pi * 220.0 * np.arange(int(sr * end_ms / 1000)) / sr)).astype(np.float32)
+  for i, (start, beat_length) in enumerate(red_lines):
+    stop = red_lines[i + 1][0] if i + 1 < len(red_lines) else end_ms
+    for k, t in enumerate(np.arange(start, stop, beat_length / 2)):
+      j = int(t * sr / 1000)
+      n = min(2000, len(y) - j)
+      y[j:j + n] += ((1.0 if k % 2 == 0 else 0.4) * np.exp(-np.arange(n) / 300) * rng.normal(size=n)).astype(np.float32)
+  return y
+
+
+def phase_error(time, reference, beat_length):
+  return (time - reference + beat_length / 2) % beat_length - beat_length / 2
+
+
+bank = FeatureBank(hop_ms=10, mel_bands=(40,))
+
+# Constant tempo: one red line with the exact beat length and the offset within a few ms.
+beat_length = 60000 / 174
+bundle = bank.compute(track([(1234.0, beat_length)], 40000), sr)
+start = time.perf_counter()
+timing = infer_timing_from_bundle(bundle)
+elapsed = time.perf_counter() - start
+assert len(timing) == 1 and isinstance(timing[0], TimingPoint) and timing[0].uninherited == 1
+assert abs(timing[0].get_bpm() - 174) < 0.05, timing[0].get_bpm()
+assert abs(phase_error(timing[0].time, 1234.0, beat_length)) < 5.0, timing[0].time
+assert 0 <= timing[0].time < beat_length
+assert elapsed < 2.0, elapsed
+
+# A BPM change becomes a second red line close to where it happens.
+bundle = bank.compute(track([(500.0, 500.0), (30500.0, 400.0)], 60000, seed=1), sr)
+segments = infer_segments(bundle.onset_strength, bundle.frame_duration_ms)
+assert [round(s.bpm) for s in segments] == [120, 150]
+assert abs(segments[1].start_ms - 30500.0) < 4000 and abs(phase_error(segments[1].offset, 30500.0, 400.0)) < 20.0
+timing = infer_timing_from_bundle(bundle)
+assert [round(tp.get_bpm(), 1) for tp in timing] == [120.0, 150.0]
+assert abs(phase_error(timing[1].time, 30500.0, 400.0)) < 5.0
+
+# One autocorrelation row per window, normalised at lag 0.
+starts, acf = tempogram(bundle.onset_strength, bundle.frame_duration_ms)
+assert len(starts) == len(acf) and np.allclose(acf[:, 0], 1.0)
+
+print("timing ok")
@@ -0,0 +1,110 @@
+import glob
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.osu.columns import HitObjectColumns
+from src.osu.hit_object import SliderObjectParams
+from src.osu.hit_sample import HitSample
+from src.osu.index import split_header
+from src.osu.tokenizer import BOS, EOS, FIELDS, VOCABULARY, TokenCorpus, Vocabulary, decode, encode
+
+
+def read_columns(path):
+  with open(path, encoding="utf-8-sig") as f:
+    return HitObjectColumns.from_raw(split_header(f.read())[1])
+
+
+def assert_same(a, b):
+  # Positions and times in whole units, slider lengths in 1/1000 px, everything else exact.
+  assert len(a) == len(b)
+  assert np.abs(np.subtract(a.x, b.x)).max(initial=0) <= 0.5 and np.abs(np.subtract(a.y, b.y)).max(initial=0) <= 0.5
+  assert np.abs(np.subtract(a.time, b.time)).max(initial=0) <= 0.5
+  assert a.type == b.type and a.hit_sound == b.hit_sound
+  for i in range(len(a)):
+    assert str(HitSample(raw=a.hit_sample[i] or "0:0:0:0:")) == str(HitSample(raw=b.hit_sample[i])), i
+    if a.type[i] & 2:
+      p, q = SliderObjectParams(raw=a.params[i]), SliderObjectParams(raw=b.params[i])
+      assert [c.curve_type for c in p.curves] == [c.curve_type for c in q.curves], i
+      for c, d in zip(p.curves, q.curves):
+        assert np.abs(np.subtract(c.curve_points, d.curve_points)).max(initial=0) <= 0.5, i
+      assert p.slides == q.slides and abs(p.length - q.length) <= 0.0005, i
+      assert p.edge_sounds == q.edge_sounds and list(map(tuple, p.edge_sets)) == list(map(tuple, q.edge_sets)), i
+    elif a.type[i] & 8:
+      assert abs(float(a.params[i]) - float(b.params[i])) <= 0.5, i
+
+
+assert VOCABULARY.dtype == np.int16 and len(VOCABULARY) == sum(size for _, size in FIELDS)
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+for path in paths:
+  columns = read_columns(path)
+  tokens = encode(columns)
+  assert tokens[0] == BOS and tokens[-1] == EOS
+  decoded = decode(tokens)
+  assert_same(columns, decoded)
+  assert np.array_equal(encode(decoded), tokens), path
+
+# Long gaps, simultaneous objects, samples, multi-segment curves, edge sets and spinners.
+columns = HitObjectColumns(
+  x=[0, 512, -20, 256], y=[0, 384, 400, 192], time=[3000, 3000, 5500, 9000], type=[5, 2 | 4 | 64, 1, 12],
+  hit_sound=[0, 2, 8, 0],
+  params=["", "B|10:20|30:40|L|50:60|70:80,2,123.456,2|0|8,1:2|0:0|3:3", "", "12000"],
+  hit_sample=["", "1:2:3:40:", "0:0:0:0:", "0:1:0:0:"],
+)
+tokens = encode(columns)
+assert [VOCABULARY.name(t) for t in tokens[1:5]] == ["shift:1023", "shift:1023", "shift:951", "type:8"]
+assert_same(columns, decode(tokens))
+assert decode(tokens).params[1] == "B|10:20|30:40|L|50:60|70:80,2,123.456,2|0|8,1:2|0:0|3:3"
+assert len(decode(encode(HitObjectColumns(x=[], y=[], time=[], type=[])))) == 0
+# Fractional positions and curve points (as in "lexycat - glitter") are rounded to whole units.
+fractional = HitObjectColumns(
+  x=[74.4], y=[155.6], time=[100.25], type=[2], params=["P|74.11569:155.95647|86.58011:125.22571,1,40"],
+)
+rounded = decode(encode(fractional))
+assert_same(fractional, rounded)
+assert (rounded.x, rounded.y, rounded.time) == ([74], [156], [100]) and rounded.params[0].startswith("P|74:156|87:125,1,40,")
+for bad in (
+  dict(time=[10, 5]),
+  dict(hit_sample=["0:0:0:0:hit.wav", ""]),
+  dict(x=[2000, 0]),
+  dict(type=[128 | 1, 1]),
+):
+  fields = dict(x=[0, 0], y=[0, 0], time=[0, 10], type=[1, 1], hit_sample=["", ""])
+  fields.update(bad)
+  try:
+    encode(HitObjectColumns(**fields))
+  except ValueError:
+    pass
+  else:
+    raise AssertionError(bad)
+try:
+  decode(np.array([BOS, VOCABULARY.offset("type"), EOS]))
+except ValueError:
+  pass
+else:
+  raise AssertionError("type without position")
+
+with tempfile.TemporaryDirectory() as tmp:
+  out = os.path.join(tmp, "tokens")
+  corpus = TokenCorpus.build(paths, out)
+  assert len(corpus) == len(paths) and not corpus.failed
+  assert corpus.tokens.dtype == np.int16 and isinstance(corpus.tokens, np.memmap)
+  assert np.array_equal(corpus[3], encode(read_columns(paths[3])))
+  assert corpus.lengths.sum() == os.path.getsize(os.path.join(out, "tokens.bin")) // 2
+
+  # A corpus built with another vocabulary is refused and reported stale.
+  other = Vocabulary(FIELDS[:-1] + (("duration_lo", 2048),))
+  assert TokenCorpus.is_current(out) and not TokenCorpus.is_current(out, vocabulary=other)
+  try:
+    TokenCorpus(out, vocabulary=other)
+  except ValueError:
+    pass
+  else:
+    raise AssertionError("vocabulary mismatch")
+  with open(os.path.join(out, "meta.json"), encoding="utf-8") as f:
+    assert json.load(f)["vocabulary"] == VOCABULARY.signature
+
+print("tokenizer ok")
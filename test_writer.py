@@ -0,0 +1,71 @@
+import glob
+import io
+
+from src.osu import Beatmap, Circle, Slider, Spinner, TimingPoint, write_beatmap
+from src.osu.formatting import format_number
+
+paths = sorted(glob.glob("dataset/**/*.osu", recursive=True))
+for path in paths:
+  beatmap = Beatmap(file_path=path)
+  # Parsed timing points and hit objects go through the streaming writer, chunked.
+  beatmap.timing_points, beatmap.hit_objects
+  out = io.StringIO()
+  write_beatmap(beatmap, out, chunk_size=5)
+  assert out.getvalue() == str(beatmap), path
+
+  # Re-serialised hit objects parse back to the same objects, edge sounds included.
+  reloaded = Beatmap(raw=str(beatmap)).hit_objects
+  assert len(reloaded) == len(beatmap.hit_objects), path
+  for before, after in zip(beatmap.hit_objects, reloaded):
+    assert type(before) is type(after) and (before.x, before.y, before.time) == (after.x, after.y, after.time)
+    if isinstance(before, Slider):
+      assert before.object_params.edge_sounds == after.object_params.edge_sounds, path
+      assert before.object_params.edge_sets == after.object_params.edge_sets, path
+
+beatmap = Beatmap.from_arrays(
+  times=[1000, 1500.5, 2000, 4000],
+  x=[64, 128, 256.25, 256],
+  y=[48, 96, 192, 192],
+  types=[1, 2, 2, 8],
+  hit_sounds=[0, 2, 0, 4],
+  curve_types=["B", "B", "P", "B"],
+  curve_points=[None, [(160, 96), (200, 140)], [(300, 200), (320.5, 150)], None],
+  slides=[1, 1, 3, 1],
+  lengths=[0, 105.5, 140, 0],
+  end_times=[0, 0, 0, 6000],
+  timing_points=[TimingPoint(time=0, beat_length=500, uninherited=1)],
+)
+assert not beatmap.is_parsed("HitObjects")
+text = str(beatmap)
+out = io.StringIO()
+write_beatmap(beatmap, out, chunk_size=2)
+assert out.getvalue() == text
+
+objects = Beatmap(raw=text).hit_objects
+assert [type(obj) for obj in objects] == [Circle, Slider, Slider, Spinner]
+assert [obj.time for obj in objects] == [1000, 1500.5, 2000, 4000]
+assert objects[2].x == 256.25 and objects[1].hit_sound == 2
+first, second = objects[1].object_params, objects[2].object_params
+assert first.curves[0].curve_type == "B" and first.curves[0].curve_points == [(160, 96), (200, 140)]
+assert second.curves[0].curve_type == "P" and second.curves[0].curve_points == [(300, 200), (320.5, 150)]
+assert (first.slides, first.length, second.slides, second.length) == (1, 105.5, 3, 140)
+# Default edge sounds/sets, one per slider edge.
+assert first.edge_sounds == [0, 0] and second.edge_sounds == [0, 0, 0, 0]
+assert second.edge_sets == [(0, 0)] * 4
+assert objects[3].object_params.end_time == 6000
+assert str(Beatmap(raw=text)) == text
+
+# format_number writes what TimingPoint._format_float writes wherever 15 significant digits
+# round-trip; past that it keeps the shortest exact representation instead.
+tp = TimingPoint()
+for value in (0, 7, -3, 7.0, -0.0, 0.5, -12.25, 1e-07, 1e20, 333.3333333333333, 1 / 3, 0.1 + 0.2, 2.0 ** 53 + 0.5):
+  formatted = format_number(value)
+  assert float(formatted) == value, value
+  if float(tp._format_float(value)) == value:
+    assert formatted == tp._format_float(value), value
+  else:
+    assert formatted == repr(value), value
+assert format_number(-0.0) == "0" and format_number(7.0) == "7" and format_number(1500.5) == "1500.5"
+assert format_number(0.1 + 0.2) == "0.30000000000000004" and tp._format_float(0.1 + 0.2) == "0.3"
+
+print("writer ok:", len(paths), "maps")